@@ -1,12 +1,15 @@
 # accounts/context_processors.py
+from users.cache import get_request_user
+
 from .utils import get_currency_symbol, get_user_currency
 
 def currency_context(request):
     """Add currency information to all templates"""
-    if hasattr(request, 'user') and request.user.is_authenticated:
+    user = get_request_user(request)
+    if user is not None and user.is_authenticated:
         return {
-            'currency_symbol': get_currency_symbol(user=request.user),
-            'currency_code': get_user_currency(request.user),
+            'currency_symbol': get_currency_symbol(user=user),
+            'currency_code': get_user_currency(user),
         }
     return {
         'currency_symbol': get_currency_symbol(),
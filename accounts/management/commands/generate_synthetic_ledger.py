@@ -0,0 +1,71 @@
+import time
+from datetime import datetime
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.synthetic import SyntheticLedger
+
+
+class Command(BaseCommand):
+    help = ('Generate a deterministic synthetic ledger for benchmarks: an account tree, balanced '
+            'journal entries, customers, invoices, payments, employees and payroll periods')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--accounts', type=int, default=200, help='Number of accounts (default 200)')
+        parser.add_argument('--entries', type=int, default=10000,
+                            help='Number of journal entries, about 2.6 lines each (default 10000)')
+        parser.add_argument('--customers', type=int, default=100, help='Number of customers (default 100)')
+        parser.add_argument('--invoices', type=int, default=1000, help='Number of invoices (default 1000)')
+        parser.add_argument('--employees', type=int, default=50, help='Number of employees (default 50)')
+        parser.add_argument('--payroll-periods', type=int, default=12,
+                            help='Number of monthly payroll periods to create and run (default 12)')
+        parser.add_argument('--days', type=int, default=730, help='Length of the date range in days (default 730)')
+        parser.add_argument('--end-date', type=str,
+                            help='Last date of the range (YYYY-MM-DD). Defaults to today; fix it for repeatable data.')
+        parser.add_argument('--seed', type=int, default=42, help='Random seed (default 42)')
+        parser.add_argument('--prefix', type=str, default='SYN',
+                            help='Prefix for generated codes and numbers; must not be in use already (default SYN)')
+        parser.add_argument('--chunk-size', type=int, default=10000,
+                            help='Rows generated and inserted per transaction (default 10000)')
+        parser.add_argument('--user', type=str, help='Username recorded as creator. Defaults to the first superuser.')
+
+    def handle(self, *args, **options):
+        from accounts.models import Account
+
+        end_date = None
+        if options['end_date']:
+            try:
+                end_date = datetime.strptime(options['end_date'], '%Y-%m-%d').date()
+            except ValueError:
+                raise CommandError('Invalid date format. Use YYYY-MM-DD')
+        if options['days'] < 1 or options['chunk_size'] < 1:
+            raise CommandError('--days and --chunk-size must be at least 1')
+
+        User = get_user_model()
+        if options['user']:
+            user = User.objects.filter(username=options['user']).first()
+            if user is None:
+                raise CommandError(f'User "{options["user"]}" not found')
+        else:
+            user = User.objects.filter(is_superuser=True).order_by('pk').first()
+
+        prefix = options['prefix']
+        if Account.objects.filter(code__startswith=prefix).exists():
+            raise CommandError(f'Accounts with prefix "{prefix}" already exist; pick another --prefix')
+
+        ledger = SyntheticLedger(
+            accounts=options['accounts'], entries=options['entries'], customers=options['customers'],
+            invoices=options['invoices'], employees=options['employees'],
+            payroll_periods=options['payroll_periods'], end_date=end_date, days=options['days'],
+            seed=options['seed'], prefix=prefix, chunk_size=options['chunk_size'],
+            user=user, stdout=self.stdout,
+        )
+        self.stdout.write(f'Generating synthetic ledger "{prefix}" (seed {options["seed"]}, '
+                          f'{ledger.start_date} to {ledger.end_date})...')
+        start = time.perf_counter()
+        counts = ledger.generate()
+        elapsed = time.perf_counter() - start
+
+        summary = ', '.join(f'{count} {name.replace("_", " ")}' for name, count in counts.items())
+        self.stdout.write(self.style.SUCCESS(f'Created {summary} in {elapsed:.1f}s.'))
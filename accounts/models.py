@@ -5,7 +5,9 @@ from decimal import Decimal
 import os
 import uuid
 
-class Account(models.Model):
+from audit.snapshot import AuditedModelMixin
+
+class Account(AuditedModelMixin, models.Model):
     ACCOUNT_TYPES = [
         ('asset', 'Asset'),
         ('liability', 'Liability'),
@@ -105,7 +107,7 @@ class Account(models.Model):
         # Add opening balance
         return self.opening_balance + journal_balance
 
-class JournalEntry(models.Model):
+class JournalEntry(AuditedModelMixin, models.Model):
     """
     Represents a complete double-entry journal entry.
     Each journal entry must have balanced debits and credits.
@@ -166,7 +168,7 @@ class JournalEntry(models.Model):
         self.is_posted = True
         self.save()
 
-class JournalEntryLine(models.Model):
+class JournalEntryLine(AuditedModelMixin, models.Model):
     """
     Individual debit or credit line within a journal entry.
     Multiple lines make up a complete double-entry transaction.
@@ -194,7 +196,7 @@ class JournalEntryLine(models.Model):
             raise ValidationError("Amount must be greater than zero.")
 
 # Keep the old Transaction model for backward compatibility, but deprecate it
-class Transaction(models.Model):
+class Transaction(AuditedModelMixin, models.Model):
     """
     DEPRECATED: Use JournalEntry and JournalEntryLine instead.
     This model is kept for backward compatibility only.
@@ -0,0 +1,376 @@
+"""
+Deterministic synthetic ledger data for benchmarks.
+
+SyntheticLedger builds a company from a random seed. The same options, seed
+and end date always produce the same rows, apart from database ids. It
+creates:
+
+* a chart of accounts as a tree: one root per account type with children
+  and grandchildren below it
+* balanced journal entries with a realistic line fan-out (mostly two lines,
+  some split across up to ten), dates skewed towards recent months and
+  month ends, and a few hot accounts taking most of the activity
+* customers, invoices with items and payments for the paid ones
+* employees and monthly payroll periods that have been run
+
+Rows are written with bulk_create in chunks, one transaction per chunk, and
+no model save() or signals run. Journal entries and lines skip model
+instances altogether, so millions of lines take minutes. Every generated
+code, number and email starts with the prefix, so a data set can sit next
+to real data and be told apart from it.
+"""
+from datetime import date, timedelta
+from decimal import Decimal
+import calendar
+import random
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import Account, JournalEntry, JournalEntryLine
+
+CENT = Decimal('0.01')
+
+ACCOUNT_TYPE_ROOTS = [
+    ('asset', 1, 'Assets'),
+    ('liability', 2, 'Liabilities'),
+    ('equity', 3, 'Equity'),
+    ('income', 4, 'Income'),
+    ('expense', 5, 'Expenses'),
+]
+
+# Share of generated accounts per type
+ACCOUNT_TYPE_WEIGHTS = {'asset': 0.25, 'liability': 0.15, 'equity': 0.05, 'income': 0.2, 'expense': 0.35}
+
+# (lines per entry, weight)
+LINE_FAN_OUT = [(2, 70), (3, 14), (4, 8), (5, 4), (6, 2), (8, 1), (10, 1)]
+
+# Typical (debit type, credit type) pairs and how often they occur
+ENTRY_KINDS = [
+    (('asset',), ('income',), 35),        # sales
+    (('expense',), ('asset',), 35),       # purchases paid
+    (('expense',), ('liability',), 15),   # purchases on credit
+    (('liability',), ('asset',), 10),     # bills paid
+    (('asset',), ('equity',), 5),         # owner funding
+]
+
+DEPARTMENTS = ['Finance', 'Sales', 'Operations', 'Engineering', 'Support']
+
+
+class SyntheticLedger:
+    """Generate a synthetic company; call generate() to write it"""
+
+    def __init__(self, accounts=200, entries=10000, customers=100, invoices=1000,
+                 employees=50, payroll_periods=12, end_date=None, days=730,
+                 seed=42, prefix='SYN', chunk_size=10000, user=None, stdout=None):
+        self.options = {
+            'accounts': accounts, 'entries': entries, 'customers': customers,
+            'invoices': invoices, 'employees': employees, 'payroll_periods': payroll_periods,
+        }
+        self.end_date = end_date or date.today()
+        self.start_date = self.end_date - timedelta(days=days - 1)
+        self.days = days
+        self.rng = random.Random(seed)
+        self.prefix = prefix
+        self.chunk_size = chunk_size
+        self.user = user
+        self.stdout = stdout
+        self.counts = {}
+
+    def log(self, message):
+        if self.stdout:
+            self.stdout.write(message)
+
+    def generate(self):
+        """Write the whole data set. Returns {table: rows created}."""
+        accounts = self.create_accounts()
+        self.create_journal_entries(accounts)
+        customers = self.create_customers()
+        self.create_invoices(customers)
+        self.create_payroll()
+        return self.counts
+
+    # Random helpers
+
+    def amount(self, low=10, high=5000):
+        """Log-uniform amount in cents, so small amounts are more common than large ones"""
+        value = low * (high / low) ** self.rng.random()
+        return Decimal(value).quantize(CENT)
+
+    def split(self, total, parts):
+        """Split an amount into `parts` positive cent amounts summing to it exactly"""
+        if parts == 1:
+            return [total]
+        cents = int(total / CENT)
+        cuts = sorted(self.rng.sample(range(1, cents), parts - 1))
+        bounds = [0] + cuts + [cents]
+        return [Decimal(bounds[i + 1] - bounds[i]) * CENT for i in range(parts)]
+
+    def entry_date(self):
+        """Dates skewed towards the recent end of the range, with month-end spikes"""
+        offset = int(self.days * (1 - self.rng.random() ** 1.6))
+        day = self.start_date + timedelta(days=min(offset, self.days - 1))
+        if self.rng.random() < 0.15:
+            day = day.replace(day=calendar.monthrange(day.year, day.month)[1])
+            day = min(day, self.end_date)
+        return day
+
+    def hot_pick(self, items):
+        """Pick with a heavy skew towards the start of the list"""
+        return items[int(len(items) * self.rng.random() ** 3)]
+
+    def chunks(self, total):
+        for start in range(0, total, self.chunk_size):
+            yield start, min(self.chunk_size, total - start)
+
+    # Generators
+
+    def create_accounts(self):
+        """Account tree; returns {account_type: [leaf accounts]}"""
+        total = max(self.options['accounts'], len(ACCOUNT_TYPE_ROOTS))
+        with transaction.atomic():
+            roots = Account.objects.bulk_create([
+                Account(code=f'{self.prefix}{digit}000', name=f'{name} ({self.prefix})',
+                        account_type=account_type, created_by=self.user)
+                for account_type, digit, name in ACCOUNT_TYPE_ROOTS
+            ])
+            remaining = total - len(roots)
+
+            groups, leaves = [], []
+            for root, (account_type, digit, name) in zip(roots, ACCOUNT_TYPE_ROOTS):
+                count = max(1, int(remaining * ACCOUNT_TYPE_WEIGHTS[account_type]))
+                # About one group account per eight accounts below a root
+                group_count = max(1, count // 8)
+                groups += [
+                    Account(code=f'{self.prefix}{digit}{g + 1:03d}', name=f'{name} group {g + 1}',
+                            account_type=account_type, parent=root, created_by=self.user)
+                    for g in range(group_count)
+                ]
+            groups = Account.objects.bulk_create(groups, batch_size=1000)
+
+            by_type = {}
+            for group in groups:
+                by_type.setdefault(group.account_type, []).append(group)
+            for account_type, digit, name in ACCOUNT_TYPE_ROOTS:
+                parents = by_type[account_type]
+                count = max(1, int(remaining * ACCOUNT_TYPE_WEIGHTS[account_type])) - len(parents)
+                for n in range(max(count, 1)):
+                    parent = parents[n % len(parents)]
+                    opening = self.amount(100, 50000) if account_type in ('asset', 'liability', 'equity') else Decimal('0')
+                    leaves.append(Account(
+                        code=f'{parent.code}-{n // len(parents) + 1:04d}',
+                        name=f'{name} {n + 1}',
+                        account_type=account_type, parent=parent,
+                        opening_balance=opening, opening_balance_date=self.start_date,
+                        created_by=self.user,
+                    ))
+            leaves = Account.objects.bulk_create(leaves, batch_size=1000)
+
+        self.counts['accounts'] = len(roots) + len(groups) + len(leaves)
+        self.log(f'  {self.counts["accounts"]} accounts')
+        leaf_accounts = {}
+        for account in leaves:
+            leaf_accounts.setdefault(account.account_type, []).append(account)
+        return leaf_accounts
+
+    def entry_lines(self, accounts):
+        """Balanced (account, entry_type, amount) lines for one entry"""
+        fan_out = self.rng.choices([n for n, w in LINE_FAN_OUT], [w for n, w in LINE_FAN_OUT])[0]
+        debit_types, credit_types, _ = self.rng.choices(ENTRY_KINDS, [k[2] for k in ENTRY_KINDS])[0]
+        # Either one line against many, or an even split between the two sides
+        debits = fan_out // 2 if fan_out > 2 and self.rng.random() < 0.5 else fan_out - 1
+        credits = fan_out - debits
+        if self.rng.random() < 0.5:
+            debits, credits = credits, debits
+
+        # At least $10, so there are enough cents for every line
+        total = self.amount()
+        lines = []
+        for entry_type, types, parts in (('debit', debit_types, debits), ('credit', credit_types, credits)):
+            for value in self.split(total, parts):
+                account = self.hot_pick(accounts[self.rng.choice(types)])
+                lines.append((account, entry_type, value))
+        return lines
+
+    def insert_rows(self, model, fields, rows):
+        """
+        executemany an INSERT of already adapted values. Used for journal
+        entries and lines, which are most of the data: building model
+        instances for them costs several times more than the insert itself.
+        """
+        meta = model._meta
+        quote = connection.ops.quote_name
+        sql = 'INSERT INTO {} ({}) VALUES ({})'.format(
+            quote(meta.db_table),
+            ', '.join(quote(meta.get_field(name).column) for name in fields),
+            ', '.join(['%s'] * len(fields)),
+        )
+        with connection.cursor() as cursor:
+            cursor.executemany(sql, rows)
+
+    def insert_entries(self, entries):
+        """Insert (date, description, reference, is_posted) rows. Returns {reference: id}."""
+        ops = connection.ops
+        now = ops.adapt_datetimefield_value(timezone.now())
+        user_id = self.user.pk if self.user else None
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT MAX({}) FROM {}'.format(
+                ops.quote_name(JournalEntry._meta.pk.column), ops.quote_name(JournalEntry._meta.db_table)))
+            last_id = cursor.fetchone()[0] or 0
+        self.insert_rows(
+            JournalEntry,
+            ['date', 'description', 'reference', 'is_posted', 'created_by', 'created_at', 'updated_at'],
+            [(ops.adapt_datefield_value(day), description, reference, posted, user_id, now, now)
+             for day, description, reference, posted in entries],
+        )
+        # New rows sit above the previous maximum id; match them up by their unique references
+        references = {entry[2] for entry in entries}
+        return {
+            reference: pk
+            for pk, reference in JournalEntry.objects.filter(pk__gt=last_id).values_list('pk', 'reference')
+            if reference in references
+        }
+
+    def create_journal_entries(self, accounts):
+        total_entries = self.options['entries']
+        created_lines = 0
+        for start, size in self.chunks(total_entries):
+            entries, lines = [], []
+            for n in range(start, start + size):
+                reference = f'{self.prefix}-JE-{n + 1:08d}'
+                entries.append((self.entry_date(), f'Synthetic entry {n + 1}', reference, self.rng.random() < 0.95))
+                lines += [
+                    (reference, account.pk, entry_type, str(value))
+                    for account, entry_type, value in self.entry_lines(accounts)
+                ]
+            with transaction.atomic():
+                ids = self.insert_entries(entries)
+                self.insert_rows(
+                    JournalEntryLine,
+                    ['journal_entry', 'account', 'entry_type', 'amount'],
+                    [(ids[reference], account_id, entry_type, value)
+                     for reference, account_id, entry_type, value in lines],
+                )
+            created_lines += len(lines)
+            self.log(f'  {start + size}/{total_entries} journal entries, {created_lines} lines')
+        self.counts['journal_entries'] = total_entries
+        self.counts['journal_lines'] = created_lines
+
+    def create_customers(self):
+        from invoices.models import Customer
+
+        customers = Customer.objects.bulk_create([
+            Customer(
+                name=f'{self.prefix} Customer {n + 1}',
+                email=f'{self.prefix.lower()}-customer{n + 1}@example.invalid',
+                city=self.rng.choice(['Springfield', 'Riverton', 'Lakeside', 'Hillview']),
+                created_by=self.user,
+            )
+            for n in range(self.options['customers'])
+        ], batch_size=1000) if self.user else []
+        self.counts['customers'] = len(customers)
+        if not customers and self.options['customers']:
+            self.log('  skipped customers and invoices: they need a user (created_by)')
+        return customers
+
+    def create_invoices(self, customers):
+        from invoices.models import Invoice, InvoiceItem, Payment
+
+        if not customers:
+            self.counts['invoices'] = 0
+            return
+        total_invoices = self.options['invoices']
+        items_created = payments_created = 0
+        for start, size in self.chunks(total_invoices):
+            invoices, invoice_items = [], []
+            for n in range(start, start + size):
+                issue_date = self.entry_date()
+                items = [
+                    (Decimal(self.rng.randint(1, 10)), self.amount(5, 800))
+                    for _ in range(self.rng.randint(1, 5))
+                ]
+                subtotal = sum((quantity * price for quantity, price in items), Decimal('0')).quantize(CENT)
+                tax_rate = self.rng.choice([Decimal('0'), Decimal('5.00'), Decimal('8.25')])
+                tax = (subtotal * tax_rate / 100).quantize(CENT)
+                age = (self.end_date - issue_date).days
+                status = (
+                    'paid' if self.rng.random() < (0.85 if age > 45 else 0.3)
+                    else 'overdue' if age > 30 else self.rng.choice(['draft', 'sent'])
+                )
+                invoices.append(Invoice(
+                    invoice_number=f'{self.prefix}-INV-{n + 1:08d}',
+                    customer=self.hot_pick(customers),
+                    issue_date=issue_date,
+                    due_date=issue_date + timedelta(days=30),
+                    paid_date=issue_date + timedelta(days=self.rng.randint(1, 45)) if status == 'paid' else None,
+                    status=status,
+                    subtotal=subtotal, tax_rate=tax_rate, tax_amount=tax, total_amount=subtotal + tax,
+                    created_by=self.user,
+                ))
+                invoice_items.append(items)
+            with transaction.atomic():
+                invoices = Invoice.objects.bulk_create(invoices, batch_size=1000)
+                items = [
+                    InvoiceItem(invoice=invoice, description=f'Service {order + 1}', quantity=quantity,
+                                unit_price=price, total=(quantity * price).quantize(CENT), order=order)
+                    for invoice, spec in zip(invoices, invoice_items)
+                    for order, (quantity, price) in enumerate(spec)
+                ]
+                InvoiceItem.objects.bulk_create(items, batch_size=2000)
+                payments = [
+                    Payment(invoice=invoice, amount=invoice.total_amount, payment_date=invoice.paid_date,
+                            payment_method=self.rng.choice(['bank_transfer', 'credit_card', 'check']),
+                            created_by=self.user)
+                    for invoice in invoices if invoice.status == 'paid'
+                ]
+                Payment.objects.bulk_create(payments, batch_size=2000)
+            items_created += len(items)
+            payments_created += len(payments)
+        self.counts['invoices'] = total_invoices
+        self.counts['invoice_items'] = items_created
+        self.counts['payments'] = payments_created
+        self.log(f'  {total_invoices} invoices, {items_created} items, {payments_created} payments')
+
+    def create_payroll(self):
+        from payroll.models import Employee, PayrollPeriod
+        from payroll.services import run_payroll
+
+        employees = Employee.objects.bulk_create([
+            Employee(
+                employee_id=f'{self.prefix}-{n + 1:06d}',
+                first_name='Synthetic', last_name=f'Employee {n + 1}',
+                email=f'{self.prefix.lower()}-employee{n + 1}@example.invalid',
+                hire_date=self.start_date - timedelta(days=self.rng.randint(0, 2000)),
+                department=self.rng.choice(DEPARTMENTS),
+                position='Staff',
+                employment_type='full_time' if self.rng.random() < 0.8 else 'part_time',
+                base_salary=Decimal(self.rng.randint(2500, 9000)),
+                hourly_rate=Decimal(self.rng.randint(15, 60)),
+            )
+            for n in range(self.options['employees'])
+        ], batch_size=1000)
+        self.counts['employees'] = len(employees)
+
+        # The most recent months of the date range
+        periods = []
+        month_end = self.end_date.replace(day=1) - timedelta(days=1)
+        for _ in range(self.options['payroll_periods']):
+            month_start = month_end.replace(day=1)
+            periods.append(PayrollPeriod(
+                name=f'{self.prefix} {month_start:%B %Y}', period_type='monthly',
+                start_date=month_start, end_date=month_end, pay_date=month_end,
+            ))
+            month_end = month_start - timedelta(days=1)
+        # Periods are unique by dates, so data sets sharing a database share their periods
+        existing = {
+            (period.start_date, period.end_date): period
+            for period in PayrollPeriod.objects.filter(
+                period_type='monthly', start_date__in=[period.start_date for period in periods]
+            )
+        }
+        periods = [existing.get((period.start_date, period.end_date), period) for period in periods]
+        PayrollPeriod.objects.bulk_create([period for period in periods if period.pk is None])
+        entries = sum(run_payroll(period, self.user) for period in periods) if employees else 0
+        self.counts['payroll_periods'] = len(periods)
+        self.counts['payroll_entries'] = entries
+        self.log(f'  {len(employees)} employees, {len(periods)} payroll periods, {entries} payroll entries')
@@ -785,13 +785,9 @@ def export_account_statement_excel(context):
         response = HttpResponse('Excel export requires openpyxl. Please install it: pip install openpyxl', status=500)
         return response
     
-    # Get organization settings
-    from settings.models import CompanySettings
-    try:
-        company_settings = CompanySettings.objects.first()
-        org_name = company_settings.organization_name if company_settings else "Your Organization Name"
-    except:
-        org_name = "Your Organization Name"
+    # Get organization settings (cached per process)
+    from settings.cache import get_organization_name
+    org_name = get_organization_name()
     
     # Create workbook
     wb = openpyxl.Workbook()
@@ -872,13 +868,9 @@ def export_account_statement_csv(context):
     response = HttpResponse(content_type='text/csv')
     response['Content-Disposition'] = f'attachment; filename="account_statement_{context["account"].code}_{context["from_date"]}_{context["to_date"]}.csv"'
     
-    # Get organization settings
-    from settings.models import CompanySettings
-    try:
-        company_settings = CompanySettings.objects.first()
-        org_name = company_settings.organization_name if company_settings else "Your Organization Name"
-    except:
-        org_name = "Your Organization Name"
+    # Get organization settings (cached per process)
+    from settings.cache import get_organization_name
+    org_name = get_organization_name()
     
     writer = csv.writer(response)
     
@@ -922,7 +914,7 @@ def export_account_statement_pdf(context):
         from reportlab.pdfgen import canvas
         from reportlab.lib.pagesizes import letter, A4
         from reportlab.lib import colors
-        from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+        from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, Image
         from reportlab.lib.styles import getSampleStyleSheet
         from reportlab.lib.units import inch
     except ImportError:
@@ -936,13 +928,16 @@ def export_account_statement_pdf(context):
     elements = []
     styles = getSampleStyleSheet()
     
-    # Get organization settings
-    from settings.models import CompanySettings
-    try:
-        company_settings = CompanySettings.objects.first()
-        org_name = company_settings.organization_name if company_settings else "Your Organization Name"
-    except:
-        org_name = "Your Organization Name"
+    # Get organization settings and logo (cached per process)
+    from settings.cache import get_company_logo, get_organization_name
+    org_name = get_organization_name()
+    
+    logo = get_company_logo()
+    if logo:
+        logo_bytes, logo_width, logo_height = logo
+        scale = min(1.0, (0.75 * inch) / logo_height, (2 * inch) / logo_width)
+        elements.append(Image(io.BytesIO(logo_bytes), width=logo_width * scale, height=logo_height * scale))
+        elements.append(Spacer(1, 6))
     
     # Organization name
     org_title = Paragraph(org_name, styles['Title'])
@@ -10,6 +10,10 @@ import json
 from typing import List, Dict
 import os
 
+from help_chat.answer_cache import AnswerCache, question_key
+
+ai_answers = AnswerCache('ai_assistant')
+
 class BookgiumAIAssistant:
     """AI Assistant for Bookgium accounting application"""
     
@@ -82,6 +86,13 @@ class BookgiumAIAssistant:
         if not self.api_key:
             return "AI Assistant is not configured. Please set your OpenAI API key in the environment variables."
         
+        # Only model answers are cached; fallbacks are cheap and may be temporary
+        context = user_context or {}
+        key = question_key(user_question, context.get('user_role'), context.get('current_page'))
+        cached = ai_answers.get(key) if key else None
+        if cached is not None:
+            return cached
+        
         # Build context from user's current state
         context_info = ""
         if user_context:
@@ -118,11 +129,14 @@ class BookgiumAIAssistant:
                 max_tokens=500,
                 temperature=0.7
             )
-            
-            return response.choices[0].message.content
+            answer = response.choices[0].message.content
             
         except Exception as e:
             return self._get_fallback_response(user_question)
+        
+        if key:
+            ai_answers.set(key, answer)
+        return answer
     
     def _get_fallback_response(self, user_question: str) -> str:
         """Fallback response when OpenAI is not available"""
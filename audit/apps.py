@@ -7,4 +7,5 @@ class AuditConfig(AppConfig):
     verbose_name = 'Audit Trail'
 
     def ready(self):
-        import audit.signals
+        from audit.signals import connect_audit_receivers
+        connect_audit_receivers()
@@ -0,0 +1,174 @@
+"""
+Cold archive for expired audit logs.
+
+Expired logs are read in primary-key chunks and written, grouped by local
+date, to gzip-compressed JSON Lines files under AUDIT_ARCHIVE_DIR:
+
+    <archive dir>/<YYYY-MM-DD>/audit-<first pk>-<last pk>.jsonl.gz
+    <archive dir>/<YYYY-MM-DD>/audit-<first pk>-<last pk>.index.json
+
+The sidecar index records the timestamp range, primary-key range, row
+count and the object ids per content type in its archive file, so
+find_archived_logs() only opens the archive files that can contain the
+object it is looking for. A chunk's rows are deleted, in bounded batches,
+only after its files have been written and renamed into place.
+"""
+from bisect import bisect_left
+from collections import defaultdict
+from datetime import date
+import gzip
+import json
+import os
+import time
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils import timezone
+
+from .models import AuditLog
+from .rollups import subtract_rollups
+from .search import unindex_logs
+
+DEFAULT_CHUNK_SIZE = 5000
+DEFAULT_DELETE_BATCH_SIZE = 1000
+
+ARCHIVE_FIELDS = [
+    'id', 'user_id', 'action', 'content_type_id', 'object_id', 'object_repr',
+    'changes', 'ip_address', 'user_agent', 'session_key', 'timestamp', 'notes',
+]
+
+
+def get_archive_dir():
+    return str(getattr(settings, 'AUDIT_ARCHIVE_DIR', os.path.join(settings.BASE_DIR, 'audit_archive')))
+
+
+def _write_atomically(path, write):
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'wb') as handle:
+        write(handle)
+        handle.flush()
+        os.fsync(handle.fileno())
+    os.replace(tmp_path, path)
+
+
+def write_partition(archive_dir, day, rows):
+    """Write one day's rows from a chunk and its sidecar index. Returns the archive path."""
+    directory = os.path.join(archive_dir, day.isoformat())
+    os.makedirs(directory, exist_ok=True)
+    base = os.path.join(directory, f"audit-{rows[0]['id']}-{rows[-1]['id']}")
+
+    def write_rows(handle):
+        with gzip.GzipFile(fileobj=handle, mode='wb') as archive:
+            for row in rows:
+                archive.write(json.dumps(row, cls=DjangoJSONEncoder).encode('utf-8'))
+                archive.write(b'\n')
+
+    objects = defaultdict(set)
+    for row in rows:
+        if row['content_type_id'] is not None and row['object_id'] is not None:
+            objects[row['content_type_id']].add(row['object_id'])
+    index = {
+        'file': os.path.basename(base) + '.jsonl.gz',
+        'date': day.isoformat(),
+        'count': len(rows),
+        'first_id': rows[0]['id'],
+        'last_id': rows[-1]['id'],
+        'timestamp_from': min(row['timestamp'] for row in rows).isoformat(),
+        'timestamp_to': max(row['timestamp'] for row in rows).isoformat(),
+        'objects': {str(ct): sorted(ids) for ct, ids in objects.items()},
+    }
+
+    # The data file goes first, so an index never points at a missing file
+    _write_atomically(base + '.jsonl.gz', write_rows)
+    _write_atomically(base + '.index.json', lambda handle: handle.write(json.dumps(index).encode('utf-8')))
+    return base + '.jsonl.gz'
+
+
+def delete_in_batches(ids, batch_size=DEFAULT_DELETE_BATCH_SIZE, pause=0):
+    """Delete logs by id in short transactions. Returns the number deleted."""
+    deleted = 0
+    for start in range(0, len(ids), batch_size):
+        batch = AuditLog.objects.filter(pk__in=ids[start:start + batch_size])
+        with transaction.atomic():
+            subtract_rollups(batch)
+            unindex_logs(batch)
+            deleted += batch.delete()[0]
+        if pause:
+            time.sleep(pause)
+    return deleted
+
+
+def purge_expired_logs(cutoff, archive=True, archive_dir=None, chunk_size=DEFAULT_CHUNK_SIZE,
+                       delete_batch_size=DEFAULT_DELETE_BATCH_SIZE, pause=0, stdout=None):
+    """
+    Archive (optionally) and delete every log older than cutoff.
+    Returns (archived, deleted).
+    """
+    archive_dir = archive_dir or get_archive_dir()
+    archived = deleted = 0
+    last_id = 0
+
+    while True:
+        rows = list(
+            AuditLog.objects.filter(timestamp__lt=cutoff, pk__gt=last_id)
+            .order_by('pk')
+            .values(*ARCHIVE_FIELDS)[:chunk_size]
+        )
+        if not rows:
+            break
+        last_id = rows[-1]['id']
+
+        if archive:
+            by_day = defaultdict(list)
+            for row in rows:
+                by_day[timezone.localtime(row['timestamp']).date()].append(row)
+            for day, day_rows in sorted(by_day.items()):
+                write_partition(archive_dir, day, day_rows)
+            archived += len(rows)
+
+        deleted += delete_in_batches([row['id'] for row in rows], delete_batch_size, pause)
+        if stdout:
+            stdout.write(f'  purged logs up to id {last_id} ({deleted} so far)')
+
+    return archived, deleted
+
+
+def _index_files(archive_dir, date_from=None, date_to=None):
+    if not os.path.isdir(archive_dir):
+        return
+    for name in sorted(os.listdir(archive_dir)):
+        try:
+            day = date.fromisoformat(name)
+        except ValueError:
+            continue
+        if (date_from and day < date_from) or (date_to and day > date_to):
+            continue
+        directory = os.path.join(archive_dir, name)
+        for filename in sorted(os.listdir(directory)):
+            if filename.endswith('.index.json'):
+                yield directory, os.path.join(directory, filename)
+
+
+def find_archived_logs(content_type_id, object_id, date_from=None, date_to=None, archive_dir=None):
+    """
+    Archived log records (as dicts) for one object, oldest first. Only the
+    archive files whose sidecar index lists the object are opened.
+    """
+    archive_dir = archive_dir or get_archive_dir()
+    content_type_key = str(content_type_id)
+    # Keyed by id: a purge interrupted before its deletes may archive a row twice
+    records = {}
+    for directory, index_path in _index_files(archive_dir, date_from, date_to):
+        with open(index_path, encoding='utf-8') as handle:
+            index = json.load(handle)
+        ids = index['objects'].get(content_type_key, [])
+        position = bisect_left(ids, object_id)
+        if position == len(ids) or ids[position] != object_id:
+            continue
+        with gzip.open(os.path.join(directory, index['file']), 'rt', encoding='utf-8') as archive:
+            for line in archive:
+                row = json.loads(line)
+                if row['content_type_id'] == content_type_id and row['object_id'] == object_id:
+                    records[row['id']] = row
+    return [records[pk] for pk in sorted(records)]
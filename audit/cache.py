@@ -0,0 +1,98 @@
+"""
+Cached audit settings and per-model audit decisions.
+
+AuditSettings is read on every audited save, so it is kept in two layers:
+the field values live in the shared Django cache under a version key, and
+each process holds the decoded settings plus a precomputed
+{(app_label, model_name): bool} decision table. A process trusts its copy
+for AUDIT_SETTINGS_LOCAL_TTL seconds and then compares its version with the
+shared one, so a change made in one process reaches the others within that
+window. Saving or deleting AuditSettings bumps the shared version and
+clears the local copy (see audit.signals). Both layers are
+bookgium.local_cache helpers.
+"""
+from django.apps import apps
+
+from bookgium.local_cache import VersionedValue, cached_instance
+
+SETTINGS_KEY = 'audit:settings'
+VERSION_KEY = 'audit:settings:version'
+
+# Models audited when no settings row is available, e.g. during migrations
+DEFAULT_AUDITED_MODELS = [
+    'account', 'journalentry', 'journalentryline', 'transaction',
+    'customuser', 'client', 'invoice'
+]
+
+
+def decide(settings, app_label, model_name):
+    """Whether a model is audited under the given settings"""
+    # Don't audit the audit models themselves
+    if app_label == 'audit':
+        return False
+
+    if settings is not None:
+        if model_name == 'account' and app_label == 'accounts':
+            return settings.audit_accounts
+        elif model_name == 'journalentry' and app_label == 'accounts':
+            return settings.audit_journal_entries
+        elif model_name == 'transaction' and app_label == 'accounts':
+            return settings.audit_transactions
+        elif model_name == 'customuser' and app_label == 'users':
+            return settings.audit_users
+        elif app_label == 'clients':
+            return settings.audit_clients
+        elif app_label == 'invoices':
+            return settings.audit_invoices
+
+    return model_name in DEFAULT_AUDITED_MODELS
+
+
+def build_decisions(settings):
+    """{(app_label, model_name): bool} for every installed model"""
+    return {
+        (model._meta.app_label, model._meta.model_name):
+            decide(settings, model._meta.app_label, model._meta.model_name)
+        for model in apps.get_models()
+    }
+
+
+def _load(version):
+    """(settings, decisions) for a shared version, from the shared cache or the database"""
+    from .models import AuditSettings
+
+    settings = cached_instance(
+        SETTINGS_KEY, version, AuditSettings, lambda: AuditSettings.objects.get_or_create(pk=1)[0]
+    )
+    return settings, build_decisions(settings)
+
+
+_audit = VersionedValue(VERSION_KEY, _load, 'AUDIT_SETTINGS_LOCAL_TTL')
+
+
+def get_audit_settings():
+    """
+    The current AuditSettings, or None if the table can't be read. The
+    instance is shared by the whole process and must not be modified.
+    """
+    value = _audit.get()
+    return value[0] if value else None
+
+
+def get_audit_decisions():
+    """The {(app_label, model_name): bool} audit decision table, or None if the settings can't be read"""
+    value = _audit.get()
+    return value[1] if value else None
+
+
+def should_audit(app_label, model_name):
+    decisions = get_audit_decisions()
+    key = (app_label, model_name)
+    if decisions is not None and key in decisions:
+        return decisions[key]
+    return decide(get_audit_settings(), app_label, model_name)
+
+
+def invalidate_audit_settings():
+    """Publish a new settings version and drop this process's copy"""
+    _audit.invalidate()
@@ -1,11 +1,17 @@
-from django.core.management.base import BaseCommand
-from django.utils import timezone
 from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from audit.archive import (
+    DEFAULT_CHUNK_SIZE, DEFAULT_DELETE_BATCH_SIZE, get_archive_dir, purge_expired_logs
+)
 from audit.models import AuditLog, AuditSettings
 
 
 class Command(BaseCommand):
-    help = 'Clean up old audit logs based on retention settings'
+    help = ('Clean up old audit logs based on retention settings: archive them to '
+            'date-partitioned gzip JSONL files, then delete them in small batches')
 
     def add_arguments(self, parser):
         parser.add_argument(
@@ -13,38 +19,82 @@ class Command(BaseCommand):
             type=int,
             help='Number of days to keep (overrides settings)',
         )
+        parser.add_argument(
+            '--archive-dir',
+            type=str,
+            help='Directory for archive files (defaults to AUDIT_ARCHIVE_DIR)',
+        )
+        parser.add_argument(
+            '--no-archive',
+            action='store_true',
+            help='Delete expired logs without archiving them',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=DEFAULT_CHUNK_SIZE,
+            help='Number of logs read and archived at a time',
+        )
+        parser.add_argument(
+            '--delete-batch-size',
+            type=int,
+            default=DEFAULT_DELETE_BATCH_SIZE,
+            help='Number of logs deleted per transaction',
+        )
+        parser.add_argument(
+            '--pause',
+            type=float,
+            default=0,
+            help='Seconds to wait between delete batches',
+        )
         parser.add_argument(
             '--dry-run',
             action='store_true',
-            help='Show what would be deleted without actually deleting',
+            help='Show what would be purged without archiving or deleting',
         )
 
     def handle(self, *args, **options):
         settings = AuditSettings.get_settings()
-        days = options.get('days') or settings.retention_days
-        
+        days = options['days'] if options['days'] is not None else settings.retention_days
+
         if days == 0:
             self.stdout.write(
-                self.style.WARNING('Retention is set to 0 (keep forever). No logs will be deleted.')
-            )
-            return
-        
-        cutoff_date = timezone.now() - timedelta(days=days)
-        old_logs = AuditLog.objects.filter(timestamp__lt=cutoff_date)
-        count = old_logs.count()
-        
-        if count == 0:
-            self.stdout.write(
-                self.style.SUCCESS(f'No audit logs older than {days} days found.')
+                self.style.WARNING('Retention is set to 0 (keep forever). No logs will be purged.')
             )
             return
-        
+
+        if options['chunk_size'] < 1 or options['delete_batch_size'] < 1:
+            raise CommandError('--chunk-size and --delete-batch-size must be at least 1')
+
+        cutoff = timezone.now() - timedelta(days=days)
+
         if options['dry_run']:
-            self.stdout.write(
-                self.style.WARNING(f'DRY RUN: Would delete {count} audit logs older than {days} days.')
-            )
+            expired = AuditLog.objects.filter(timestamp__lt=cutoff)
+            first = expired.order_by('pk').values_list('pk', flat=True).first()
+            if first is None:
+                self.stdout.write(self.style.SUCCESS(f'No audit logs older than {days} days found.'))
+            else:
+                self.stdout.write(self.style.WARNING(
+                    f'DRY RUN: Would purge {expired.count()} audit logs older than {days} days.'
+                ))
+            return
+
+        archive_dir = options['archive_dir'] or get_archive_dir()
+        archived, deleted = purge_expired_logs(
+            cutoff,
+            archive=not options['no_archive'],
+            archive_dir=archive_dir,
+            chunk_size=options['chunk_size'],
+            delete_batch_size=options['delete_batch_size'],
+            pause=options['pause'],
+            stdout=self.stdout if options['verbosity'] > 1 else None,
+        )
+
+        if not deleted:
+            self.stdout.write(self.style.SUCCESS(f'No audit logs older than {days} days found.'))
+        elif options['no_archive']:
+            self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} audit logs older than {days} days.'))
         else:
-            old_logs.delete()
-            self.stdout.write(
-                self.style.SUCCESS(f'Successfully deleted {count} audit logs older than {days} days.')
-            )
+            self.stdout.write(self.style.SUCCESS(
+                f'Archived {archived} and deleted {deleted} audit logs older than {days} days to {archive_dir}.'
+            ))
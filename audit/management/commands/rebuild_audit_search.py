@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from audit.search import index_backend, rebuild_index
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the audit log full-text search index from the audit log table'
+
+    def handle(self, *args, **options):
+        if index_backend() is None:
+            self.stdout.write(self.style.WARNING(
+                'No full-text index on this database; audit search uses substring matching.'
+            ))
+            return
+
+        indexed = rebuild_index()
+        self.stdout.write(self.style.SUCCESS(f'Indexed {indexed} audit logs.'))
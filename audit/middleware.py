@@ -1,17 +1,22 @@
 from django.utils.deprecation import MiddlewareMixin
 from .signals import set_current_request
+from .writer import start_buffering, stop_buffering
 
 
 class AuditMiddleware(MiddlewareMixin):
     """
     Middleware to set the current request in thread-local storage
-    so that signals can access it for audit logging.
+    so that signals can access it for audit logging. Audit records made
+    during the request are written in one batch when the response is ready.
     """
     
     def process_request(self, request):
         set_current_request(request)
+        request._audit_buffering = start_buffering()
         return None
     
     def process_response(self, request, response):
+        if getattr(request, '_audit_buffering', False):
+            stop_buffering()
         set_current_request(None)
         return response
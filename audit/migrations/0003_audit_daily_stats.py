@@ -0,0 +1,46 @@
+# Generated by Django 5.2.6 on 2026-10-18 22:55
+
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+
+
+def backfill_daily_stats(apps, schema_editor):
+    AuditLog = apps.get_model('audit', 'AuditLog')
+    AuditDailyStats = apps.get_model('audit', 'AuditDailyStats')
+    rows = (
+        AuditLog.objects.order_by()
+        .annotate(day=TruncDate('timestamp'))
+        .values('day', 'action')
+        .annotate(count=Count('id'))
+    )
+    AuditDailyStats.objects.bulk_create(
+        [AuditDailyStats(date=row['day'], action=row['action'], count=row['count']) for row in rows],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('audit', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuditDailyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('action', models.CharField(choices=[('create', 'Create'), ('update', 'Update'), ('delete', 'Delete'), ('view', 'View'), ('login', 'Login'), ('logout', 'Logout'), ('post_journal', 'Post Journal Entry'), ('unpost_journal', 'Unpost Journal Entry')], max_length=20)),
+                ('count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Audit Daily Statistics',
+                'verbose_name_plural': 'Audit Daily Statistics',
+                'ordering': ['-date', 'action'],
+                'unique_together': {('date', 'action')},
+            },
+        ),
+        migrations.RunPython(backfill_daily_stats, migrations.RunPython.noop),
+    ]
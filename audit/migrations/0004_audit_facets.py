@@ -0,0 +1,52 @@
+# Generated by Django 5.2.6 on 2026-10-18 22:58
+
+from django.db import migrations, models
+from django.db.models import Count
+
+# Facet name -> AuditLog column it counts, as of this migration
+FACET_COLUMNS = {
+    'user': 'user_id',
+    'content_type': 'content_type_id',
+    'action': 'action',
+}
+
+
+def backfill_facets(apps, schema_editor):
+    AuditLog = apps.get_model('audit', 'AuditLog')
+    AuditFacet = apps.get_model('audit', 'AuditFacet')
+    facets = []
+    for facet, column in FACET_COLUMNS.items():
+        rows = (
+            AuditLog.objects.order_by()
+            .filter(**{f'{column}__isnull': False})
+            .values_list(column)
+            .annotate(count=Count('id'))
+        )
+        facets.extend(AuditFacet(facet=facet, value=str(value), count=count) for value, count in rows)
+    AuditFacet.objects.bulk_create(facets, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('audit', '0003_audit_daily_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuditFacet',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('facet', models.CharField(choices=[('user', 'User'), ('content_type', 'Content Type'), ('action', 'Action')], max_length=20)),
+                ('value', models.CharField(max_length=64)),
+                ('count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Audit Facet',
+                'verbose_name_plural': 'Audit Facets',
+                'ordering': ['facet', '-count'],
+                'unique_together': {('facet', 'value')},
+            },
+        ),
+        migrations.RunPython(backfill_facets, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+from django.conf import settings
+from django.db import migrations
+
+from audit.search import create_index, drop_index
+
+
+def create_search_index(apps, schema_editor):
+    user_model = apps.get_model(settings.AUTH_USER_MODEL)
+    create_index(schema_editor, user_model._meta.db_table)
+
+
+def drop_search_index(apps, schema_editor):
+    drop_index(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('audit', '0004_audit_facets'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,20 @@
+from django.db import migrations
+
+
+def widen_log_id(apps, schema_editor):
+    # AuditLog.id is a bigint, and 0005 created the PostgreSQL index with an integer key
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    if 'audit_auditlog_search' in schema_editor.connection.introspection.table_names():
+        schema_editor.execute('ALTER TABLE audit_auditlog_search ALTER COLUMN log_id TYPE bigint')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('audit', '0005_audit_log_search'),
+    ]
+
+    operations = [
+        migrations.RunPython(widen_log_id, migrations.RunPython.noop),
+    ]
@@ -174,13 +174,61 @@ class AuditSettings(models.Model):
 
     @classmethod
     def get_settings(cls):
-        """Get or create audit settings"""
-        try:
-            settings, created = cls.objects.get_or_create(pk=1)
-            return settings
-        except Exception:
+        """
+        Get the audit settings, cached in process and in the shared cache
+        (see audit.cache). The returned instance is shared and must not be
+        modified; edit settings through AuditSettings.objects instead.
+        """
+        from .cache import get_audit_settings
+        settings = get_audit_settings()
+        if settings is None:
             # Return a default settings object if we can't access the database
             # (e.g., during migrations)
-            default_settings = cls()
-            default_settings.pk = 1
-            return default_settings
+            settings = cls()
+            settings.pk = 1
+        return settings
+
+
+class AuditDailyStats(models.Model):
+    """
+    Number of audit logs per day and action, maintained by the audit writer
+    (see audit.rollups) so dashboards don't have to count the log table.
+    """
+    date = models.DateField()
+    action = models.CharField(max_length=20, choices=AuditLog.ACTION_CHOICES)
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ['-date', 'action']
+        unique_together = ['date', 'action']
+        verbose_name = 'Audit Daily Statistics'
+        verbose_name_plural = 'Audit Daily Statistics'
+
+    def __str__(self):
+        return f"{self.date} {self.action}: {self.count}"
+
+
+class AuditFacet(models.Model):
+    """
+    Number of audit logs per user, content type and action, maintained by the
+    audit writer (see audit.rollups) so the log list filters don't have to
+    scan the log table for distinct values.
+    """
+    FACET_CHOICES = [
+        ('user', 'User'),
+        ('content_type', 'Content Type'),
+        ('action', 'Action'),
+    ]
+
+    facet = models.CharField(max_length=20, choices=FACET_CHOICES)
+    value = models.CharField(max_length=64)
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ['facet', '-count']
+        unique_together = ['facet', 'value']
+        verbose_name = 'Audit Facet'
+        verbose_name_plural = 'Audit Facets'
+
+    def __str__(self):
+        return f"{self.facet}={self.value}: {self.count}"
@@ -0,0 +1,227 @@
+"""
+Rollup tables maintained alongside the audit log.
+
+The audit writer calls apply_rollups() in the same transaction as each
+bulk insert, so AuditDailyStats holds the number of logs per local date and
+action, and AuditFacet the number of logs per user, content type and
+action, without anything having to count AuditLog. Rows removed by the
+retention commands are subtracted again with subtract_rollups(), and
+rebuild_daily_stats() / rebuild_facets() recompute the tables from the logs
+with grouped queries if they ever drift (for example after deleting logs in
+the admin).
+"""
+from collections import Counter
+from datetime import datetime, time, timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import AuditDailyStats, AuditFacet, AuditLog
+
+
+def day_range(start_date, end_date):
+    """
+    Aware datetimes bounding local dates start_date..end_date inclusive.
+    Filtering on timestamp__gte/lt with these can use the timestamp index,
+    unlike timestamp__date lookups.
+    """
+    tz = timezone.get_current_timezone()
+    start = timezone.make_aware(datetime.combine(start_date, time.min), tz)
+    end = timezone.make_aware(datetime.combine(end_date + timedelta(days=1), time.min), tz)
+    return start, end
+
+
+def _local_date(value):
+    return timezone.localtime(value).date() if timezone.is_aware(value) else value.date()
+
+
+def _add(counts):
+    """Add {(date, action): n} to the daily stats, creating rows as needed"""
+    for (day, action), count in counts.items():
+        if not count:
+            continue
+        updated = AuditDailyStats.objects.filter(date=day, action=action).update(count=F('count') + count)
+        if updated:
+            continue
+        try:
+            with transaction.atomic():
+                AuditDailyStats.objects.create(date=day, action=action, count=count)
+        except IntegrityError:
+            # Another writer created the row first
+            AuditDailyStats.objects.filter(date=day, action=action).update(count=F('count') + count)
+
+
+def _add_facets(counts):
+    """Add {(facet, value): n} to the facet counts, creating rows as needed"""
+    for (facet, value), count in counts.items():
+        if not count:
+            continue
+        updated = AuditFacet.objects.filter(facet=facet, value=value).update(count=F('count') + count)
+        if updated:
+            continue
+        try:
+            with transaction.atomic():
+                AuditFacet.objects.create(facet=facet, value=value, count=count)
+        except IntegrityError:
+            # Another writer created the row first
+            AuditFacet.objects.filter(facet=facet, value=value).update(count=F('count') + count)
+
+
+def _facet_values(log):
+    yield 'action', log.action
+    if log.user_id is not None:
+        yield 'user', str(log.user_id)
+    if log.content_type_id is not None:
+        yield 'content_type', str(log.content_type_id)
+
+
+def apply_rollups(records):
+    """Account for newly written AuditLog instances"""
+    _add(Counter((_local_date(log.timestamp), log.action) for log in records))
+    _add_facets(Counter(value for log in records for value in _facet_values(log)))
+
+
+def daily_counts(queryset):
+    """{(date, action): count} for a log queryset, in one grouped query"""
+    rows = (
+        queryset.order_by()
+        .annotate(day=TruncDate('timestamp'))
+        .values('day', 'action')
+        .annotate(count=Count('id'))
+    )
+    return {(row['day'], row['action']): row['count'] for row in rows}
+
+
+# Facet name -> AuditLog column it counts
+FACET_COLUMNS = {
+    'user': 'user_id',
+    'content_type': 'content_type_id',
+    'action': 'action',
+}
+
+
+def facet_counts(queryset):
+    """{(facet, value): count} for a log queryset, in one grouped query per facet"""
+    counts = {}
+    for facet, column in FACET_COLUMNS.items():
+        rows = (
+            queryset.order_by()
+            .filter(**{f'{column}__isnull': False})
+            .values_list(column)
+            .annotate(count=Count('id'))
+        )
+        for value, count in rows:
+            counts[(facet, str(value))] = count
+    return counts
+
+
+def subtract_rollups(queryset):
+    """Take logs that are about to be deleted out of the daily stats and facets"""
+    for (day, action), count in daily_counts(queryset).items():
+        AuditDailyStats.objects.filter(date=day, action=action).update(count=F('count') - count)
+    AuditDailyStats.objects.filter(count__lte=0).delete()
+    for (facet, value), count in facet_counts(queryset).items():
+        AuditFacet.objects.filter(facet=facet, value=value).update(count=F('count') - count)
+    AuditFacet.objects.filter(count__lte=0).delete()
+
+
+def rebuild_daily_stats(start_date=None, end_date=None):
+    """
+    Recompute AuditDailyStats from the log table, optionally only for local
+    dates start_date..end_date. Returns the number of rows written.
+    """
+    logs = AuditLog.objects.all()
+    stats = AuditDailyStats.objects.all()
+    if start_date:
+        logs = logs.filter(timestamp__gte=day_range(start_date, start_date)[0])
+        stats = stats.filter(date__gte=start_date)
+    if end_date:
+        logs = logs.filter(timestamp__lt=day_range(end_date, end_date)[1])
+        stats = stats.filter(date__lte=end_date)
+    counts = daily_counts(logs)
+    with transaction.atomic():
+        stats.delete()
+        AuditDailyStats.objects.bulk_create(
+            [AuditDailyStats(date=day, action=action, count=count)
+             for (day, action), count in counts.items()],
+            batch_size=1000,
+        )
+    return len(counts)
+
+
+def rebuild_facets():
+    """Recompute AuditFacet from the whole log table. Returns the number of rows written."""
+    counts = facet_counts(AuditLog.objects.all())
+    with transaction.atomic():
+        AuditFacet.objects.all().delete()
+        AuditFacet.objects.bulk_create(
+            [AuditFacet(facet=facet, value=value, count=count)
+             for (facet, value), count in counts.items()],
+            batch_size=1000,
+        )
+    return len(counts)
+
+
+def get_facets(facet):
+    """{value: count} for one facet, e.g. {'3': 120} for user id 3"""
+    return dict(AuditFacet.objects.filter(facet=facet).values_list('value', 'count'))
+
+
+def rollup_log_count(user=None, content_type=None, action=None, start_date=None, end_date=None):
+    """
+    Number of logs matching the list filters, when the rollup tables can
+    answer it: a single user or content type filter from the facets, or any
+    combination of action and dates from the daily stats. None otherwise,
+    and also when the rollups have no matching rows: they may not have been
+    built yet, and counting an empty result is cheap anyway.
+    """
+    if user or content_type:
+        if user and content_type or action or start_date or end_date:
+            return None
+        facet, value = ('user', user) if user else ('content_type', content_type)
+        return AuditFacet.objects.filter(facet=facet, value=str(value)).values_list('count', flat=True).first()
+
+    queryset = AuditDailyStats.objects.all()
+    if action:
+        queryset = queryset.filter(action=action)
+    if start_date:
+        queryset = queryset.filter(date__gte=start_date)
+    if end_date:
+        queryset = queryset.filter(date__lte=end_date)
+    return queryset.aggregate(total=Sum('count'))['total'] or None
+
+
+def daily_activity(start_date, end_date):
+    """[{'date': 'YYYY-MM-DD', 'count': n}, ...] for every day in the range"""
+    totals = dict(
+        AuditDailyStats.objects.filter(date__gte=start_date, date__lte=end_date)
+        .order_by()
+        .values_list('date')
+        .annotate(total=Sum('count'))
+    )
+    activity = []
+    day = start_date
+    while day <= end_date:
+        activity.append({'date': day.strftime('%Y-%m-%d'), 'count': totals.get(day, 0)})
+        day += timedelta(days=1)
+    return activity
+
+
+def action_totals(start_date=None):
+    """[{'action': ..., 'count': n}, ...] ordered by count, optionally since a date"""
+    queryset = AuditDailyStats.objects.all()
+    if start_date:
+        queryset = queryset.filter(date__gte=start_date)
+    return list(
+        queryset.order_by().values('action').annotate(count=Sum('count')).order_by('-count')
+    )
+
+
+def total_logs(start_date=None):
+    """Number of logs, optionally since a date, from the daily stats"""
+    queryset = AuditDailyStats.objects.all()
+    if start_date:
+        queryset = queryset.filter(date__gte=start_date)
+    return queryset.aggregate(total=Sum('count'))['total'] or 0
@@ -0,0 +1,201 @@
+"""
+Full-text index over audit logs.
+
+Each log's object representation, notes and username are indexed in a side
+table keyed by the log id:
+
+* SQLite: an FTS5 virtual table, audit_auditlog_fts (rowid = log id).
+* PostgreSQL: audit_auditlog_search, a tsvector per log with a GIN index.
+  Its log_id references the log with ON DELETE CASCADE.
+
+The table is created and backfilled by migration 0005. The audit writer
+calls index_logs() in the same transaction as each bulk insert, and the
+retention paths call unindex_logs() before deleting. search_logs() filters
+a log queryset through the index and orders it by relevance. Each search
+word matches as a prefix. On other databases, or on a SQLite build without
+FTS5, it falls back to icontains lookups.
+"""
+import re
+
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+SQLITE_TABLE = 'audit_auditlog_fts'
+POSTGRES_TABLE = 'audit_auditlog_search'
+
+# The text of all three columns goes into one document, without stemming
+POSTGRES_CONFIG = 'simple'
+
+_WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def index_backend():
+    """'sqlite' or 'postgresql' when the search table exists, else None"""
+    vendor = connection.vendor
+    table = {'sqlite': SQLITE_TABLE, 'postgresql': POSTGRES_TABLE}.get(vendor)
+    if table is None:
+        return None
+    available = getattr(connection, '_audit_search_available', None)
+    if available is None:
+        available = table in connection.introspection.table_names()
+        connection._audit_search_available = available
+    return vendor if available else None
+
+
+def create_index(schema_editor, user_table):
+    """Create and backfill the search table. Called from the migration."""
+    vendor = schema_editor.connection.vendor
+    schema_editor.connection._audit_search_available = None
+    if vendor == 'sqlite':
+        try:
+            schema_editor.execute(
+                f'CREATE VIRTUAL TABLE {SQLITE_TABLE} USING fts5(object_repr, notes, username)'
+            )
+        except Exception:
+            # SQLite built without FTS5: search keeps using icontains
+            return
+        schema_editor.execute(
+            f'INSERT INTO {SQLITE_TABLE} (rowid, object_repr, notes, username) '
+            f'SELECT log.id, log.object_repr, log.notes, COALESCE(u.username, \'\') '
+            f'FROM audit_auditlog log LEFT JOIN {user_table} u ON u.id = log.user_id'
+        )
+    elif vendor == 'postgresql':
+        schema_editor.execute(
+            f'CREATE TABLE {POSTGRES_TABLE} ('
+            f'log_id bigint PRIMARY KEY REFERENCES audit_auditlog (id) ON DELETE CASCADE, '
+            f'document tsvector NOT NULL)'
+        )
+        schema_editor.execute(
+            f'CREATE INDEX {POSTGRES_TABLE}_document_gin ON {POSTGRES_TABLE} USING GIN (document)'
+        )
+        schema_editor.execute(
+            f'INSERT INTO {POSTGRES_TABLE} (log_id, document) '
+            f"SELECT log.id, to_tsvector('{POSTGRES_CONFIG}', concat_ws(' ', log.object_repr, log.notes, u.username)) "
+            f'FROM audit_auditlog log LEFT JOIN {user_table} u ON u.id = log.user_id'
+        )
+
+
+def drop_index(schema_editor):
+    vendor = schema_editor.connection.vendor
+    schema_editor.connection._audit_search_available = None
+    if vendor == 'sqlite':
+        schema_editor.execute(f'DROP TABLE IF EXISTS {SQLITE_TABLE}')
+    elif vendor == 'postgresql':
+        schema_editor.execute(f'DROP TABLE IF EXISTS {POSTGRES_TABLE}')
+
+
+def _usernames(records):
+    """{user_id: username} for the records, loading only users not already cached"""
+    from .models import AuditLog
+
+    names = {}
+    missing = set()
+    for log in records:
+        if log.user_id is None or log.user_id in names:
+            continue
+        if AuditLog.user.is_cached(log):
+            names[log.user_id] = log.user.username
+        else:
+            missing.add(log.user_id)
+    if missing:
+        from django.contrib.auth import get_user_model
+        names.update(get_user_model().objects.filter(pk__in=missing).values_list('pk', 'username'))
+    return names
+
+
+def index_logs(records):
+    """Add newly written AuditLog instances (with primary keys) to the index"""
+    backend = index_backend()
+    records = [log for log in records if log.pk is not None]
+    if backend is None or not records:
+        return
+    names = _usernames(records)
+    rows = [
+        (log.pk, log.object_repr or '', log.notes or '', names.get(log.user_id, ''))
+        for log in records
+    ]
+    with connection.cursor() as cursor:
+        if backend == 'sqlite':
+            cursor.executemany(
+                f'INSERT INTO {SQLITE_TABLE} (rowid, object_repr, notes, username) VALUES (%s, %s, %s, %s)',
+                rows,
+            )
+        else:
+            cursor.executemany(
+                f'INSERT INTO {POSTGRES_TABLE} (log_id, document) '
+                f"VALUES (%s, to_tsvector('{POSTGRES_CONFIG}', concat_ws(' ', %s::text, %s::text, %s::text)))",
+                rows,
+            )
+
+
+def unindex_logs(queryset):
+    """Remove logs that are about to be deleted from the index"""
+    # PostgreSQL rows go with their logs through ON DELETE CASCADE
+    if index_backend() != 'sqlite':
+        return
+    sql, params = queryset.order_by().values('pk').query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {SQLITE_TABLE} WHERE rowid IN ({sql})', params)
+
+
+def rebuild_index():
+    """Re-index every log. Returns the number of logs indexed."""
+    from .models import AuditLog
+
+    backend = index_backend()
+    if backend is None:
+        return 0
+    table = SQLITE_TABLE if backend == 'sqlite' else POSTGRES_TABLE
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {table}')
+    indexed = 0
+    last_id = 0
+    while True:
+        batch = list(AuditLog.objects.select_related('user').filter(pk__gt=last_id).order_by('pk')[:5000])
+        if not batch:
+            return indexed
+        index_logs(batch)
+        indexed += len(batch)
+        last_id = batch[-1].pk
+
+
+def search_logs(queryset, query):
+    """
+    Filter a log queryset to the logs matching every word of query (as a
+    prefix), ordered best match first and then newest first.
+    """
+    words = _WORD_RE.findall(query.lower())
+    if not words:
+        return queryset
+
+    backend = index_backend()
+    table = queryset.model._meta.db_table
+    if backend == 'sqlite':
+        match = ' '.join(f'"{word}"*' for word in words)
+        matches = RawSQL(f'SELECT rowid FROM {SQLITE_TABLE} WHERE {SQLITE_TABLE} MATCH %s', [match])
+        # bm25 rank: lower is a better match
+        rank = RawSQL(
+            f'SELECT rank FROM {SQLITE_TABLE} WHERE {SQLITE_TABLE} MATCH %s AND rowid = {table}.id',
+            [match],
+        )
+        return queryset.filter(pk__in=matches).annotate(search_rank=rank).order_by('search_rank', '-timestamp')
+
+    if backend == 'postgresql':
+        tsquery = ' & '.join(f'{word}:*' for word in words)
+        matches = RawSQL(
+            f"SELECT log_id FROM {POSTGRES_TABLE} WHERE document @@ to_tsquery('{POSTGRES_CONFIG}', %s)",
+            [tsquery],
+        )
+        rank = RawSQL(
+            f"SELECT ts_rank(document, to_tsquery('{POSTGRES_CONFIG}', %s)) "
+            f'FROM {POSTGRES_TABLE} WHERE log_id = {table}.id',
+            [tsquery],
+        )
+        return queryset.filter(pk__in=matches).annotate(search_rank=rank).order_by('-search_rank', '-timestamp')
+
+    return queryset.filter(
+        Q(object_repr__icontains=query) |
+        Q(notes__icontains=query) |
+        Q(user__username__icontains=query)
+    )
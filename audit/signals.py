@@ -1,10 +1,14 @@
-from django.db.models.signals import post_save, post_delete, pre_save
+from django.apps import apps
+from django.db.models.signals import post_save, post_delete
 from django.contrib.auth.signals import user_logged_in, user_logged_out
 from django.dispatch import receiver
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.auth import get_user_model
 from django.utils import timezone
+from .cache import invalidate_audit_settings, should_audit
 from .models import AuditLog, UserSession, AuditSettings
+from .snapshot import AuditedModelMixin, get_snapshot, reset_snapshot
+from .writer import record
 from .utils import get_client_ip, get_user_agent, get_model_changes
 import threading
 
@@ -51,14 +55,14 @@ def log_user_login(sender, request, user, **kwargs):
     )
     
     # Create audit log
-    AuditLog.objects.create(
+    record(AuditLog(
         user=user,
         action='login',
         ip_address=ip_address,
         user_agent=user_agent,
         session_key=session_key,
         notes=f'User logged in from {ip_address}'
-    )
+    ))
 
 
 @receiver(user_logged_out)
@@ -84,33 +88,22 @@ def log_user_logout(sender, request, user, **kwargs):
         )
         
         # Create audit log
-        AuditLog.objects.create(
+        record(AuditLog(
             user=user,
             action='logout',
             ip_address=ip_address,
             user_agent=user_agent,
             session_key=session_key,
             notes=f'User logged out from {ip_address}'
-        )
-
-
-@receiver(pre_save)
-def store_original_instance(sender, instance, **kwargs):
-    """Store original instance data before save for comparison"""
-    if not should_audit_model(sender):
-        return
-    
-    if instance.pk:  # Only for updates
-        try:
-            original = sender.objects.get(pk=instance.pk)
-            instance._original_instance = original
-        except sender.DoesNotExist:
-            instance._original_instance = None
+        ))
 
 
-@receiver(post_save)
 def log_model_save(sender, instance, created, **kwargs):
     """Log model creation and updates"""
+    snapshot = get_snapshot(instance)
+    # The saved values are the baseline for the instance's next save
+    reset_snapshot(instance)
+    
     if not should_audit_model(sender):
         return
     
@@ -129,17 +122,21 @@ def log_model_save(sender, instance, created, **kwargs):
     
     action = 'create' if created else 'update'
     changes = {}
+    notes = f'{action.title()} {sender._meta.verbose_name}'
     
-    if not created and hasattr(instance, '_original_instance') and instance._original_instance:
-        changes = get_model_changes(instance._original_instance, instance)
-    
-    # Don't log if no changes were made
-    if not created and not changes:
-        return
+    if not created:
+        if snapshot is None:
+            # Saved without being loaded first, so there is nothing to diff against
+            notes += ' (previous values not loaded)'
+        else:
+            changes = get_model_changes(snapshot, instance)
+            # Don't log if no changes were made
+            if not changes:
+                return
     
     content_type = ContentType.objects.get_for_model(sender)
     
-    AuditLog.objects.create(
+    record(AuditLog(
         user=user,
         action=action,
         content_type=content_type,
@@ -149,11 +146,10 @@ def log_model_save(sender, instance, created, **kwargs):
         ip_address=get_client_ip(request) if request else None,
         user_agent=get_user_agent(request) if request else None,
         session_key=request.session.session_key if request and hasattr(request, 'session') else None,
-        notes=f'{action.title()} {sender._meta.verbose_name}'
-    )
+        notes=notes
+    ))
 
 
-@receiver(post_delete)
 def log_model_delete(sender, instance, **kwargs):
     """Log model deletion"""
     if not should_audit_model(sender):
@@ -172,7 +168,7 @@ def log_model_delete(sender, instance, **kwargs):
     
     content_type = ContentType.objects.get_for_model(sender)
     
-    AuditLog.objects.create(
+    record(AuditLog(
         user=user,
         action='delete',
         content_type=content_type,
@@ -182,54 +178,72 @@ def log_model_delete(sender, instance, **kwargs):
         user_agent=get_user_agent(request) if request else None,
         session_key=request.session.session_key if request and hasattr(request, 'session') else None,
         notes=f'Deleted {sender._meta.verbose_name}'
-    )
+    ))
+
+
+def log_bulk_create(model, instances, user=None):
+    """
+    Log creation of instances written with bulk_create, which sends no
+    post_save. Records the same entries log_model_save would have.
+    """
+    if not instances or not should_audit_model(model):
+        return
+    if not AuditSettings.get_settings().audit_create:
+        return
+
+    request = get_current_request()
+    if user is None:
+        user = getattr(request, 'user', None) if request else None
+
+    # Skip if user is not authenticated or is anonymous
+    if not user or not user.is_authenticated:
+        return
+
+    content_type = ContentType.objects.get_for_model(model)
+    notes = f'Create {model._meta.verbose_name}'
+    for instance in instances:
+        record(AuditLog(
+            user=user,
+            action='create',
+            content_type=content_type,
+            object_id=instance.pk,
+            object_repr=str(instance)[:200],
+            changes={},
+            ip_address=get_client_ip(request) if request else None,
+            user_agent=get_user_agent(request) if request else None,
+            session_key=request.session.session_key if request and hasattr(request, 'session') else None,
+            notes=notes
+        ))
 
 
 def should_audit_model(model):
     """Determine if a model should be audited based on settings"""
-    model_name = model._meta.model_name.lower()
-    app_name = model._meta.app_label.lower()
-    
-    # Don't audit the audit models themselves
-    if app_name == 'audit':
-        return False
-    
-    # During migrations, just audit important models with default settings
-    try:
-        from .models import AuditSettings
-        settings = AuditSettings.get_settings()
-        
-        # Check specific model settings
-        if model_name == 'account' and app_name == 'accounts':
-            return settings.audit_accounts
-        elif model_name == 'journalentry' and app_name == 'accounts':
-            return settings.audit_journal_entries
-        elif model_name == 'transaction' and app_name == 'accounts':
-            return settings.audit_transactions
-        elif model_name == 'customuser' and app_name == 'users':
-            return settings.audit_users
-        elif app_name == 'clients':
-            return settings.audit_clients
-        elif app_name == 'invoices':
-            return settings.audit_invoices
-    except:
-        # If we can't get settings (e.g., during migrations), use defaults
-        pass
-    
-    # Default to auditing important models
-    important_models = [
-        'account', 'journalentry', 'journalentryline', 'transaction',
-        'customuser', 'client', 'invoice'
-    ]
-    
-    return model_name in important_models
+    return should_audit(model._meta.app_label, model._meta.model_name)
+
+
+@receiver(post_save, sender=AuditSettings)
+@receiver(post_delete, sender=AuditSettings)
+def audit_settings_changed(sender, instance, **kwargs):
+    """Drop cached settings and audit decisions in every process"""
+    invalidate_audit_settings()
+
+
+def connect_audit_receivers():
+    """
+    Connect the change receivers to the models that can be audited, i.e.
+    those using AuditedModelMixin, instead of to every model.
+    """
+    for model in apps.get_models():
+        if issubclass(model, AuditedModelMixin):
+            post_save.connect(log_model_save, sender=model, dispatch_uid=f'audit_save_{model._meta.label_lower}')
+            post_delete.connect(log_model_delete, sender=model, dispatch_uid=f'audit_delete_{model._meta.label_lower}')
 
 
 def log_journal_posting(journal_entry, user, request=None):
     """Manually log journal entry posting/unposting"""
     action = 'post_journal' if journal_entry.is_posted else 'unpost_journal'
     
-    AuditLog.objects.create(
+    record(AuditLog(
         user=user,
         action=action,
         content_type=ContentType.objects.get_for_model(journal_entry),
@@ -239,4 +253,4 @@ def log_journal_posting(journal_entry, user, request=None):
         user_agent=get_user_agent(request) if request else None,
         session_key=request.session.session_key if request and hasattr(request, 'session') else None,
         notes=f'Journal entry {action.replace("_", " ")}'
-    )
+    ))
@@ -0,0 +1,41 @@
+"""
+Original-value snapshots for audited models.
+
+Models that mix in AuditedModelMixin remember the raw column values they
+were loaded with, so an update can be diffed against them without reading
+the row again. The audit receivers are connected only to these models (see
+audit.signals.connect_audit_receivers).
+
+This module must not import any models: it is imported from the models
+modules of the audited apps while the app registry is still loading.
+"""
+
+
+class AuditedModelMixin:
+    """Keep a snapshot of the field values an instance was loaded with"""
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # field_names are attnames, so foreign keys are kept as raw ids
+        instance._audit_snapshot = dict(zip(field_names, values))
+        return instance
+
+
+def take_snapshot(instance):
+    """Snapshot an instance's current loaded field values"""
+    loaded = instance.__dict__
+    return {
+        field.attname: loaded[field.attname]
+        for field in instance._meta.concrete_fields
+        if field.attname in loaded
+    }
+
+
+def get_snapshot(instance):
+    """The values the instance was loaded or last saved with, or None"""
+    return getattr(instance, '_audit_snapshot', None)
+
+
+def reset_snapshot(instance):
+    instance._audit_snapshot = take_snapshot(instance)
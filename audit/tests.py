@@ -1 +1,582 @@
-# Empty test file for audit app
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+import gzip
+from importlib import import_module
+from io import StringIO
+import os
+import tempfile
+import threading
+from unittest import mock
+
+from django.apps import apps as django_apps
+from django.contrib.auth import get_user_model
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import DatabaseError, connection, transaction
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts.models import Account
+from bookgium.local_cache import field_values, publish_version
+from bookgium.query_budget import QueryBudgetTestCase
+from payroll.models import PayrollPeriod
+
+from . import cache as audit_cache, writer
+from .archive import ARCHIVE_FIELDS, find_archived_logs, purge_expired_logs, write_partition
+from .cache import (
+    SETTINGS_KEY, VERSION_KEY, decide, get_audit_decisions, get_audit_settings, invalidate_audit_settings,
+    should_audit,
+)
+from .middleware import AuditMiddleware
+from .models import AuditDailyStats, AuditFacet, AuditLog, AuditSettings
+from .rollups import (
+    get_facets, rebuild_daily_stats, rebuild_facets, rollup_log_count, subtract_rollups, total_logs
+)
+from .search import index_backend, rebuild_index, search_logs, unindex_logs
+from .signals import set_current_request
+from .snapshot import AuditedModelMixin
+from .views import EstimatedCountPaginator
+
+# view name: (max queries, max seconds) against the seeded tenant
+BUDGETS = {
+    'audit_chart_data': (3, 1.0),
+}
+
+
+class AuditQueryBudgetTests(QueryBudgetTestCase):
+
+    def test_audit_chart_data(self):
+        url = reverse('audit:chart_data')
+        self.get_within_budget('audit_chart_data', url, *BUDGETS['audit_chart_data'])
+        self.assertQueriesDoNotScale('audit_chart_data', url)
+
+
+class AuditWriterTests(TransactionTestCase):
+
+    def log(self, note):
+        return AuditLog(action='view', notes=note)
+
+    def written(self):
+        return set(AuditLog.objects.values_list('notes', flat=True))
+
+    def test_written_when_the_transaction_commits(self):
+        with transaction.atomic():
+            writer.record(self.log('committed'))
+            self.assertEqual(self.written(), set())
+        self.assertEqual(self.written(), {'committed'})
+
+    def test_discarded_when_the_transaction_rolls_back(self):
+        with self.assertRaises(ValueError):
+            with transaction.atomic():
+                writer.record(self.log('rolled back'))
+                raise ValueError
+        self.assertEqual(self.written(), set())
+
+    def test_discarded_with_a_rolled_back_savepoint(self):
+        with transaction.atomic():
+            writer.record(self.log('before'))
+            with self.assertRaises(ValueError):
+                with transaction.atomic():
+                    writer.record(self.log('inside'))
+                    raise ValueError
+            with transaction.atomic():
+                writer.record(self.log('released savepoint'))
+            writer.record(self.log('after'))
+        self.assertEqual(self.written(), {'before', 'released savepoint', 'after'})
+
+    def test_scope_writes_once_at_the_end(self):
+        with writer.buffered_audit():
+            writer.record(self.log('one'))
+            with transaction.atomic():
+                writer.record(self.log('two'))
+            self.assertEqual(self.written(), set())
+        self.assertEqual(self.written(), {'one', 'two'})
+
+    @override_settings(AUDIT_WRITER_BATCH_SIZE=2)
+    def test_scope_flushes_a_full_batch(self):
+        with writer.buffered_audit():
+            writer.record(self.log('one'))
+            self.assertEqual(self.written(), set())
+            writer.record(self.log('two'))
+            self.assertEqual(self.written(), {'one', 'two'})
+
+    def test_request_scope(self):
+        def view(request):
+            writer.record(self.log('one'))
+            writer.record(self.log('two'))
+            self.assertEqual(self.written(), set())
+            return HttpResponse()
+
+        with mock.patch.object(writer, 'write', wraps=writer.write) as write:
+            AuditMiddleware(view)(RequestFactory().get('/'))
+        write.assert_called_once()
+        self.assertEqual(self.written(), {'one', 'two'})
+
+    @override_settings(AUDIT_WRITER_MODE='background')
+    def test_background_writer(self):
+        writer.record(self.log('queued'))
+        writer.get_background_writer().drain()
+        self.assertEqual(self.written(), {'queued'})
+
+    def test_background_queue_drops_when_full(self):
+        release = threading.Event()
+        before = writer.get_writer_metrics()['dropped']
+        with mock.patch.object(writer, 'bulk_write', side_effect=lambda records: release.wait(5)):
+            background = writer.BackgroundWriter(maxsize=1, put_timeout=0.01)
+            with self.assertLogs('audit.writer', 'WARNING'):
+                background.submit([self.log('a'), self.log('b'), self.log('c')])
+            release.set()
+            background.drain()
+        # The writer thread holds at most one record and the queue one more
+        self.assertGreaterEqual(writer.get_writer_metrics()['dropped'] - before, 1)
+
+    def test_metrics(self):
+        before = writer.get_writer_metrics()
+        writer.record(self.log('one'))
+        with writer.buffered_audit():
+            writer.record(self.log('two'))
+            writer.record(self.log('three'))
+        metrics = writer.get_writer_metrics()
+        self.assertEqual(metrics['recorded'] - before['recorded'], 3)
+        self.assertEqual(metrics['written'] - before['written'], 3)
+        self.assertEqual(metrics['flushes'] - before['flushes'], 2)
+        self.assertGreaterEqual(metrics['max_flush_latency_ms'], metrics['last_flush_latency_ms'])
+        self.assertGreater(metrics['avg_flush_latency_ms'], 0)
+        self.assertEqual(metrics['mode'], 'sync')
+
+
+class AuditSearchTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = get_user_model().objects.create_user('alice', 'alice@example.invalid', 'password')
+        cls.bob = get_user_model().objects.create_user('bob', 'bob@example.invalid', 'password')
+        cls.logs = [
+            AuditLog(user=cls.alice, action='update', object_repr='Invoice INV-00042', notes='Updated invoice'),
+            AuditLog(user=cls.bob, action='create', object_repr='Account 1000 Cash', notes='Created account'),
+            AuditLog(user=cls.bob, action='delete', object_repr='Invoice INV-00043', notes='Deleted invoice'),
+        ]
+        writer.bulk_write(cls.logs)
+
+    def found(self, query):
+        return list(search_logs(AuditLog.objects.all(), query).values_list('object_repr', flat=True))
+
+    def test_uses_the_fts5_index(self):
+        self.assertEqual(index_backend(), 'sqlite')
+
+    def test_words_match_as_prefixes(self):
+        self.assertEqual(set(self.found('invo')), {'Invoice INV-00042', 'Invoice INV-00043'})
+        self.assertEqual(self.found('cash'), ['Account 1000 Cash'])
+
+    def test_every_word_must_match(self):
+        self.assertEqual(self.found('invoice deleted'), ['Invoice INV-00043'])
+        self.assertEqual(self.found('invoice cash'), [])
+
+    def test_matches_username(self):
+        self.assertEqual(set(self.found('bob')), {'Account 1000 Cash', 'Invoice INV-00043'})
+
+    def test_best_match_first(self):
+        # Newer than the others, but mentions invoices only once
+        writer.bulk_write([AuditLog(user=self.alice, action='view', object_repr='Customer Acme',
+                                    notes='Sent an invoice', timestamp=timezone.now() + timedelta(days=1))])
+        found = self.found('invoice')
+        self.assertEqual(len(found), 3)
+        self.assertEqual(found[-1], 'Customer Acme')
+
+    def test_no_words_leaves_the_queryset_alone(self):
+        self.assertEqual(len(self.found('  -- ')), 3)
+
+    def test_unindexed_logs_are_not_found(self):
+        unindex_logs(AuditLog.objects.filter(pk=self.logs[2].pk))
+        self.assertEqual(self.found('invoice'), ['Invoice INV-00042'])
+
+    def test_rebuild_index(self):
+        unindex_logs(AuditLog.objects.all())
+        self.assertEqual(self.found('invoice'), [])
+        self.assertEqual(rebuild_index(), 3)
+        self.assertEqual(len(self.found('invoice')), 2)
+
+    def test_falls_back_to_icontains(self):
+        with mock.patch('audit.search.index_backend', return_value=None):
+            self.assertEqual(set(self.found('INV-0004')), {'Invoice INV-00042', 'Invoice INV-00043'})
+            self.assertEqual(self.found('alice'), ['Invoice INV-00042'])
+
+
+class AuditedModelTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user('editor', 'editor@example.invalid', 'password')
+
+    def setUp(self):
+        request = RequestFactory().get('/')
+        request.user = self.user
+        set_current_request(request)
+        self.addCleanup(set_current_request, None)
+        patcher = mock.patch('audit.signals.record')
+        self.record = patcher.start()
+        self.addCleanup(patcher.stop)
+        # Load the settings, audit decisions and content type once
+        Account.objects.create(code='0001', name='Warm up')
+        self.record.reset_mock()
+
+    def logged(self):
+        return [log for (log,), kwargs in self.record.call_args_list]
+
+    def test_create_adds_no_query(self):
+        with self.assertNumQueries(1):
+            account = Account.objects.create(code='1000', name='Cash')
+        [log] = self.logged()
+        self.assertEqual((log.action, log.object_id, log.user), ('create', account.pk, self.user))
+
+    def test_update_adds_no_query(self):
+        account = Account.objects.create(code='1000', name='Cash')
+        account = Account.objects.get(pk=account.pk)
+        self.record.reset_mock()
+        account.name = 'Petty cash'
+        with self.assertNumQueries(1):
+            account.save()
+        [log] = self.logged()
+        self.assertEqual(log.changes, {'name': {'old': 'Cash', 'new': 'Petty cash'}})
+
+    def test_delete_adds_no_query(self):
+        unaudited = Account.objects.create(code='1000', name='Cash')
+        audited = Account.objects.create(code='1001', name='Bank')
+        with mock.patch('audit.signals.should_audit_model', return_value=False):
+            with CaptureQueriesContext(connection) as baseline:
+                unaudited.delete()
+        self.record.reset_mock()
+        with self.assertNumQueries(len(baseline.captured_queries)):
+            audited.delete()
+        [log] = self.logged()
+        self.assertEqual(log.action, 'delete')
+
+    def test_unchanged_save_is_not_logged(self):
+        account = Account.objects.get(code='0001')
+        account.save()
+        self.assertEqual(self.logged(), [])
+
+    def test_foreign_keys_are_diffed_by_raw_id(self):
+        parent = Account.objects.create(code='1000', name='Current assets')
+        account = Account.objects.get(code='0001')
+        self.record.reset_mock()
+        account.parent_id = parent.pk
+        with self.assertNumQueries(1):
+            account.save()
+        [log] = self.logged()
+        self.assertEqual(log.changes, {'parent': {'old': None, 'new': parent.pk}})
+
+    def test_other_models_are_not_audited(self):
+        self.assertNotIsInstance(PayrollPeriod(), AuditedModelMixin)
+        with mock.patch('audit.signals.should_audit_model', return_value=True):
+            PayrollPeriod.objects.create(
+                name='Unaudited', period_type='monthly', start_date=date(2026, 1, 1),
+                end_date=date(2026, 1, 31), pay_date=date(2026, 1, 31),
+            )
+        self.assertEqual(self.logged(), [])
+
+
+class AuditArchiveTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = get_user_model().objects.create_user('auditor', 'auditor@example.invalid', 'password',
+                                                         is_staff=True)
+        cls.account_type = ContentType.objects.get_for_model(Account)
+        now = timezone.now()
+        cls.old_days = [now - timedelta(days=401), now - timedelta(days=400)]
+        writer.bulk_write([
+            AuditLog(action='create', content_type=cls.account_type, object_id=1, timestamp=cls.old_days[0]),
+            AuditLog(action='create', content_type=cls.account_type, object_id=2, timestamp=cls.old_days[0]),
+            AuditLog(action='update', content_type=cls.account_type, object_id=1, timestamp=cls.old_days[1]),
+            AuditLog(action='update', content_type=cls.account_type, object_id=1, timestamp=now),
+        ])
+        cls.cutoff = now - timedelta(days=365)
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.archive_dir = tmp.name
+
+    def purge(self, **kwargs):
+        return purge_expired_logs(self.cutoff, archive_dir=self.archive_dir, **kwargs)
+
+    def found(self, object_id, **kwargs):
+        logs = find_archived_logs(self.account_type.pk, object_id, archive_dir=self.archive_dir, **kwargs)
+        return [(log['object_id'], log['action']) for log in logs]
+
+    def test_purge_archives_then_deletes(self):
+        self.assertEqual(self.purge(chunk_size=2, delete_batch_size=1), (3, 3))
+        self.assertEqual(AuditLog.objects.count(), 1)
+        self.assertEqual(total_logs(), 1)
+        days = sorted(os.listdir(self.archive_dir))
+        self.assertEqual(days, sorted({timezone.localdate(ts).isoformat() for ts in self.old_days}))
+
+    def test_purge_without_archive(self):
+        self.assertEqual(self.purge(archive=False), (0, 3))
+        self.assertEqual(os.listdir(self.archive_dir), [])
+        self.assertEqual(AuditLog.objects.count(), 1)
+
+    def test_find_archived_logs(self):
+        self.purge()
+        self.assertEqual(self.found(1), [(1, 'create'), (1, 'update')])
+        self.assertEqual(self.found(2), [(2, 'create')])
+        self.assertEqual(self.found(3), [])
+
+    def test_find_archived_logs_by_date(self):
+        self.purge()
+        day = timezone.localdate(self.old_days[1])
+        self.assertEqual(self.found(1, date_from=day), [(1, 'update')])
+        self.assertEqual(self.found(1, date_to=day - timedelta(days=1)), [(1, 'create')])
+
+    def test_only_files_listing_the_object_are_opened(self):
+        # Two chunks on the first day: only the one holding object 2 is read
+        self.purge(chunk_size=1)
+        with mock.patch('audit.archive.gzip.open', wraps=gzip.open) as opened:
+            self.assertEqual(self.found(2), [(2, 'create')])
+        self.assertEqual(opened.call_count, 1)
+
+    def test_rows_archived_twice_are_returned_once(self):
+        rows = list(AuditLog.objects.filter(object_id=2).values(*ARCHIVE_FIELDS))
+        write_partition(self.archive_dir, timezone.localdate(self.old_days[0]), rows)
+        self.purge()
+        self.assertEqual(self.found(2), [(2, 'create')])
+
+    def test_cleanup_command(self):
+        out = StringIO()
+        call_command('cleanup_audit_logs', '--days', '365', '--archive-dir', self.archive_dir, stdout=out)
+        self.assertIn('Archived 3 and deleted 3', out.getvalue())
+        self.assertEqual(self.found(1), [(1, 'create'), (1, 'update')])
+
+    def test_cleanup_command_dry_run(self):
+        out = StringIO()
+        call_command('cleanup_audit_logs', '--days', '365', '--archive-dir', self.archive_dir,
+                     '--dry-run', stdout=out)
+        self.assertIn('Would purge 3', out.getvalue())
+        self.assertEqual(AuditLog.objects.count(), 4)
+        self.assertEqual(os.listdir(self.archive_dir), [])
+
+    def test_archived_logs_view(self):
+        self.purge()
+        url = reverse('audit:archived_object_logs', args=[self.account_type.pk, 1])
+        with self.settings(AUDIT_ARCHIVE_DIR=self.archive_dir):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 302)
+            self.client.force_login(self.admin)
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([log['action'] for log in response.json()['logs']], ['create', 'update'])
+
+
+class AuditRollupTests(TestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user('writer', 'writer@example.invalid', 'password')
+
+    def log(self, action, timestamp):
+        return AuditLog(user=self.user, action=action, timestamp=timestamp)
+
+    def daily_stats(self):
+        return {(day, action): count for day, action, count
+                in AuditDailyStats.objects.values_list('date', 'action', 'count')}
+
+    def test_counts_by_local_day_and_action(self):
+        late = datetime(2026, 3, 2, 3, 0, tzinfo=dt_timezone.utc)
+        with timezone.override('America/New_York'):
+            writer.bulk_write([self.log('create', late), self.log('create', late + timedelta(hours=6)),
+                               self.log('update', late)])
+        self.assertEqual(self.daily_stats(), {
+            (date(2026, 3, 1), 'create'): 1,
+            (date(2026, 3, 2), 'create'): 1,
+            (date(2026, 3, 1), 'update'): 1,
+        })
+
+    def test_later_writes_add_to_existing_rows(self):
+        now = timezone.now()
+        writer.bulk_write([self.log('create', now)])
+        writer.bulk_write([self.log('create', now), self.log('create', now)])
+        self.assertEqual(self.daily_stats(), {(timezone.localdate(now), 'create'): 3})
+        self.assertEqual(total_logs(), 3)
+
+    def test_subtract_rollups_drops_empty_rows(self):
+        now = timezone.now()
+        writer.bulk_write([self.log('create', now), self.log('update', now)])
+        subtract_rollups(AuditLog.objects.filter(action='update'))
+        self.assertEqual(self.daily_stats(), {(timezone.localdate(now), 'create'): 1})
+
+    def test_rebuild_matches_what_the_writer_kept(self):
+        now = timezone.now()
+        writer.bulk_write([self.log('create', now - timedelta(days=2)), self.log('delete', now),
+                           self.log('delete', now)])
+        kept = self.daily_stats()
+        AuditDailyStats.objects.update(count=99)
+        self.assertEqual(rebuild_daily_stats(), 2)
+        self.assertEqual(self.daily_stats(), kept)
+
+    def test_migration_backfill_matches_what_the_writer_kept(self):
+        now = timezone.now()
+        writer.bulk_write([self.log('create', now - timedelta(days=2)), self.log('view', now)])
+        kept = self.daily_stats()
+        AuditDailyStats.objects.all().delete()
+        migration = import_module('audit.migrations.0003_audit_daily_stats')
+        migration.backfill_daily_stats(django_apps, None)
+        self.assertEqual(self.daily_stats(), kept)
+
+
+class AuditFacetTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = get_user_model().objects.create_user('alice', 'alice@example.invalid', 'password',
+                                                         is_staff=True)
+        cls.bob = get_user_model().objects.create_user('bob', 'bob@example.invalid', 'password')
+        cls.account_type = ContentType.objects.get_for_model(Account)
+        writer.bulk_write([
+            AuditLog(user=cls.alice, action='create', content_type=cls.account_type, object_id=1),
+            AuditLog(user=cls.alice, action='update', content_type=cls.account_type, object_id=1),
+            AuditLog(user=cls.bob, action='update'),
+            AuditLog(action='login'),
+        ])
+
+    def facets(self):
+        return {(facet, value): count for facet, value, count
+                in AuditFacet.objects.values_list('facet', 'value', 'count')}
+
+    def test_writer_counts_each_facet(self):
+        self.assertEqual(get_facets('user'), {str(self.alice.pk): 2, str(self.bob.pk): 1})
+        self.assertEqual(get_facets('content_type'), {str(self.account_type.pk): 2})
+        self.assertEqual(get_facets('action'), {'create': 1, 'update': 2, 'login': 1})
+
+    def test_subtract_rollups_drops_empty_facets(self):
+        subtract_rollups(AuditLog.objects.filter(user=self.bob))
+        self.assertEqual(get_facets('user'), {str(self.alice.pk): 2})
+        self.assertEqual(get_facets('action'), {'create': 1, 'update': 1, 'login': 1})
+
+    def test_rebuild_matches_what_the_writer_kept(self):
+        kept = self.facets()
+        AuditFacet.objects.update(count=99)
+        self.assertEqual(rebuild_facets(), len(kept))
+        self.assertEqual(self.facets(), kept)
+
+    def test_migration_backfill_matches_what_the_writer_kept(self):
+        kept = self.facets()
+        AuditFacet.objects.all().delete()
+        migration = import_module('audit.migrations.0004_audit_facets')
+        migration.backfill_facets(django_apps, None)
+        self.assertEqual(self.facets(), kept)
+
+    def test_rollup_log_count(self):
+        self.assertEqual(rollup_log_count(user=self.alice.pk), 2)
+        self.assertEqual(rollup_log_count(content_type=self.account_type.pk), 2)
+        self.assertEqual(rollup_log_count(action='update'), 2)
+        self.assertEqual(rollup_log_count(), 4)
+        # Combined facets can't be answered from the rollups
+        self.assertIsNone(rollup_log_count(user=self.alice.pk, action='update'))
+
+    def test_paginator_uses_the_given_count(self):
+        paginator = EstimatedCountPaginator(AuditLog.objects.order_by('pk'), 3, count=4)
+        with self.assertNumQueries(0):
+            self.assertEqual((paginator.count, paginator.num_pages), (4, 2))
+        self.assertEqual(len(paginator.page(2)), 1)
+        self.assertFalse(paginator.is_approximate)
+
+    def test_list_counts_from_the_facets(self):
+        AuditFacet.objects.filter(facet='user', value=str(self.alice.pk)).update(count=120)
+        self.client.force_login(self.alice)
+        response = self.client.get(reverse('audit:log_list'), {'user': self.alice.pk})
+        paginator = response.context['paginator']
+        self.assertEqual((paginator.count, paginator.num_pages), (120, 3))
+        self.assertFalse(paginator.is_approximate)
+
+    @override_settings(AUDIT_LIST_COUNT_LIMIT=1)
+    def test_list_caps_counts_the_rollups_cannot_answer(self):
+        self.client.force_login(self.alice)
+        response = self.client.get(reverse('audit:log_list'), {'user': self.alice.pk, 'action': 'update'})
+        self.assertEqual(response.context['paginator'].count, 1)
+        self.assertFalse(response.context['paginator'].is_approximate)
+        response = self.client.get(reverse('audit:log_list'), {'search': 'alice'})
+        self.assertEqual(response.context['paginator'].count, 1)
+        self.assertTrue(response.context['paginator'].is_approximate)
+        self.assertContains(response, 'of more than 1 logs')
+
+
+class AuditSettingsCacheTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        AuditSettings.objects.get_or_create(pk=1)
+
+    def setUp(self):
+        invalidate_audit_settings()
+        self.addCleanup(invalidate_audit_settings)
+
+    def test_settings_are_read_once(self):
+        with self.assertNumQueries(1):
+            get_audit_settings()
+        with self.assertNumQueries(0):
+            settings = get_audit_settings()
+            self.assertIs(AuditSettings.get_settings(), settings)
+            self.assertFalse(should_audit('invoices', 'invoice'))
+
+    def test_saving_settings_invalidates(self):
+        self.assertFalse(should_audit('invoices', 'invoice'))
+        AuditSettings.objects.filter(pk=1).update(audit_invoices=True)
+        # Unchanged until the row is saved through the model
+        self.assertFalse(should_audit('invoices', 'invoice'))
+        settings = AuditSettings.objects.get(pk=1)
+        settings.save()
+        self.assertTrue(should_audit('invoices', 'invoice'))
+        self.assertTrue(get_audit_settings().audit_invoices)
+
+    def test_deleting_settings_invalidates(self):
+        AuditSettings.objects.filter(pk=1).update(audit_accounts=False)
+        invalidate_audit_settings()
+        self.assertFalse(should_audit('accounts', 'account'))
+        AuditSettings.objects.filter(pk=1).delete()
+        self.assertTrue(should_audit('accounts', 'account'))
+
+    def test_other_processes_reload_after_the_ttl(self):
+        get_audit_settings()
+        AuditSettings.objects.filter(pk=1).update(audit_invoices=True)
+        # What saving the settings in another process publishes
+        cache.delete(SETTINGS_KEY)
+        publish_version(VERSION_KEY)
+        with override_settings(AUDIT_SETTINGS_LOCAL_TTL=60):
+            self.assertFalse(should_audit('invoices', 'invoice'))
+        with override_settings(AUDIT_SETTINGS_LOCAL_TTL=0):
+            self.assertTrue(should_audit('invoices', 'invoice'))
+
+    def test_new_processes_load_from_the_shared_cache(self):
+        settings = get_audit_settings()
+        # A process starting with an empty local copy
+        audit_cache._audit.reset()
+        with self.assertNumQueries(0):
+            rebuilt = get_audit_settings()
+        self.assertIsNot(rebuilt, settings)
+        self.assertEqual(field_values(rebuilt), field_values(settings))
+
+    def test_decisions_cover_every_model(self):
+        decisions = get_audit_decisions()
+        self.assertEqual(len(decisions), len(django_apps.get_models()))
+        self.assertTrue(decisions[('accounts', 'account')])
+        self.assertFalse(decisions[('clients', 'client')])
+        self.assertFalse(decisions[('invoices', 'invoice')])
+        self.assertFalse(decisions[('audit', 'auditlog')])
+        self.assertFalse(decisions[('payroll', 'payrollentry')])
+
+    def test_decide_without_settings_uses_the_defaults(self):
+        self.assertTrue(decide(None, 'invoices', 'invoice'))
+        self.assertTrue(decide(None, 'accounts', 'journalentryline'))
+        self.assertFalse(decide(None, 'invoices', 'payment'))
+        self.assertFalse(decide(None, 'audit', 'auditlog'))
+
+    def test_unreadable_settings_fall_back_to_the_defaults(self):
+        with mock.patch('audit.cache.cached_instance', side_effect=DatabaseError):
+            self.assertIsNone(get_audit_settings())
+            self.assertTrue(should_audit('invoices', 'invoice'))
+            self.assertEqual(AuditSettings.get_settings().pk, 1)
+        # Tried again on the next call
+        self.assertFalse(should_audit('invoices', 'invoice'))
@@ -9,4 +9,6 @@ urlpatterns = [
     path('logs/<int:pk>/', views.AuditLogDetailView.as_view(), name='log_detail'),
     path('sessions/', views.UserSessionListView.as_view(), name='session_list'),
     path('api/chart-data/', views.audit_chart_data, name='chart_data'),
+    path('api/archived/<int:content_type_id>/<int:object_id>/', views.archived_object_logs, name='archived_object_logs'),
+    path('api/writer-metrics/', views.audit_writer_metrics, name='writer_metrics'),
 ]
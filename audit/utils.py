@@ -16,57 +16,50 @@ def get_user_agent(request):
     return request.META.get('HTTP_USER_AGENT', '')
 
 
-def get_model_changes(original, current):
+def _json_value(value):
+    """Make a field value safe to store in the changes JSON"""
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return str(value)
+
+
+def get_model_changes(snapshot, current):
     """
-    Compare two model instances and return a dictionary of changes.
+    Compare a snapshot of an instance's original values (see audit.snapshot)
+    with the instance and return a dictionary of changes.
     Returns a dict with field names as keys and {'old': old_value, 'new': new_value} as values.
+    Foreign keys are compared and recorded by their raw ids, so no related
+    objects are loaded.
     """
     changes = {}
+    loaded = current.__dict__
     
-    # Get all fields for the model
-    for field in current._meta.fields:
+    for field in current._meta.concrete_fields:
         field_name = field.name
         
         # Skip certain fields that we don't want to track
         if field_name in ['updated_at', 'last_login', 'date_joined']:
             continue
         
-        old_value = getattr(original, field_name, None)
-        new_value = getattr(current, field_name, None)
+        # Fields that were deferred on load, or are deferred now, can't be compared
+        if field.attname not in snapshot or field.attname not in loaded:
+            continue
+        
+        old_value = snapshot[field.attname]
+        new_value = loaded[field.attname]
         
-        # Handle different field types
         if isinstance(field, models.DateTimeField):
             # For datetime fields, compare string representations to avoid timezone issues
-            old_str = old_value.isoformat() if old_value else None
-            new_str = new_value.isoformat() if new_value else None
-            if old_str != new_str:
-                changes[field_name] = {
-                    'old': old_str,
-                    'new': new_str
-                }
-        elif isinstance(field, models.ForeignKey):
-            # For foreign keys, compare the actual objects
-            old_repr = str(old_value) if old_value else None
-            new_repr = str(new_value) if new_value else None
-            if old_repr != new_repr:
-                changes[field_name] = {
-                    'old': old_repr,
-                    'new': new_repr
-                }
-        elif isinstance(field, (models.DecimalField, models.FloatField)):
-            # For numeric fields, handle precision issues
-            if old_value != new_value:
-                changes[field_name] = {
-                    'old': str(old_value) if old_value is not None else None,
-                    'new': str(new_value) if new_value is not None else None
-                }
-        else:
-            # For other fields, direct comparison
-            if old_value != new_value:
-                changes[field_name] = {
-                    'old': old_value,
-                    'new': new_value
-                }
+            old_value = old_value.isoformat() if old_value else None
+            new_value = new_value.isoformat() if new_value else None
+        
+        if old_value != new_value:
+            changes[field_name] = {
+                'old': _json_value(old_value),
+                'new': _json_value(new_value)
+            }
     
     return changes
 
@@ -1,15 +1,41 @@
 from django.views.generic import ListView, DetailView, TemplateView
+from django.contrib.auth.decorators import login_required
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 from django.contrib.contenttypes.models import ContentType
-from django.db.models import Q, Count
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db.models import Count
 from django.utils import timezone
-from datetime import timedelta
+from datetime import date, timedelta
 from .models import AuditLog, UserSession, AuditSettings
+from .archive import find_archived_logs
+from .rollups import action_totals, daily_activity, day_range, get_facets, rollup_log_count, total_logs
+from .search import search_logs
+from .writer import get_writer_metrics
 from django.shortcuts import render
 from django.http import JsonResponse
 import json
 
 
+def _parse_date(value):
+    try:
+        return date.fromisoformat(value) if value else None
+    except ValueError:
+        return None
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator given its object count up front instead of running COUNT(*).
+    is_approximate marks a count that was capped rather than exact.
+    """
+
+    def __init__(self, object_list, per_page, count, is_approximate=False, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.__dict__['count'] = count
+        self.is_approximate = is_approximate
+
+
 class AuditLogListView(LoginRequiredMixin, UserPassesTestMixin, ListView):
     """View to display audit logs"""
     model = AuditLog
@@ -40,35 +66,76 @@ class AuditLogListView(LoginRequiredMixin, UserPassesTestMixin, ListView):
             queryset = queryset.filter(content_type_id=content_type_id)
         
         # Filter by date range
-        date_from = self.request.GET.get('date_from')
-        date_to = self.request.GET.get('date_to')
+        date_from = _parse_date(self.request.GET.get('date_from'))
+        date_to = _parse_date(self.request.GET.get('date_to'))
         
+        # Compare against timestamps rather than timestamp__date so the index is used
         if date_from:
-            queryset = queryset.filter(timestamp__date__gte=date_from)
+            queryset = queryset.filter(timestamp__gte=day_range(date_from, date_from)[0])
         if date_to:
-            queryset = queryset.filter(timestamp__date__lte=date_to)
+            queryset = queryset.filter(timestamp__lt=day_range(date_to, date_to)[1])
         
-        # Search in object representation and notes
+        # Full-text search in object representation, notes and username, best matches first
         search = self.request.GET.get('search')
         if search:
-            queryset = queryset.filter(
-                Q(object_repr__icontains=search) |
-                Q(notes__icontains=search) |
-                Q(user__username__icontains=search)
-            )
+            queryset = search_logs(queryset, search)
         
         return queryset
     
+    def get_paginator(self, queryset, per_page, orphans=0, allow_empty_first_page=True, **kwargs):
+        """
+        Take the count from the rollup tables when the filters allow it.
+        Otherwise count at most AUDIT_LIST_COUNT_LIMIT rows and show the
+        total as approximate, rather than counting a huge filtered range.
+        """
+        params = self.request.GET
+        count = None
+        if not params.get('search'):
+            count = rollup_log_count(
+                user=params.get('user'),
+                content_type=params.get('content_type'),
+                action=params.get('action'),
+                start_date=_parse_date(params.get('date_from')),
+                end_date=_parse_date(params.get('date_to')),
+            )
+        is_approximate = False
+        if count is None:
+            limit = getattr(settings, 'AUDIT_LIST_COUNT_LIMIT', 10000)
+            count = queryset.order_by()[:limit + 1].count()
+            if count > limit:
+                count, is_approximate = limit, True
+        return EstimatedCountPaginator(
+            queryset, per_page, count, is_approximate,
+            orphans=orphans, allow_empty_first_page=allow_empty_first_page, **kwargs
+        )
+    
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         
-        # Add filter options
+        # Add filter options from the facet rollups, with their log counts
         from django.contrib.auth import get_user_model
         User = get_user_model()
         
-        context['users'] = User.objects.filter(audit_logs__isnull=False).distinct()
-        context['actions'] = AuditLog.ACTION_CHOICES
-        context['content_types'] = ContentType.objects.filter(auditlog__isnull=False).distinct()
+        user_counts = get_facets('user')
+        users = list(User.objects.filter(pk__in=user_counts).order_by('username'))
+        for user in users:
+            user.log_count = user_counts[str(user.pk)]
+        context['users'] = users
+        
+        action_counts = get_facets('action')
+        context['actions'] = [
+            (key, label, action_counts.get(key, 0)) for key, label in AuditLog.ACTION_CHOICES
+        ]
+        
+        content_types = []
+        for value, count in get_facets('content_type').items():
+            try:
+                content_type = ContentType.objects.get_for_id(int(value))
+            except ContentType.DoesNotExist:
+                continue
+            content_type.log_count = count
+            content_types.append(content_type)
+        context['content_types'] = sorted(content_types, key=lambda ct: ct.name)
         
         # Add current filters to context
         context['current_filters'] = {
@@ -133,16 +200,16 @@ class AuditDashboardView(LoginRequiredMixin, UserPassesTestMixin, TemplateView):
         context = super().get_context_data(**kwargs)
         
         # Get date ranges
-        now = timezone.now()
-        today = now.date()
+        today = timezone.localdate()
         week_ago = today - timedelta(days=7)
         month_ago = today - timedelta(days=30)
+        week_start, _ = day_range(week_ago, today)
         
-        # Basic statistics
-        context['total_logs'] = AuditLog.objects.count()
-        context['logs_today'] = AuditLog.objects.filter(timestamp__date=today).count()
-        context['logs_week'] = AuditLog.objects.filter(timestamp__date__gte=week_ago).count()
-        context['logs_month'] = AuditLog.objects.filter(timestamp__date__gte=month_ago).count()
+        # Basic statistics, from the daily rollup
+        context['total_logs'] = total_logs()
+        context['logs_today'] = total_logs(today)
+        context['logs_week'] = total_logs(week_ago)
+        context['logs_month'] = total_logs(month_ago)
         
         # Active sessions
         context['active_sessions'] = UserSession.objects.filter(is_active=True).count()
@@ -151,17 +218,12 @@ class AuditDashboardView(LoginRequiredMixin, UserPassesTestMixin, TemplateView):
         context['recent_logs'] = AuditLog.objects.select_related('user', 'content_type')[:10]
         
         # Action statistics
-        context['action_stats'] = (
-            AuditLog.objects
-            .values('action')
-            .annotate(count=Count('id'))
-            .order_by('-count')[:5]
-        )
+        context['action_stats'] = action_totals()[:5]
         
         # User activity statistics
         context['user_stats'] = (
             AuditLog.objects
-            .filter(timestamp__date__gte=week_ago)
+            .filter(timestamp__gte=week_start)
             .values('user__username')
             .annotate(count=Count('id'))
             .order_by('-count')[:5]
@@ -170,7 +232,7 @@ class AuditDashboardView(LoginRequiredMixin, UserPassesTestMixin, TemplateView):
         # Model statistics
         context['model_stats'] = (
             AuditLog.objects
-            .filter(timestamp__date__gte=week_ago)
+            .filter(timestamp__gte=week_start)
             .values('content_type__model')
             .annotate(count=Count('id'))
             .order_by('-count')[:5]
@@ -184,31 +246,28 @@ def audit_chart_data(request):
     if not (request.user.is_staff or request.user.role == 'admin'):
         return JsonResponse({'error': 'Permission denied'}, status=403)
     
-    # Get activity data for the last 30 days
-    end_date = timezone.now().date()
+    # Get activity data for the last 30 days, from the daily rollup
+    end_date = timezone.localdate()
     start_date = end_date - timedelta(days=30)
     
-    # Daily activity count
-    daily_activity = []
-    current_date = start_date
-    
-    while current_date <= end_date:
-        count = AuditLog.objects.filter(timestamp__date=current_date).count()
-        daily_activity.append({
-            'date': current_date.strftime('%Y-%m-%d'),
-            'count': count
-        })
-        current_date += timedelta(days=1)
-    
-    # Action distribution
-    action_distribution = list(
-        AuditLog.objects
-        .values('action')
-        .annotate(count=Count('id'))
-        .order_by('-count')
-    )
-    
     return JsonResponse({
-        'daily_activity': daily_activity,
-        'action_distribution': action_distribution
+        'daily_activity': daily_activity(start_date, end_date),
+        'action_distribution': action_totals()
     })
+
+
+def audit_writer_metrics(request):
+    """API endpoint for the audit log writer's counters and flush latencies"""
+    if not request.user.is_staff:
+        return JsonResponse({'error': 'Permission denied'}, status=403)
+    
+    return JsonResponse(get_writer_metrics())
+
+
+@login_required
+def archived_object_logs(request, content_type_id, object_id):
+    """API endpoint for archived audit records of one object"""
+    if not (request.user.is_staff or request.user.role == 'admin'):
+        return JsonResponse({'error': 'Permission denied'}, status=403)
+    
+    return JsonResponse({'logs': find_archived_logs(content_type_id, object_id)})
@@ -0,0 +1,277 @@
+"""
+Buffered audit log writer.
+
+Receivers hand unsaved AuditLog instances to record() instead of saving
+them one at a time:
+
+* Inside a transaction the records are held until it commits and are then
+  released through transaction.on_commit, one batch per savepoint. If the
+  transaction, or the savepoint a record was made in, rolls back, Django
+  discards the callback and the records go with it.
+* Inside a buffered_audit() scope (every request, via AuditMiddleware)
+  released records are collected until the scope ends.
+* Whatever is released outside a scope is written straight away.
+
+Writing is a bulk_create, together with the rollup updates in
+audit.rollups and the search index updates in audit.search, done in the
+calling thread by default. With AUDIT_WRITER_MODE = 'background' the
+records are put on a bounded queue instead and written by a daemon thread
+in batches of AUDIT_WRITER_BATCH_SIZE. When the queue is full a producer
+waits up to AUDIT_WRITER_PUT_TIMEOUT seconds for room (back-pressure),
+after which the records are dropped and counted. get_writer_metrics()
+reports the counts and flush latencies.
+"""
+from contextlib import contextmanager
+import atexit
+import logging
+import queue
+import threading
+import time
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 500
+DEFAULT_QUEUE_SIZE = 10000
+DEFAULT_PUT_TIMEOUT = 1.0
+
+_local = threading.local()
+
+_metrics_lock = threading.Lock()
+_metrics = {
+    'recorded': 0,
+    'written': 0,
+    'dropped': 0,
+    'flushes': 0,
+    'last_flush_latency_ms': 0.0,
+    'max_flush_latency_ms': 0.0,
+    'total_flush_latency_ms': 0.0,
+}
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def _batch_size():
+    return _setting('AUDIT_WRITER_BATCH_SIZE', DEFAULT_BATCH_SIZE)
+
+
+def _count(**increments):
+    with _metrics_lock:
+        for key, value in increments.items():
+            _metrics[key] += value
+
+
+def _flushed(count, latency_ms):
+    with _metrics_lock:
+        _metrics['written'] += count
+        _metrics['flushes'] += 1
+        _metrics['last_flush_latency_ms'] = latency_ms
+        _metrics['max_flush_latency_ms'] = max(_metrics['max_flush_latency_ms'], latency_ms)
+        _metrics['total_flush_latency_ms'] += latency_ms
+
+
+def bulk_write(records):
+    """Insert a batch of AuditLog instances and update the rollup tables and search index"""
+    from .models import AuditLog
+    from .rollups import apply_rollups
+    from .search import index_logs
+    with transaction.atomic():
+        AuditLog.objects.bulk_create(records, batch_size=_batch_size())
+        apply_rollups(records)
+        index_logs(records)
+
+
+def _write_now(records):
+    start = time.perf_counter()
+    bulk_write(records)
+    _flushed(len(records), (time.perf_counter() - start) * 1000)
+
+
+class BackgroundWriter:
+    """Daemon thread draining a bounded queue of (enqueued_at, record) items in batches"""
+
+    def __init__(self, maxsize, put_timeout):
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.put_timeout = put_timeout
+        self.thread = threading.Thread(target=self.run, name='audit-writer', daemon=True)
+        self.thread.start()
+
+    def submit(self, records):
+        enqueued_at = time.perf_counter()
+        for index, record in enumerate(records):
+            try:
+                self.queue.put((enqueued_at, record), timeout=self.put_timeout)
+            except queue.Full:
+                dropped = len(records) - index
+                _count(dropped=dropped)
+                logger.warning('Audit writer queue is full; dropped %d audit records', dropped)
+                return
+
+    def run(self):
+        batch_size = _batch_size()
+        while True:
+            batch = [self.queue.get()]
+            while len(batch) < batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            self.write(batch)
+
+    def write(self, batch):
+        oldest = min(enqueued_at for enqueued_at, record in batch)
+        try:
+            close_old_connections()
+            bulk_write([record for enqueued_at, record in batch])
+            _flushed(len(batch), (time.perf_counter() - oldest) * 1000)
+        except Exception:
+            _count(dropped=len(batch))
+            logger.exception('Failed to write %d audit records', len(batch))
+        finally:
+            for _ in batch:
+                self.queue.task_done()
+
+    def drain(self):
+        """Block until everything queued so far has been written"""
+        self.queue.join()
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_background_writer():
+    """The process's background writer, started on first use"""
+    global _writer
+    with _writer_lock:
+        if _writer is None or not _writer.thread.is_alive():
+            _writer = BackgroundWriter(
+                maxsize=_setting('AUDIT_WRITER_QUEUE_SIZE', DEFAULT_QUEUE_SIZE),
+                put_timeout=_setting('AUDIT_WRITER_PUT_TIMEOUT', DEFAULT_PUT_TIMEOUT),
+            )
+        return _writer
+
+
+@atexit.register
+def _drain_at_exit():
+    if _writer is not None and _writer.thread.is_alive():
+        _writer.drain()
+
+
+def write(records):
+    """Write released records, in this thread or on the background writer"""
+    if not records:
+        return
+    if _setting('AUDIT_WRITER_MODE', 'sync') == 'background':
+        get_background_writer().submit(records)
+    else:
+        _write_now(records)
+
+
+def _release(records):
+    scope = getattr(_local, 'scope', None)
+    if scope is not None:
+        scope.extend(records)
+        # Keep a long request or command from holding an unbounded buffer
+        if len(scope) >= _batch_size():
+            flush()
+    else:
+        write(records)
+
+
+def _transaction_buffer():
+    """
+    The buffer for the current transaction and savepoint, registering its
+    on_commit release when it is first needed. Records made in different
+    savepoints never share a buffer, so rolling back a savepoint drops
+    exactly the records made inside it. A buffer whose callback Django has
+    discarded belongs to a rolled back transaction or savepoint and is
+    replaced.
+    """
+    savepoints = tuple(connection.savepoint_ids)
+    buffers = getattr(_local, 'transaction', None)
+    if buffers is None:
+        buffers = _local.transaction = {}
+    live = {entry[1] for entry in connection.run_on_commit}
+    state = buffers.get(savepoints)
+    if state is not None and state[1] in live:
+        return state[0]
+
+    # Forget the buffers of rolled back savepoints and transactions
+    for key, (buffer, callback) in list(buffers.items()):
+        if callback not in live:
+            del buffers[key]
+
+    buffer = []
+
+    def callback():
+        if buffers.get(savepoints, (None, None))[1] is callback:
+            del buffers[savepoints]
+        _release(buffer)
+
+    buffers[savepoints] = (buffer, callback)
+    transaction.on_commit(callback)
+    return buffer
+
+
+def record(log):
+    """Queue an unsaved AuditLog instance for writing"""
+    _count(recorded=1)
+    if connection.in_atomic_block:
+        _transaction_buffer().append(log)
+    else:
+        _release([log])
+
+
+def flush():
+    """Write everything collected by the current scope so far"""
+    scope = getattr(_local, 'scope', None)
+    if scope:
+        records = scope[:]
+        del scope[:]
+        write(records)
+
+
+def start_buffering():
+    """
+    Start collecting released records in this thread. Returns False if a
+    scope was already active, in which case the outer scope owns the flush.
+    """
+    if getattr(_local, 'scope', None) is not None:
+        return False
+    _local.scope = []
+    return True
+
+
+def stop_buffering():
+    """Write the collected records and end the scope"""
+    try:
+        flush()
+    finally:
+        _local.scope = None
+
+
+@contextmanager
+def buffered_audit():
+    """Collect audit records until the block exits, then write them in one batch"""
+    started = start_buffering()
+    try:
+        yield
+    finally:
+        if started:
+            stop_buffering()
+
+
+def get_writer_metrics():
+    """Counters and flush latencies for this process"""
+    with _metrics_lock:
+        metrics = dict(_metrics)
+    flushes = metrics.pop('total_flush_latency_ms')
+    metrics['avg_flush_latency_ms'] = flushes / metrics['flushes'] if metrics['flushes'] else 0.0
+    metrics['mode'] = _setting('AUDIT_WRITER_MODE', 'sync')
+    metrics['queue_depth'] = _writer.queue.qsize() if _writer is not None else 0
+    return metrics
@@ -0,0 +1,271 @@
+"""
+Per-view request instrumentation.
+
+InstrumentationMiddleware counts every request per view and measures a
+sample of them (INSTRUMENTATION_SAMPLE_RATE, 10% by default). Only sampled
+requests get a database execute_wrapper, so unsampled requests cost a
+random() call and a counter increment. A sample records:
+
+* wall time of the whole request
+* number and total time of SQL queries
+* duplicate queries: SQL fingerprints (literals and IN lists collapsed)
+  executed more than once in the request
+* response size in bytes
+
+Each view keeps its last INSTRUMENTATION_WINDOW samples, from which
+snapshot() computes percentiles and a latency histogram. The snapshot is
+served as JSON to staff at /instrumentation/ and written to
+INSTRUMENTATION_DUMP_PATH every INSTRUMENTATION_DUMP_INTERVAL seconds by a
+daemon thread, which the middleware starts in each process on its first
+request, so no request waits for the file. Other modules can add their own counters (e.g. cache hit rates) to the
+snapshot with register_stats(). Everything is per process.
+"""
+from collections import Counter, deque
+from datetime import datetime, timezone
+import json
+import logging
+import os
+import random
+import re
+import threading
+import time
+
+from django.conf import settings
+from django.db import connection
+from django.http import JsonResponse
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SAMPLE_RATE = 0.1
+DEFAULT_WINDOW = 500
+DEFAULT_DUMP_INTERVAL = 60
+
+# Upper bounds in milliseconds of the latency histogram buckets
+LATENCY_BUCKETS_MS = [10, 25, 50, 100, 250, 500, 1000, 2500, 5000]
+
+# Duplicate fingerprints kept per view
+MAX_DUPLICATES = 10
+
+# Placeholders, or literals already replaced by ?
+_IN_LIST_RE = re.compile(r'\bIN\s*\((?:\s*(?:%s|\?)\s*,?)+\)', re.IGNORECASE)
+_NUMBER_RE = re.compile(r'\b\d+\b')
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_SPACE_RE = re.compile(r'\s+')
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def fingerprint(sql):
+    """SQL with literals and IN lists collapsed, so repeats of one query compare equal"""
+    sql = _STRING_RE.sub('?', sql)
+    sql = _NUMBER_RE.sub('?', sql)
+    sql = _IN_LIST_RE.sub('IN (...)', sql)
+    return _SPACE_RE.sub(' ', sql).strip()
+
+
+class QueryRecorder:
+    """execute_wrapper that counts and times the queries of one request"""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.statements = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+            self.statements[sql] += 1
+
+    def duplicates(self):
+        """{fingerprint: count} for fingerprints executed more than once"""
+        # Fingerprint each distinct statement once, after the request
+        fingerprints = Counter()
+        for sql, count in self.statements.items():
+            fingerprints[fingerprint(sql)] += count
+        return {sql: count for sql, count in fingerprints.items() if count > 1}
+
+
+def _percentile(ordered, fraction):
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+
+class ViewStats:
+    """Rolling samples and counters for one view"""
+
+    def __init__(self, window):
+        self.requests = 0
+        self.samples = deque(maxlen=window)
+        self.duplicates = Counter()
+
+    def add(self, wall_ms, sql_count, sql_ms, size, duplicates):
+        self.samples.append((wall_ms, sql_count, sql_ms, size))
+        for sql, count in duplicates.items():
+            # Keep the worst repeat count seen for each fingerprint
+            self.duplicates[sql] = max(self.duplicates[sql], count)
+        if len(self.duplicates) > MAX_DUPLICATES:
+            self.duplicates = Counter(dict(self.duplicates.most_common(MAX_DUPLICATES)))
+
+    def snapshot(self):
+        walls = sorted(sample[0] for sample in self.samples)
+        sampled = len(self.samples)
+        histogram = Counter()
+        for wall in walls:
+            bucket = next((f'<={bound}ms' for bound in LATENCY_BUCKETS_MS if wall <= bound),
+                          f'>{LATENCY_BUCKETS_MS[-1]}ms')
+            histogram[bucket] += 1
+
+        def average(position):
+            values = [sample[position] for sample in self.samples if sample[position] is not None]
+            return round(sum(values) / len(values), 2) if values else None
+
+        return {
+            'requests': self.requests,
+            'sampled': sampled,
+            'wall_ms': {
+                'p50': round(_percentile(walls, 0.50), 2),
+                'p95': round(_percentile(walls, 0.95), 2),
+                'p99': round(_percentile(walls, 0.99), 2),
+                'max': round(walls[-1], 2) if walls else 0.0,
+            },
+            'avg_sql_count': average(1),
+            'avg_sql_ms': average(2),
+            'avg_response_bytes': average(3),
+            'histogram': dict(histogram),
+            'duplicate_queries': [
+                {'sql': sql, 'max_repeats': count} for sql, count in self.duplicates.most_common()
+            ],
+        }
+
+
+_lock = threading.Lock()
+_views = {}
+_stats_sources = {}
+_state = {'started': time.time()}
+# Process the dump thread was started in; a forked worker starts its own
+_dumper = {'pid': None}
+
+
+def _stats_for(view_name):
+    stats = _views.get(view_name)
+    if stats is None:
+        stats = _views[view_name] = ViewStats(_setting('INSTRUMENTATION_WINDOW', DEFAULT_WINDOW))
+    return stats
+
+
+def register_stats(name, source):
+    """Report source(), a JSON-serializable dict, under `name` in every snapshot"""
+    _stats_sources[name] = source
+
+
+def snapshot():
+    """Stats for every view seen by this process"""
+    with _lock:
+        views = {name: stats.snapshot() for name, stats in sorted(_views.items())}
+    return {
+        'pid': os.getpid(),
+        'since': datetime.fromtimestamp(_state['started'], timezone.utc).isoformat(),
+        'generated': datetime.now(timezone.utc).isoformat(),
+        'sample_rate': _setting('INSTRUMENTATION_SAMPLE_RATE', DEFAULT_SAMPLE_RATE),
+        'views': views,
+        'stats': {name: source() for name, source in sorted(_stats_sources.items())},
+    }
+
+
+def reset():
+    with _lock:
+        _views.clear()
+        _state['started'] = time.time()
+
+
+def dump(path=None):
+    """Write the snapshot to a JSON file, replacing it atomically"""
+    path = path or _setting('INSTRUMENTATION_DUMP_PATH', None)
+    if not path:
+        return
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as handle:
+        json.dump(snapshot(), handle, indent=2)
+    os.replace(tmp_path, path)
+
+
+def _dump_periodically():
+    while True:
+        time.sleep(_setting('INSTRUMENTATION_DUMP_INTERVAL', DEFAULT_DUMP_INTERVAL))
+        try:
+            dump()
+        except OSError:
+            logger.exception('Could not write instrumentation dump')
+
+
+def start_dumper():
+    """Start this process's dump thread, unless it is already running or there is no dump path"""
+    pid = os.getpid()
+    if _dumper['pid'] == pid or not _setting('INSTRUMENTATION_DUMP_PATH', None):
+        return
+    with _lock:
+        if _dumper['pid'] == pid:
+            return
+        _dumper['pid'] = pid
+    threading.Thread(target=_dump_periodically, name='instrumentation-dump', daemon=True).start()
+
+
+def _view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unresolved'
+    return match.view_name or match._func_path
+
+
+def _response_size(response):
+    if getattr(response, 'streaming', False):
+        length = response.get('Content-Length')
+        return int(length) if length else None
+    return len(response.content)
+
+
+class InstrumentationMiddleware:
+    """Record per-view timings and query counts for a sample of requests"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not _setting('INSTRUMENTATION_ENABLED', True):
+            return self.get_response(request)
+        start_dumper()
+
+        if random.random() >= _setting('INSTRUMENTATION_SAMPLE_RATE', DEFAULT_SAMPLE_RATE):
+            response = self.get_response(request)
+            with _lock:
+                _stats_for(_view_name(request)).requests += 1
+            return response
+
+        recorder = QueryRecorder()
+        start = time.perf_counter()
+        with connection.execute_wrapper(recorder):
+            response = self.get_response(request)
+        wall_ms = (time.perf_counter() - start) * 1000
+
+        with _lock:
+            stats = _stats_for(_view_name(request))
+            stats.requests += 1
+            stats.add(wall_ms, recorder.count, recorder.duration * 1000,
+                      _response_size(response), recorder.duplicates())
+        return response
+
+
+def instrumentation_stats(request):
+    """Staff-only JSON view of this process's per-view request stats"""
+    if not request.user.is_staff:
+        return JsonResponse({'error': 'Permission denied'}, status=403)
+    
+    return JsonResponse(snapshot())
@@ -0,0 +1,204 @@
+"""
+Per-process caches of rarely changing data.
+
+VersionedValue keeps a value in each process and ties it to a version key
+in the shared Django cache. A process trusts its copy for a few seconds
+(a LOCAL_TTL setting) and then compares its version with the shared one,
+reloading when they differ, so invalidate() in one process reaches the
+others within that window. Company settings, audit settings and the help
+search index are cached this way; cached_instance() adds a second layer
+that keeps a model row's field values in the shared cache, so a reload
+after a version change usually needs no query either.
+
+SignatureCachedValue is for data that is cheap to fingerprint in the
+database, such as a count and last-updated time: the signature is queried
+on every get() and the value rebuilt only when it changes.
+
+get_version() and publish_version() are the underlying version key
+helpers, also used for per-user versions in users.cache. shared_lock()
+serializes a critical section across processes through the shared cache.
+cache_is_shared() tells whether the configured cache is seen by every
+process at all; local memory and dummy caches are not.
+
+The dummy cache keeps nothing, so with it versions are held in the process
+instead: they change only when this process publishes one, and
+VersionedValue simply reloads its value (under the same version) every
+LOCAL_TTL seconds to pick up changes made elsewhere.
+"""
+from contextlib import contextmanager
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import DatabaseError
+
+# Backends whose contents no other process can see
+PER_PROCESS_BACKENDS = (LocMemCache, DummyCache)
+
+
+# Versions published while the cache keeps nothing, by key
+_process_versions = {}
+
+
+def cache_is_shared():
+    """Whether the default cache is shared between processes"""
+    return not isinstance(caches['default'], PER_PROCESS_BACKENDS)
+
+
+def cache_persists():
+    """Whether values set in the default cache can be read back at all"""
+    return not isinstance(caches['default'], DummyCache)
+
+
+def get_version(key, timeout=None):
+    """The version published under key, publishing a new one if there is none"""
+    if not cache_persists():
+        return _process_versions.setdefault(key, uuid.uuid4().hex)
+    version = cache.get(key)
+    if version is None:
+        version = uuid.uuid4().hex
+        # Another process may have published a version in the meantime
+        if not cache.add(key, version, timeout):
+            version = cache.get(key, version)
+    return version
+
+
+def publish_version(key, timeout=None):
+    """Replace the version under key, so every process reloads. Returns the new version."""
+    version = uuid.uuid4().hex
+    if cache_persists():
+        cache.set(key, version, timeout)
+    else:
+        _process_versions[key] = version
+    return version
+
+
+@contextmanager
+def shared_lock(key, timeout=30, poll=0.05):
+    """
+    Hold a lock stored under key in the shared cache while the block runs.
+    The lock expires after timeout seconds, so a process that dies holding
+    it blocks the others for at most that long.
+    """
+    token = uuid.uuid4().hex
+    while not cache.add(key, token, timeout):
+        time.sleep(poll)
+    try:
+        yield
+    finally:
+        # It may have expired and been taken by someone else meanwhile
+        if cache.get(key) == token:
+            cache.delete(key)
+
+
+def field_values(instance):
+    return {field.attname: getattr(instance, field.attname) for field in instance._meta.concrete_fields}
+
+
+def cached_instance(key, version, model, fetch):
+    """
+    The row fetch() returns (or None), rebuilt from field values kept under
+    key in the shared cache while they belong to version. Instances rebuilt
+    this way are meant to be read, not saved.
+    """
+    data = cache.get(key)
+    if data is not None and data.get('version') == version:
+        return model(**data['fields']) if data['fields'] is not None else None
+    instance = fetch()
+    cache.set(key, {'version': version, 'fields': field_values(instance) if instance else None}, None)
+    return instance
+
+
+class VersionedValue:
+    """
+    A value built by load(version), kept per process and reloaded when the
+    shared version under version_key changes. load() may raise
+    DatabaseError when its tables don't exist yet (e.g. during migrations);
+    get() then returns None and tries again on the next call.
+    """
+
+    def __init__(self, version_key, load, ttl_setting, default_ttl=5):
+        self.version_key = version_key
+        self.load = load
+        self.ttl_setting = ttl_setting
+        self.default_ttl = default_ttl
+        # Re-entrant, so load() may save rows whose signals invalidate this value
+        self.lock = threading.RLock()
+        self.version = None
+        self.value = None
+        self.loaded = False
+        self.checked = 0.0
+
+    def refresh(self):
+        """Reload if the shared version changed. Call with self.lock held."""
+        now = time.monotonic()
+        if self.loaded and now - self.checked < getattr(settings, self.ttl_setting, self.default_ttl):
+            return
+
+        version = get_version(self.version_key)
+        # Without a cache to hold versions, other processes' changes only show on reload
+        if not self.loaded or self.version != version or not cache_persists():
+            try:
+                value = self.load(version)
+            except DatabaseError:
+                self.reset()
+                return
+            self.replace(version, value)
+        self.checked = now
+
+    def get(self):
+        with self.lock:
+            self.refresh()
+            return self.value
+
+    def is_current(self):
+        """Whether this process holds the value of the shared version right now"""
+        return self.loaded and self.version == get_version(self.version_key)
+
+    def replace(self, version, value):
+        """Hold value as this process's copy of version"""
+        with self.lock:
+            self.version, self.value, self.loaded = version, value, True
+            self.checked = time.monotonic()
+
+    def reset(self):
+        """Drop this process's copy"""
+        with self.lock:
+            self.version, self.value, self.loaded = None, None, False
+            self.checked = 0.0
+
+    def invalidate(self):
+        """Publish a new version and drop this process's copy. Returns the new version."""
+        with self.lock:
+            version = publish_version(self.version_key)
+            self.reset()
+            return version
+
+
+class SignatureCachedValue:
+    """A value built by build(), rebuilt whenever signature() returns something new"""
+
+    def __init__(self, signature, build):
+        self.signature = signature
+        self.build = build
+        self.lock = threading.Lock()
+        self._signature = None
+        self._value = None
+
+    def get(self):
+        signature = self.signature()
+        with self.lock:
+            if self._value is None or self._signature != signature:
+                self._value = self.build()
+                self._signature = signature
+            return self._value
+
+    def invalidate(self):
+        """Drop this process's value"""
+        with self.lock:
+            self._value = None
+            self._signature = None
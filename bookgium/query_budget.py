@@ -0,0 +1,293 @@
+"""
+Query-count and time budgets for views.
+
+seed_tenant() fills the test database with a small company: a chart of
+accounts with posted journal entries, customers and invoices, a payroll
+period that has been run, audit history and help content. It is seeded in
+batches, and grow_tenant() adds another batch of every kind of row.
+QueryBudgetTestCase seeds one batch per test class and provides:
+
+* assertBudget(), which fails when a block runs more queries or takes
+  longer than its budget;
+* assertQueriesDoNotScale(), which fails when a view runs more queries
+  after grow_tenant() than before, i.e. when it queries per row.
+
+Failure messages list the SQL that was repeated, which is usually the N+1
+loop responsible.
+
+Budgets are declared per view in the apps' tests.py files and must not
+depend on the number of rows: every view with a budget also gets a scaling
+test. Views known to query per row are budgeted at their current count on
+the seeded tenant, so they can't get worse unnoticed, and their scaling
+tests are kept separate and marked as expected failures until they are
+fixed. Time budgets are deliberately loose, so that they only catch gross
+slowdowns on a busy CI machine.
+"""
+from collections import Counter
+from contextlib import contextmanager
+from datetime import date, timedelta
+from decimal import Decimal
+import time
+
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from .instrumentation import fingerprint
+
+# Rows per seed batch. Kept below every page size and "recent N" slice, so
+# that a second batch adds rows to every list and a per-row query shows.
+SEED_ACCOUNTS = 10
+SEED_JOURNAL_ENTRIES = 4
+SEED_TRANSACTIONS = 4
+SEED_CUSTOMERS = 2
+SEED_INVOICES = 4
+SEED_EMPLOYEES = 3
+SEED_AUDIT_LOGS = 8
+SEED_HELP_ARTICLES = 2
+
+ACCOUNT_RANGES = [
+    ('asset', 1000), ('liability', 2000), ('equity', 3000), ('income', 4000), ('expense', 5000),
+]
+
+
+def seed_tenant():
+    """Create the shared test data set. Returns a dict of the objects tests need."""
+    from payroll.models import PayrollPeriod
+    from settings.models import CompanySettings
+    from users.models import CustomUser
+
+    today = date.today()
+    admin = CustomUser.objects.create_superuser(
+        'budget-admin', 'budget-admin@example.invalid', 'budget-password', role='admin'
+    )
+    CompanySettings.objects.create(
+        organization_name='Budget Test Co', fiscal_year_start=date(today.year, 1, 1), currency='USD',
+        tax_rate=Decimal('8.00'),
+    )
+    period = PayrollPeriod.objects.create(
+        name='Current period', period_type='monthly',
+        start_date=today.replace(day=1), end_date=today.replace(day=28) if today.day <= 28 else today,
+        pay_date=today,
+    )
+    tenant = {'admin': admin, 'period': period}
+    accounts = seed_batch(tenant, 0)
+    tenant['account'] = accounts['asset'][0]
+    return tenant
+
+
+def grow_tenant(tenant):
+    """Add another batch of rows of every kind to the seeded tenant"""
+    from accounts.models import Account
+    seed_batch(tenant, Account.objects.count() // SEED_ACCOUNTS)
+
+
+def seed_batch(tenant, batch):
+    """
+    Add one batch of accounts, journal entries, invoices, employees, audit
+    history and help content. Returns the batch's accounts by type.
+    """
+    from accounts.models import Account, JournalEntry, JournalEntryLine, Transaction
+    from audit.models import AuditLog
+    from audit.rollups import rebuild_daily_stats, rebuild_facets
+    from help_chat.models import FAQ, KnowledgeBase
+    from help_chat.search import rebuild_index
+    from invoices.models import Customer, Invoice, InvoiceItem, Payment
+    from payroll.models import Employee
+    from payroll.services import run_payroll
+    from django.contrib.contenttypes.models import ContentType
+
+    admin = tenant['admin']
+    today = date.today()
+    year_start = date(today.year, 1, 1)
+
+    def numbered(count):
+        # Numbers unique across batches
+        return range(batch * count, (batch + 1) * count)
+
+    per_type = SEED_ACCOUNTS // len(ACCOUNT_RANGES)
+    accounts = Account.objects.bulk_create([
+        Account(
+            code=str(base + i * 10),
+            name=f'{account_type.title()} account {i}',
+            account_type=account_type,
+            opening_balance=Decimal(1000 * (i + 1)) if account_type in ('asset', 'liability', 'equity') else Decimal('0'),
+            opening_balance_date=year_start,
+            created_by=admin,
+        )
+        for account_type, base in ACCOUNT_RANGES
+        for i in numbered(per_type)
+    ])
+    by_type = {account_type: [a for a in accounts if a.account_type == account_type]
+               for account_type, base in ACCOUNT_RANGES}
+
+    entries = JournalEntry.objects.bulk_create([
+        JournalEntry(
+            date=year_start + timedelta(days=i % 300),
+            description=f'Journal entry {i}',
+            reference=f'JE-{i:05d}',
+            is_posted=True,
+            created_by=admin,
+        )
+        for i in numbered(SEED_JOURNAL_ENTRIES)
+    ])
+    lines = []
+    for i, entry in enumerate(entries):
+        amount = Decimal(100 + (i * 37) % 900)
+        # Alternate sales, expenses and financing so every statement has rows
+        debit, credit = [
+            (by_type['asset'], by_type['income']),
+            (by_type['expense'], by_type['asset']),
+            (by_type['asset'], by_type['liability']),
+            (by_type['asset'], by_type['equity']),
+        ][i % 4]
+        lines.append(JournalEntryLine(journal_entry=entry, account=debit[i % len(debit)],
+                                      entry_type='debit', amount=amount))
+        lines.append(JournalEntryLine(journal_entry=entry, account=credit[i % len(credit)],
+                                      entry_type='credit', amount=amount))
+    JournalEntryLine.objects.bulk_create(lines)
+    Transaction.objects.bulk_create([
+        Transaction(
+            account=by_type['asset'][i % per_type], date=year_start + timedelta(days=i % 300),
+            description=f'Transaction {i}', transaction_type='debit' if i % 2 else 'credit',
+            amount=Decimal(50 + i), created_by=admin,
+        )
+        for i in numbered(SEED_TRANSACTIONS)
+    ])
+
+    customers = Customer.objects.bulk_create([
+        Customer(name=f'Customer {i}', email=f'customer{i}@example.invalid', created_by=admin)
+        for i in numbered(SEED_CUSTOMERS)
+    ])
+    invoices = Invoice.objects.bulk_create([
+        Invoice(
+            invoice_number=f'INV-{i:05d}',
+            customer=customers[i % SEED_CUSTOMERS],
+            issue_date=today - timedelta(days=i * 3),
+            due_date=today - timedelta(days=i * 3) + timedelta(days=30),
+            status=['draft', 'sent', 'paid', 'overdue'][i % 4],
+            subtotal=Decimal('300.00'), tax_rate=Decimal('8.00'), tax_amount=Decimal('24.00'),
+            total_amount=Decimal('324.00'), created_by=admin,
+        )
+        for i in numbered(SEED_INVOICES)
+    ])
+    InvoiceItem.objects.bulk_create([
+        InvoiceItem(invoice=invoice, description=f'Item {n}', quantity=Decimal('1'),
+                    unit_price=Decimal('100.00'), total=Decimal('100.00'), order=n)
+        for invoice in invoices
+        for n in range(3)
+    ])
+    Payment.objects.bulk_create([
+        Payment(invoice=invoice, amount=invoice.total_amount, payment_date=invoice.issue_date,
+                payment_method='bank_transfer', created_by=admin)
+        for invoice in invoices if invoice.status == 'paid'
+    ])
+
+    Employee.objects.bulk_create([
+        Employee(
+            employee_id=f'EMP-{i:04d}', first_name='Budget', last_name=f'Employee {i}',
+            email=f'employee{i}@example.invalid', hire_date=date(2020, 1, 1), position='Staff',
+            employment_type='full_time', base_salary=Decimal(3000 + i * 50),
+        )
+        for i in numbered(SEED_EMPLOYEES)
+    ])
+    run_payroll(tenant['period'], admin)
+
+    account_type = ContentType.objects.get_for_model(Account)
+    AuditLog.objects.bulk_create([
+        AuditLog(
+            user=admin, action=['create', 'update', 'delete', 'view'][i % 4],
+            content_type=account_type, object_id=accounts[i % len(accounts)].pk,
+            object_repr=str(accounts[i % len(accounts)]), session_key='budget',
+        )
+        for i in numbered(SEED_AUDIT_LOGS)
+    ])
+    rebuild_daily_stats()
+    rebuild_facets()
+
+    categories = [key for key, label in KnowledgeBase.CATEGORY_CHOICES]
+    KnowledgeBase.objects.bulk_create([
+        KnowledgeBase(
+            title=f'How to manage {categories[i % len(categories)]} {i}',
+            category=categories[i % len(categories)],
+            content=f'Step by step guide number {i} for invoices, journal entries and reports.',
+            keywords=f'{categories[i % len(categories)]}, guide, invoice, journal',
+        )
+        for i in numbered(SEED_HELP_ARTICLES)
+    ])
+    FAQ.objects.bulk_create([
+        FAQ(question=f'How do I create invoice number {i}?', answer=f'Answer {i}.',
+            category=categories[i % len(categories)])
+        for i in numbered(SEED_HELP_ARTICLES)
+    ])
+    rebuild_index()
+
+    return by_type
+
+
+def duplicated_queries(queries):
+    """[(count, fingerprint)] of statements run more than once, most repeated first"""
+    counts = Counter(fingerprint(query['sql']) for query in queries)
+    return [(count, sql) for sql, count in counts.most_common() if count > 1]
+
+
+# Budgets cover the request itself: no periodic view count flush inside the
+# block. Users are cached as they would be with the shared production cache.
+@override_settings(INSTRUMENTATION_ENABLED=False, HELP_SEARCH_INDEX_PATH=None,
+                   HELP_VIEW_COUNT_FLUSH_INTERVAL=24 * 60 * 60, USER_CACHE_ALLOW_LOCAL=True)
+class QueryBudgetTestCase(TestCase):
+    """TestCase with the seeded tenant, a logged-in admin client and the budget assertions"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.tenant = seed_tenant()
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.tenant['admin'])
+
+    @contextmanager
+    def assertBudget(self, name, queries, seconds):
+        """Fail if the block runs more than `queries` queries or takes more than `seconds`"""
+        with CaptureQueriesContext(connection) as captured:
+            start = time.perf_counter()
+            yield captured
+            elapsed = time.perf_counter() - start
+
+        if len(captured) > queries:
+            report = '\n'.join(f'  {count}x {sql}' for count, sql in duplicated_queries(captured.captured_queries))
+            self.fail(
+                f'{name} ran {len(captured)} queries, over its budget of {queries}.\n'
+                f'Repeated queries:\n{report or "  (none)"}'
+            )
+        self.assertLessEqual(
+            elapsed, seconds, f'{name} took {elapsed:.3f}s, over its budget of {seconds}s'
+        )
+
+    def get_within_budget(self, name, url, queries, seconds=2.0, **kwargs):
+        """GET url and check its status and budget. Returns the response."""
+        # Warm per-process caches (settings, user, content types) first
+        self.client.get(url, **kwargs)
+        with self.assertBudget(name, queries, seconds):
+            response = self.client.get(url, **kwargs)
+        self.assertEqual(response.status_code, 200, f'{name} returned {response.status_code}')
+        return response
+
+    def assertQueriesDoNotScale(self, name, url, **kwargs):
+        """Fail if url runs more queries once another batch of rows has been seeded"""
+        self.client.get(url, **kwargs)
+        with CaptureQueriesContext(connection) as before:
+            response = self.client.get(url, **kwargs)
+        self.assertEqual(response.status_code, 200, f'{name} returned {response.status_code}')
+
+        grow_tenant(self.tenant)
+        self.client.get(url, **kwargs)
+        with CaptureQueriesContext(connection) as after:
+            self.client.get(url, **kwargs)
+
+        if len(after) != len(before):
+            report = '\n'.join(f'  {count}x {sql}' for count, sql in duplicated_queries(after.captured_queries))
+            self.fail(
+                f'{name} ran {len(before)} queries, then {len(after)} with twice the rows.\n'
+                f'Repeated queries:\n{report or "  (none)"}'
+            )
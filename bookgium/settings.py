@@ -68,6 +68,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'bookgium.instrumentation.InstrumentationMiddleware',  # Per-view timing and query stats
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -170,9 +171,46 @@ MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Request instrumentation (bookgium.instrumentation): fraction of requests
+# measured, samples kept per view, and where/how often stats are dumped
+INSTRUMENTATION_ENABLED = True
+INSTRUMENTATION_SAMPLE_RATE = 0.1
+INSTRUMENTATION_WINDOW = 500
+INSTRUMENTATION_DUMP_PATH = BASE_DIR / 'instrumentation.json'
+INSTRUMENTATION_DUMP_INTERVAL = 60
+
+# Help chat search index (help_chat.search): saved copy of the index, and
+# how long a process trusts its index before checking for changes elsewhere
+HELP_SEARCH_INDEX_PATH = BASE_DIR / 'help_search_index.json.gz'
+HELP_SEARCH_LOCAL_TTL = 5
+
+# Seconds between writes of buffered help view counts (help_chat.view_counts)
+HELP_VIEW_COUNT_FLUSH_INTERVAL = 30
+
+# Answers kept per process for repeated help questions, and for how long
+# (help_chat.answer_cache)
+HELP_ANSWER_CACHE_SIZE = 1000
+HELP_ANSWER_CACHE_TTL = 60 * 60
+
+# Largest payroll period whose payslips are rendered during the download
+# request; bigger periods are left to the generate_payslips command
+PAYSLIP_DOWNLOAD_MAX_ENTRIES = 200
+
+# Cache session users in a per-process (local memory) cache too. Only safe
+# with a single process: other workers would not see password or role
+# changes (users.cache)
+USER_CACHE_ALLOW_LOCAL = False
+
 # Custom User Model
 AUTH_USER_MODEL = 'users.CustomUser'
 
+# Load the session user through the versioned user cache (users.cache).
+# ModelBackend stays so sessions stored under it remain valid.
+AUTHENTICATION_BACKENDS = [
+    'users.cache.CachedModelBackend',
+    'django.contrib.auth.backends.ModelBackend',
+]
+
 # Login/Logout URLs
 LOGIN_URL = '/users/login/'
 LOGIN_REDIRECT_URL = '/users/dashboard/'
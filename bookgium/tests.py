@@ -0,0 +1,243 @@
+import json
+import os
+import tempfile
+import threading
+from unittest import mock
+
+from django.contrib.auth.models import Group
+from django.core.cache import cache
+from django.db import DatabaseError, connection
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+
+from . import instrumentation, local_cache
+from .instrumentation import InstrumentationMiddleware, fingerprint
+from .local_cache import (
+    SignatureCachedValue, VersionedValue, cache_is_shared, cache_persists, cached_instance,
+    get_version, publish_version, shared_lock,
+)
+
+DUMMY_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}
+SHARED_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+                            'LOCATION': '/nonexistent'}}
+
+
+class LocalCacheTests(SimpleTestCase):
+
+    def setUp(self):
+        cache.clear()
+        patcher = mock.patch.dict(local_cache._process_versions, clear=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.loads = []
+
+    def load(self, version):
+        self.loads.append(version)
+        return len(self.loads)
+
+    def test_backend_kinds(self):
+        self.assertFalse(cache_is_shared())
+        self.assertTrue(cache_persists())
+        with self.settings(CACHES=DUMMY_CACHE):
+            self.assertFalse(cache_is_shared())
+            self.assertFalse(cache_persists())
+        with self.settings(CACHES=SHARED_CACHE):
+            self.assertTrue(cache_is_shared())
+            self.assertTrue(cache_persists())
+
+    def test_versions(self):
+        version = get_version('test:version')
+        self.assertEqual(get_version('test:version'), version)
+        published = publish_version('test:version')
+        self.assertNotEqual(published, version)
+        self.assertEqual(get_version('test:version'), published)
+
+    @override_settings(CACHES=DUMMY_CACHE)
+    def test_versions_without_a_cache_are_kept_in_the_process(self):
+        version = get_version('test:version')
+        self.assertEqual(get_version('test:version'), version)
+        published = publish_version('test:version')
+        self.assertNotEqual(published, version)
+        self.assertEqual(get_version('test:version'), published)
+
+    @override_settings(TEST_LOCAL_TTL=60)
+    def test_versioned_value_is_loaded_once_per_version(self):
+        value = VersionedValue('test:version', self.load, 'TEST_LOCAL_TTL')
+        self.assertEqual((value.get(), value.get()), (1, 1))
+        self.assertTrue(value.is_current())
+        # Another process publishing is noticed after the TTL
+        publish_version('test:version')
+        self.assertFalse(value.is_current())
+        self.assertEqual(value.get(), 1)
+        with self.settings(TEST_LOCAL_TTL=0):
+            self.assertEqual(value.get(), 2)
+            self.assertEqual(value.get(), 2)
+        self.assertEqual(self.loads, [self.loads[0], get_version('test:version')])
+
+    @override_settings(TEST_LOCAL_TTL=60)
+    def test_versioned_value_invalidate(self):
+        value = VersionedValue('test:version', self.load, 'TEST_LOCAL_TTL')
+        value.get()
+        version = value.invalidate()
+        self.assertEqual(value.get(), 2)
+        self.assertEqual(value.version, version)
+
+    @override_settings(CACHES=DUMMY_CACHE, TEST_LOCAL_TTL=60)
+    def test_versioned_value_without_a_cache_reloads_after_the_ttl(self):
+        value = VersionedValue('test:version', self.load, 'TEST_LOCAL_TTL')
+        self.assertEqual((value.get(), value.get()), (1, 1))
+        self.assertTrue(value.is_current())
+        with self.settings(TEST_LOCAL_TTL=0):
+            self.assertEqual(value.get(), 2)
+        # Same version each time, so anything tagged with it stays valid
+        self.assertEqual(self.loads, [self.loads[0]] * 2)
+        version = value.invalidate()
+        self.assertEqual(value.get(), 3)
+        self.assertEqual(self.loads[-1], version)
+
+    @override_settings(TEST_LOCAL_TTL=60)
+    def test_versioned_value_retries_after_database_errors(self):
+        value = VersionedValue('test:version', mock.Mock(side_effect=[DatabaseError, 'loaded']), 'TEST_LOCAL_TTL')
+        self.assertIsNone(value.get())
+        self.assertEqual(value.get(), 'loaded')
+
+    def test_cached_instance(self):
+        fetch = mock.Mock(return_value=Group(pk=1, name='Accountants'))
+        group = cached_instance('test:group', 'v1', Group, fetch)
+        rebuilt = cached_instance('test:group', 'v1', Group, fetch)
+        self.assertEqual(fetch.call_count, 1)
+        self.assertIsNot(rebuilt, group)
+        self.assertEqual((rebuilt.pk, rebuilt.name), (1, 'Accountants'))
+        cached_instance('test:group', 'v2', Group, fetch)
+        self.assertEqual(fetch.call_count, 2)
+
+    def test_cached_instance_remembers_a_missing_row(self):
+        fetch = mock.Mock(return_value=None)
+        self.assertIsNone(cached_instance('test:group', 'v1', Group, fetch))
+        self.assertIsNone(cached_instance('test:group', 'v1', Group, fetch))
+        self.assertEqual(fetch.call_count, 1)
+
+    def test_signature_cached_value(self):
+        signature = mock.Mock(return_value=(3, 'monday'))
+        build = mock.Mock(side_effect=['first', 'second', 'third'])
+        value = SignatureCachedValue(signature, build)
+        self.assertEqual((value.get(), value.get()), ('first', 'first'))
+        signature.return_value = (4, 'tuesday')
+        self.assertEqual(value.get(), 'second')
+        value.invalidate()
+        self.assertEqual(value.get(), 'third')
+        self.assertEqual(signature.call_count, 4)
+
+    def test_shared_lock(self):
+        with shared_lock('test:lock'):
+            self.assertFalse(cache.add('test:lock', 'other'))
+        self.assertTrue(cache.add('test:lock', 'other'))
+
+    def test_shared_lock_leaves_a_lock_taken_over_after_expiry(self):
+        with shared_lock('test:lock'):
+            cache.set('test:lock', 'other')
+        self.assertEqual(cache.get('test:lock'), 'other')
+
+
+class FingerprintTests(SimpleTestCase):
+
+    def test_literals_are_collapsed(self):
+        self.assertEqual(
+            fingerprint("SELECT * FROM accounts_account WHERE code = '1000' AND id = 42 LIMIT 21"),
+            'SELECT * FROM accounts_account WHERE code = ? AND id = ? LIMIT ?',
+        )
+        self.assertEqual(fingerprint("SELECT 'it''s', 'a' || 'b'"), 'SELECT ?, ? || ?')
+
+    def test_in_lists_of_any_length_compare_equal(self):
+        self.assertEqual(fingerprint('SELECT * FROM t WHERE id IN (1, 2, 3)'),
+                         fingerprint('SELECT * FROM t WHERE id in (7)'))
+        self.assertEqual(fingerprint('SELECT * FROM t WHERE id IN (%s, %s)'),
+                         'SELECT * FROM t WHERE id IN (...)')
+
+    def test_names_with_digits_and_whitespace(self):
+        self.assertEqual(fingerprint('SELECT  "payroll_ytd"."retirement_401k"\n  FROM t1'),
+                         'SELECT "payroll_ytd"."retirement_401k" FROM t1')
+
+
+@override_settings(INSTRUMENTATION_ENABLED=True, INSTRUMENTATION_SAMPLE_RATE=0.1, INSTRUMENTATION_DUMP_PATH=None)
+class InstrumentationMiddlewareTests(TestCase):
+
+    def setUp(self):
+        instrumentation.reset()
+        self.addCleanup(instrumentation.reset)
+
+    def get_response(self, request):
+        with connection.cursor() as cursor:
+            for i in range(2):
+                cursor.execute('SELECT %s', [i])
+        return HttpResponse('twelve bytes')
+
+    def request(self, roll):
+        middleware = InstrumentationMiddleware(self.get_response)
+        with mock.patch('bookgium.instrumentation.random.random', return_value=roll):
+            middleware(RequestFactory().get('/'))
+        return instrumentation.snapshot()['views']['unresolved']
+
+    def test_unsampled_requests_are_only_counted(self):
+        stats = self.request(0.1)
+        self.assertEqual((stats['requests'], stats['sampled']), (1, 0))
+        self.assertIsNone(stats['avg_sql_count'])
+
+    def test_sampled_requests_are_measured(self):
+        stats = self.request(0.09)
+        self.assertEqual((stats['requests'], stats['sampled']), (1, 1))
+        self.assertEqual(stats['avg_sql_count'], 2)
+        self.assertEqual(stats['avg_response_bytes'], 12)
+        self.assertEqual(stats['duplicate_queries'], [{'sql': 'SELECT %s', 'max_repeats': 2}])
+
+    def test_sample_rate_bounds(self):
+        with self.settings(INSTRUMENTATION_SAMPLE_RATE=0):
+            self.assertEqual(self.request(0.0)['sampled'], 0)
+        with self.settings(INSTRUMENTATION_SAMPLE_RATE=1):
+            self.assertEqual(self.request(0.999)['sampled'], 1)
+
+    def test_disabled(self):
+        with self.settings(INSTRUMENTATION_ENABLED=False):
+            InstrumentationMiddleware(self.get_response)(RequestFactory().get('/'))
+        self.assertEqual(instrumentation.snapshot()['views'], {})
+
+    def test_requests_do_not_write_the_dump(self):
+        with tempfile.TemporaryDirectory() as directory, \
+                mock.patch.dict(instrumentation._dumper, pid=None), \
+                mock.patch('bookgium.instrumentation.threading.Thread') as thread, \
+                mock.patch('bookgium.instrumentation.dump') as dump:
+            with self.settings(INSTRUMENTATION_DUMP_PATH=os.path.join(directory, 'stats.json'),
+                               INSTRUMENTATION_DUMP_INTERVAL=0):
+                self.request(0.0)
+                self.request(0.5)
+        dump.assert_not_called()
+        # One dump thread per process, however many requests
+        thread.assert_called_once_with(target=instrumentation._dump_periodically,
+                                       name='instrumentation-dump', daemon=True)
+        thread.return_value.start.assert_called_once_with()
+
+    def test_dump_thread_writes_the_snapshot(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'stats.json')
+            written = threading.Event()
+
+            def sleep(seconds):
+                if written.is_set():
+                    # Park the thread for the rest of the run
+                    threading.Event().wait()
+
+            real_dump = instrumentation.dump
+
+            def dump():
+                real_dump(path)
+                written.set()
+
+            self.request(0.0)
+            with mock.patch('bookgium.instrumentation.time.sleep', sleep), \
+                    mock.patch('bookgium.instrumentation.dump', dump), \
+                    mock.patch.dict(instrumentation._dumper, pid=None), \
+                    self.settings(INSTRUMENTATION_DUMP_PATH=path):
+                instrumentation.start_dumper()
+                self.assertTrue(written.wait(5))
+            with open(path, encoding='utf-8') as handle:
+                self.assertEqual(json.load(handle)['views']['unresolved']['requests'], 1)
@@ -20,6 +20,7 @@ from django.shortcuts import redirect
 from django.conf import settings
 from django.conf.urls.static import static
 from .health import health_check, deployment_info
+from .instrumentation import instrumentation_stats
 
 def home_redirect(request):
     """Redirect home page to dashboard if logged in, else to login"""
@@ -35,6 +36,7 @@ urlpatterns = [
     # Health check endpoints
     path('health/', health_check, name='health_check'),
     path('deployment-info/', deployment_info, name='deployment_info'),
+    path('instrumentation/', instrumentation_stats, name='instrumentation_stats'),
     
     # Application URLs
     path('admin/', admin.site.urls),
@@ -2,9 +2,11 @@ from django.db import models
 from django.urls import reverse
 from django.contrib.auth import get_user_model
 
+from audit.snapshot import AuditedModelMixin
+
 User = get_user_model()
 
-class Client(models.Model):
+class Client(AuditedModelMixin, models.Model):
     """Model representing a client/customer"""
     COMPANY_TYPE_CHOICES = [
         ('individual', 'Individual'),
@@ -99,7 +101,7 @@ class Client(models.Model):
         else:
             return "No contact person"
 
-class ClientNote(models.Model):
+class ClientNote(AuditedModelMixin, models.Model):
     """Model for tracking notes and interactions with clients"""
     client = models.ForeignKey(Client, on_delete=models.CASCADE, related_name='client_notes')
     title = models.CharField(max_length=200)
@@ -0,0 +1,117 @@
+"""
+Per-process cache of answers to help questions.
+
+People ask the same few questions in slightly different words, so answers
+are keyed by the question's normalized words: lowercased, punctuation,
+articles and filler words dropped, plurals folded, so "How do I create a
+journal entry?" and "how do I create journal entries" share one answer.
+The stop list here is deliberately much smaller than the search one:
+question words and negations change what is being asked ("How do I delete
+an invoice?" is not "Why can't I delete an invoice?"), and so does word
+order, which is kept. Callers add whatever else the answer depends on,
+such as the user's role or the chat intent, as context.
+
+Each cache holds up to HELP_ANSWER_CACHE_SIZE answers for at most
+HELP_ANSWER_CACHE_TTL seconds, evicting the least recently used first.
+Entries are tagged with the help search index version, which changes
+whenever a knowledge base article or FAQ is saved or deleted in any
+process, so answers built from old help content are never served. Hit
+rates are reported with the request instrumentation at /instrumentation/.
+"""
+from collections import OrderedDict
+import re
+import threading
+import time
+
+from django.conf import settings
+
+from bookgium.instrumentation import register_stats
+
+from .search import index_version, stem
+
+DEFAULT_SIZE = 1000
+DEFAULT_TTL = 60 * 60
+
+# Words that never change the question: articles, filler and the auxiliary "do"
+KEY_STOP_WORDS = {'a', 'an', 'the', 'please', 'do', 'does', 'did', 'i', 'me', 'my'}
+
+# Negated contractions are spelled out, so the "not" survives tokenizing
+CONTRACTIONS = [
+    (re.compile(r"\bcan['’]t\b|\bcannot\b"), 'can not'),
+    (re.compile(r"\bwon['’]t\b"), 'will not'),
+    (re.compile(r"n['’]t\b"), ' not'),
+]
+
+_WORD_RE = re.compile(r'\w+')
+
+
+def key_terms(question):
+    """The question's words as the cache sees them, in order"""
+    text = question.lower()
+    for pattern, replacement in CONTRACTIONS:
+        text = pattern.sub(replacement, text)
+    return [stem(word) for word in _WORD_RE.findall(text) if word not in KEY_STOP_WORDS]
+
+
+def question_key(question, *context):
+    """Normalized cache key of a question, or None if it has no meaningful terms"""
+    terms = key_terms(question)
+    if not terms:
+        return None
+    return '\x1f'.join([' '.join(terms), *(str(value) for value in context)])
+
+
+class AnswerCache:
+    """LRU cache with a TTL whose entries expire when the help content changes"""
+
+    def __init__(self, name):
+        self.name = name
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()   # key -> (expires, version, answer)
+        self.hits = self.misses = self.evictions = self.stale = 0
+        register_stats(f'answer_cache:{name}', self.stats)
+
+    def get(self, key):
+        version = index_version()
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now and entry[1] == version:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[2]
+            if entry is not None:
+                del self._entries[key]
+                self.stale += 1
+            self.misses += 1
+            return None
+
+    def set(self, key, answer):
+        version = index_version()
+        expires = time.monotonic() + getattr(settings, 'HELP_ANSWER_CACHE_TTL', DEFAULT_TTL)
+        size = getattr(settings, 'HELP_ANSWER_CACHE_SIZE', DEFAULT_SIZE)
+        with self._lock:
+            self._entries[key] = (expires, version, answer)
+            self._entries.move_to_end(key)
+            while len(self._entries) > size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else None,
+                'evictions': self.evictions,
+                'stale': self.stale,
+            }
+
+
+chat_answers = AnswerCache('help_chat')
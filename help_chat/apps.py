@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class HelpChatConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'help_chat'
+
+    def ready(self):
+        import help_chat.signals  # noqa: F401
@@ -0,0 +1,67 @@
+"""
+Intent classification for chat messages.
+
+ChatService used to check a message against its greeting, thanks and
+goodbye phrases with a substring scan per phrase, and then against seven
+topic regexes compiled and searched one after another. IntentClassifier
+compiles all intents into one regex, once per process:
+
+    \\A(?:(?=(?s:.*)(?:<greeting triggers>))(?P<greeting>)
+       |(?=(?s:.*)(?:<thanks triggers>))(?P<thanks>)
+       |...)
+
+Alternatives are tried in priority order and each one looks ahead through
+the whole message, so a single match() returns the same intent the
+sequential checks would have: the first intent, in priority order, with a
+trigger anywhere in the message. Phrases match as plain substrings, as
+before. Triggers are lowercase and messages are lowercased before
+matching, which is much faster than re.IGNORECASE. Run the
+bench_chat_intents command to compare the two approaches.
+"""
+import re
+
+# (intent, trigger phrases), highest priority first
+PHRASE_INTENTS = [
+    ('greeting', ['hi', 'hello', 'hey', 'good morning', 'good afternoon', 'good evening']),
+    ('thanks', ['thank you', 'thanks', 'thank', 'appreciate']),
+    ('goodbye', ['bye', 'goodbye', 'see you', 'thanks again']),
+]
+
+# (intent, regex) for help topics, highest priority first. Regexes must be
+# lowercase and their groups non-capturing.
+TOPIC_INTENTS = [
+    ('create_account', r'(?:how|create|add|new).*(?:account|chart)'),
+    ('record_transaction', r'(?:how|create|add|record).*(?:transaction|entry)'),
+    ('journal_entry', r'(?:journal|entry).*(?:how|create|add)'),
+    ('manage_clients', r'(?:client|customer).*(?:add|create|manage)'),
+    ('reports', r'(?:report|balance|income|statement)'),
+    ('settings', r'(?:setting|configure|currency|preference)'),
+    ('features', r'(?:feature|what|can|do)'),
+]
+
+
+class IntentClassifier:
+    """Classify a message by the first of its intents, in priority order, that matches"""
+
+    def __init__(self, intents):
+        # Greedy: the lookahead only asks whether a trigger occurs, and backtracking from the end is cheaper
+        alternatives = [
+            rf'(?=(?s:.*)(?:{pattern}))(?P<{name}>)'
+            for name, pattern in intents
+        ]
+        self.intents = [name for name, pattern in intents]
+        self.regex = re.compile(r'\A(?:' + '|'.join(alternatives) + ')')
+
+    def classify(self, message):
+        """The message's intent, or None. Matching ignores case."""
+        match = self.regex.match(message.lower())
+        return match.lastgroup if match else None
+
+
+def phrase_pattern(phrases):
+    return '|'.join(re.escape(phrase) for phrase in phrases)
+
+
+chat_intents = IntentClassifier(
+    [(name, phrase_pattern(phrases)) for name, phrases in PHRASE_INTENTS] + TOPIC_INTENTS
+)
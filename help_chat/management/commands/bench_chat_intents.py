@@ -0,0 +1,79 @@
+import re
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from help_chat.intents import PHRASE_INTENTS, TOPIC_INTENTS, chat_intents
+
+SAMPLE_MESSAGES = [
+    'hello',
+    'good morning, can you help me?',
+    'thanks a lot',
+    'ok bye',
+    'how do i create a new account in the chart?',
+    'how do i record a transaction',
+    'journal entry - how do i add one',
+    'i want to add a customer',
+    'where is the balance sheet report',
+    'change my currency preference',
+    'what can bookgium do',
+    'invoice overdue reminder email',
+    'the payroll run failed for march',
+    'export trial balance to excel for the last quarter please',
+    'zzz',
+    'quick question\nwhere do i add a new account',
+]
+
+
+def sequential_classify(message):
+    """The checks ChatService ran before intents were precompiled, kept for comparison"""
+    greetings = ['hi', 'hello', 'hey', 'good morning', 'good afternoon', 'good evening']
+    thanks = ['thank you', 'thanks', 'thank', 'appreciate']
+    goodbyes = ['bye', 'goodbye', 'see you', 'thanks again']
+    if any(greeting in message for greeting in greetings):
+        return 'greeting'
+    if any(phrase in message for phrase in thanks):
+        return 'thanks'
+    if any(goodbye in message for goodbye in goodbyes):
+        return 'goodbye'
+    # Rebuilt on every message, like the response dict was
+    patterns = dict(TOPIC_INTENTS)
+    for name, pattern in patterns.items():
+        if re.search(pattern, message, re.IGNORECASE):
+            return name
+    return None
+
+
+class Command(BaseCommand):
+    help = 'Compare the precompiled chat intent classifier with the old sequential checks'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20000,
+                            help='Passes over the sample messages (default 20000)')
+
+    def handle(self, *args, **options):
+        # Both must agree before their speed means anything
+        phrase_names = [name for name, phrases in PHRASE_INTENTS]
+        mismatches = [
+            (message, sequential_classify(message), chat_intents.classify(message))
+            for message in SAMPLE_MESSAGES
+            if sequential_classify(message) != chat_intents.classify(message)
+        ]
+        if mismatches:
+            raise CommandError(f'Classifiers disagree: {mismatches}')
+
+        iterations = options['iterations']
+        count = iterations * len(SAMPLE_MESSAGES)
+        timings = {}
+        for name, classify in (('sequential', sequential_classify), ('precompiled', chat_intents.classify)):
+            start = time.perf_counter()
+            for _ in range(iterations):
+                for message in SAMPLE_MESSAGES:
+                    classify(message)
+            timings[name] = (time.perf_counter() - start) / count * 1e6
+            self.stdout.write(f'{name:>12}: {timings[name]:.2f}us per message')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{count} classifications over {len(phrase_names) + len(TOPIC_INTENTS)} intents; '
+            f'precompiled is {timings["sequential"] / timings["precompiled"]:.1f}x faster.'
+        ))
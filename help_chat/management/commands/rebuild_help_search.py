@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from help_chat.search import rebuild_index
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the help chat search index from the knowledge base and FAQs'
+
+    def handle(self, *args, **options):
+        counts = rebuild_index()
+        summary = ', '.join(f'{count} {corpus.replace("_", " ")} entries' for corpus, count in counts.items())
+        self.stdout.write(self.style.SUCCESS(f'Indexed {summary}.'))
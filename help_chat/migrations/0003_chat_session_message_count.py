@@ -0,0 +1,30 @@
+# Generated by Django 5.2.6 on 2026-10-18 23:23
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def count_messages(apps, schema_editor):
+    ChatSession = apps.get_model('help_chat', 'ChatSession')
+    ChatMessage = apps.get_model('help_chat', 'ChatMessage')
+    counts = (
+        ChatMessage.objects.filter(session=models.OuterRef('pk')).order_by()
+        .values('session').annotate(count=models.Count('pk')).values('count')
+    )
+    ChatSession.objects.update(message_count=Coalesce(models.Subquery(counts), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('help_chat', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chatsession',
+            name='message_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(count_messages, migrations.RunPython.noop),
+    ]
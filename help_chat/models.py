@@ -2,6 +2,8 @@ from django.db import models
 from django.contrib.auth import get_user_model
 from django.utils import timezone
 
+from .view_counts import record_view
+
 User = get_user_model()
 
 class ChatSession(models.Model):
@@ -12,6 +14,8 @@ class ChatSession(models.Model):
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(auto_now=True)
     is_active = models.BooleanField(default=True)
+    # Kept up to date by ChatService and help_chat.signals, so listing sessions needs no COUNT
+    message_count = models.PositiveIntegerField(default=0)
     
     class Meta:
         ordering = ['-updated_at']
@@ -20,7 +24,7 @@ class ChatSession(models.Model):
         return f"{self.user.username} - {self.title}"
     
     def get_messages_count(self):
-        return self.messages.count()
+        return self.message_count
 
 class ChatMessage(models.Model):
     """Individual messages in a chat session"""
@@ -73,8 +77,9 @@ class KnowledgeBase(models.Model):
         return f"{self.get_category_display()} - {self.title}"
     
     def increment_view_count(self):
+        # Buffered and written in batches, see help_chat.view_counts
         self.view_count += 1
-        self.save(update_fields=['view_count'])
+        record_view(type(self), self.pk)
 
 class FAQ(models.Model):
     """Frequently Asked Questions"""
@@ -92,8 +97,9 @@ class FAQ(models.Model):
         return self.question
     
     def increment_view_count(self):
+        # Buffered and written in batches, see help_chat.view_counts
         self.view_count += 1
-        self.save(update_fields=['view_count'])
+        record_view(type(self), self.pk)
 
 class UserFeedback(models.Model):
     """User feedback on chat responses"""
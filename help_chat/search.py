@@ -0,0 +1,268 @@
+"""
+In-process BM25 search over the help content.
+
+Each corpus (knowledge base articles and FAQs) is indexed as weighted term
+counts per active entry: a term in a title or question counts more than one
+in the body. Queries are ranked with BM25, so the chat answers with the
+best matching entries rather than whichever rows the database returned
+first, and a search costs a few dictionary lookups instead of a LIKE scan
+per keyword.
+
+The index is built lazily from the database on first use and saved to
+HELP_SEARCH_INDEX_PATH, a gzipped JSON file tagged with the shared index
+version, so a restarted process loads it instead of rebuilding while the
+version is unchanged. Saving or deleting an entry updates this process's
+index in place after the commit and publishes a new version (see
+help_chat.signals); other processes notice within HELP_SEARCH_LOCAL_TTL
+seconds and reload. Edits hold a lock in the shared cache, and an index
+that is behind the shared version is rebuilt rather than patched, so one
+process's edit never publishes an index without another's. Writes that
+skip signals (bulk_create, update) need rebuild_index() or the
+rebuild_help_search command.
+"""
+from collections import Counter
+import gzip
+import heapq
+import json
+import logging
+import math
+import os
+import re
+
+from django.apps import apps
+from django.conf import settings
+
+from bookgium.local_cache import VersionedValue, publish_version, shared_lock
+
+logger = logging.getLogger(__name__)
+
+VERSION_KEY = 'help_chat:search:version'
+LOCK_KEY = 'help_chat:search:lock'
+FILE_FORMAT = 1
+
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+
+# corpus: (model, {field: weight})
+CORPORA = {
+    'knowledge_base': ('help_chat.KnowledgeBase', {'title': 3, 'keywords': 2, 'content': 1}),
+    'faq': ('help_chat.FAQ', {'question': 2, 'answer': 1}),
+}
+
+STOP_WORDS = {
+    'the', 'is', 'at', 'which', 'on', 'a', 'an', 'and', 'or', 'but', 'in', 'with', 'to', 'for', 'of',
+    'as', 'by', 'how', 'what', 'when', 'where', 'why', 'can', 'could', 'would', 'should', 'i', 'me',
+    'my', 'you', 'your',
+}
+
+_WORD_RE = re.compile(r'\b\w+\b')
+
+
+def stem(word):
+    """Fold simple plurals, so "invoices" finds "invoice" and the other way round"""
+    if len(word) > 4 and word.endswith('ies'):
+        return word[:-3] + 'y'
+    if len(word) > 4 and word.endswith(('ches', 'shes', 'sses', 'xes')):
+        return word[:-2]
+    if len(word) > 3 and word.endswith('s') and not word.endswith(('ss', 'us', 'is')):
+        return word[:-1]
+    return word
+
+
+def keywords(text):
+    """Meaningful words of a text, lowercased, in order, without stop words or short words"""
+    return [word for word in _WORD_RE.findall(text.lower()) if len(word) > 2 and word not in STOP_WORDS]
+
+
+def tokenize(text):
+    return [stem(word) for word in keywords(text)]
+
+
+class BM25Index:
+    """Weighted term counts per document with a term -> postings map for ranking"""
+
+    def __init__(self, documents=None):
+        self.documents = {}     # doc id -> {term: weighted count}
+        self.postings = {}      # term -> {doc id: weighted count}
+        self.lengths = {}       # doc id -> weighted length
+        self.total_length = 0
+        for doc_id, terms in (documents or {}).items():
+            self.add(doc_id, terms)
+
+    def add(self, doc_id, terms):
+        self.remove(doc_id)
+        if not terms:
+            return
+        self.documents[doc_id] = terms
+        for term, count in terms.items():
+            self.postings.setdefault(term, {})[doc_id] = count
+        length = sum(terms.values())
+        self.lengths[doc_id] = length
+        self.total_length += length
+
+    def remove(self, doc_id):
+        terms = self.documents.pop(doc_id, None)
+        if terms is None:
+            return
+        for term in terms:
+            posting = self.postings[term]
+            del posting[doc_id]
+            if not posting:
+                del self.postings[term]
+        self.total_length -= self.lengths.pop(doc_id)
+
+    def search(self, terms, limit):
+        """[(score, doc id)] of the best `limit` documents matching any of the terms"""
+        count = len(self.documents)
+        if not count:
+            return []
+        average_length = self.total_length / count
+        scores = {}
+        for term in set(terms):
+            posting = self.postings.get(term)
+            if not posting:
+                continue
+            idf = math.log(1 + (count - len(posting) + 0.5) / (len(posting) + 0.5))
+            for doc_id, frequency in posting.items():
+                norm = K1 * (1 - B + B * self.lengths[doc_id] / average_length)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * frequency * (K1 + 1) / (frequency + norm)
+        # Ties go to the lower id, so results are stable
+        return heapq.nlargest(limit, ((score, doc_id) for doc_id, score in scores.items()),
+                              key=lambda item: (item[0], -item[1]))
+
+
+def document_terms(instance, weights):
+    terms = Counter()
+    for field, weight in weights.items():
+        for term in tokenize(getattr(instance, field) or ''):
+            terms[term] += weight
+    return dict(terms)
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def _build():
+    indexes = {}
+    for corpus, (model_label, weights) in CORPORA.items():
+        model = apps.get_model(model_label)
+        fields = ['pk', *weights]
+        indexes[corpus] = BM25Index({
+            instance.pk: document_terms(instance, weights)
+            for instance in model.objects.filter(is_active=True).only(*fields)
+        })
+    return indexes
+
+
+def _load_file(version):
+    path = _setting('HELP_SEARCH_INDEX_PATH', None)
+    if not path or not os.path.exists(path):
+        return None
+    try:
+        with gzip.open(path, 'rt', encoding='utf-8') as handle:
+            data = json.load(handle)
+    except (OSError, ValueError):
+        logger.warning('Could not read help search index %s; rebuilding', path)
+        return None
+    if data.get('format') != FILE_FORMAT or data.get('version') != version:
+        return None
+    return {
+        corpus: BM25Index({int(doc_id): terms for doc_id, terms in documents.items()})
+        for corpus, documents in data['corpora'].items()
+    }
+
+
+def _save_file(version, indexes):
+    path = _setting('HELP_SEARCH_INDEX_PATH', None)
+    if not path:
+        return
+    data = {
+        'format': FILE_FORMAT,
+        'version': version,
+        'corpora': {corpus: index.documents for corpus, index in indexes.items()},
+    }
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    try:
+        with gzip.open(tmp_path, 'wt', encoding='utf-8') as handle:
+            json.dump(data, handle, separators=(',', ':'))
+        os.replace(tmp_path, path)
+    except OSError:
+        logger.exception('Could not write help search index %s', path)
+
+
+def _load(version):
+    """The indexes of a shared version, from the index file or else built from the database"""
+    indexes = _load_file(version)
+    if indexes is None:
+        indexes = _build()
+        _save_file(version, indexes)
+    return indexes
+
+
+_index = VersionedValue(VERSION_KEY, _load, 'HELP_SEARCH_LOCAL_TTL')
+
+
+def search(corpus, text, limit):
+    """Ids of the active entries of a corpus that best match the text, best first"""
+    terms = tokenize(text)
+    if not terms:
+        return []
+    with _index.lock:
+        indexes = _index.get()
+        if indexes is None:
+            return []
+        return [doc_id for score, doc_id in indexes[corpus].search(terms, limit)]
+
+
+def index_version():
+    """Version of the help content this process has indexed; it changes with every edit"""
+    with _index.lock:
+        _index.refresh()
+        return _index.version
+
+
+def _corpus_for(model):
+    for corpus, (model_label, weights) in CORPORA.items():
+        if model._meta.label == model_label:
+            return corpus, weights
+    raise ValueError(f'{model._meta.label} is not indexed for help search')
+
+
+def update_document(instance, deleted=False):
+    """
+    Reindex one saved or deleted entry and tell the other processes to
+    reload. The local index is only patched while it holds the shared
+    version; otherwise it is missing other processes' edits, and patching
+    it would publish an index without them, so it is rebuilt instead.
+    """
+    corpus, weights = _corpus_for(type(instance))
+    with _index.lock, shared_lock(LOCK_KEY):
+        if not _index.is_current():
+            _rebuild()
+            return
+        indexes = _index.value
+        if deleted or not instance.is_active:
+            indexes[corpus].remove(instance.pk)
+        else:
+            indexes[corpus].add(instance.pk, document_terms(instance, weights))
+        version = publish_version(VERSION_KEY)
+        _index.replace(version, indexes)
+        _save_file(version, indexes)
+
+
+def _rebuild():
+    # Publish first, so that every edit committed before this version is in the build
+    version = publish_version(VERSION_KEY)
+    indexes = _build()
+    _index.replace(version, indexes)
+    _save_file(version, indexes)
+    return indexes
+
+
+def rebuild_index():
+    """Rebuild every corpus from the database under a new version. Returns {corpus: entries}."""
+    with _index.lock, shared_lock(LOCK_KEY):
+        indexes = _rebuild()
+        return {corpus: len(index.documents) for corpus, index in indexes.items()}
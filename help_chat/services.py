@@ -1,36 +1,70 @@
-import re
 import uuid
 from typing import List, Dict, Optional, Tuple
-from django.db.models import Q
+from django.db.models import Case, F, Q, Value, When
 from django.utils import timezone
 from .models import ChatSession, ChatMessage, KnowledgeBase, FAQ
+from .answer_cache import chat_answers, question_key
+from .intents import chat_intents
+from .search import keywords as search_keywords, search
+from .view_counts import record_view
+
+DEFAULT_SESSION_TITLE = 'New Chat'
 
 class ChatService:
     """Service class for handling chat operations and AI responses"""
     
-    def __init__(self):
-        self.common_greetings = ['hi', 'hello', 'hey', 'good morning', 'good afternoon', 'good evening']
-        self.common_thanks = ['thank you', 'thanks', 'thank', 'appreciate']
-        self.common_goodbyes = ['bye', 'goodbye', 'see you', 'thanks again']
+    response_templates = {
+        'greeting': [
+            "Hello! I'm your Bookgium assistant. I'm here to help you navigate and understand our accounting application. What would you like to know?",
+            "Hi there! Welcome to Bookgium help chat. I can assist you with questions about transactions, journal entries, reports, and more. How can I help you today?",
+            "Hey! I'm here to help you make the most of Bookgium. Feel free to ask me about any features or how to perform specific tasks."
+        ],
+        'thanks': [
+            "You're welcome! Is there anything else I can help you with?",
+            "Happy to help! Feel free to ask if you have any other questions.",
+            "Glad I could assist! Let me know if you need help with anything else."
+        ],
+        'goodbye': [
+            "Goodbye! Feel free to come back anytime if you have questions about Bookgium.",
+            "See you later! I'm always here to help with your accounting questions.",
+            "Take care! Don't hesitate to reach out if you need assistance with Bookgium."
+        ]
+    }
+
+    # Canned answers per help topic intent (see help_chat.intents)
+    pattern_responses = {
+        # Account-related queries
+        'create_account':
+            "To create a new account:\n1. Go to 'Chart of Accounts' in the main menu\n2. Click 'Add New Account'\n3. Select the account type (Asset, Liability, Equity, Revenue, or Expense)\n4. Enter the account name and details\n5. Click 'Save'\n\nWould you like more details about account types?",
+        
+        # Transaction queries
+        'record_transaction':
+            "To record a transaction:\n1. Navigate to 'Transactions' > 'New Transaction'\n2. Select the transaction date\n3. Choose the accounts to debit and credit\n4. Enter the amounts (they must balance)\n5. Add a description\n6. You can also upload source documents as evidence\n7. Click 'Save'\n\nNeed help with journal entries instead?",
+        
+        # Journal entry queries
+        'journal_entry':
+            "To create a journal entry:\n1. Go to 'Journal Entries' > 'New Entry'\n2. Select the date\n3. Add multiple line items with accounts, debits, and credits\n4. Ensure total debits equal total credits\n5. Add a reference and description\n6. Upload supporting documents if needed\n7. Save the entry\n\nWould you like examples of common journal entries?",
+        
+        # Client queries
+        'manage_clients':
+            "To manage clients:\n1. Go to 'Clients' in the main menu\n2. Click 'Add New Client' to create a client\n3. Fill in contact information and details\n4. You can view all clients in the client list\n5. Edit or update client information as needed\n\nClients are used for invoicing and tracking customer transactions.",
+        
+        # Report queries
+        'reports':
+            "Available reports in Bookgium:\n• **Balance Sheet** - Shows assets, liabilities, and equity\n• **Income Statement** - Shows revenue and expenses\n• **Trial Balance** - Lists all accounts with balances\n• **General Ledger** - Detailed account transactions\n\nAccess reports from the 'Reports' menu. You can filter by date ranges and export to PDF or Excel.",
+        
+        # Settings queries
+        'settings':
+            "In Settings, you can:\n• Change your default currency\n• Update company information\n• Manage account preferences\n• Configure system settings\n\nThe currency setting affects how amounts are displayed throughout the application. Currently supported currencies include USD, EUR, GBP, and more.",
         
-        # Define response templates for different types of queries
-        self.response_templates = {
-            'greeting': [
-                "Hello! I'm your Bookgium assistant. I'm here to help you navigate and understand our accounting application. What would you like to know?",
-                "Hi there! Welcome to Bookgium help chat. I can assist you with questions about transactions, journal entries, reports, and more. How can I help you today?",
-                "Hey! I'm here to help you make the most of Bookgium. Feel free to ask me about any features or how to perform specific tasks."
-            ],
-            'thanks': [
-                "You're welcome! Is there anything else I can help you with?",
-                "Happy to help! Feel free to ask if you have any other questions.",
-                "Glad I could assist! Let me know if you need help with anything else."
-            ],
-            'goodbye': [
-                "Goodbye! Feel free to come back anytime if you have questions about Bookgium.",
-                "See you later! I'm always here to help with your accounting questions.",
-                "Take care! Don't hesitate to reach out if you need assistance with Bookgium."
-            ]
-        }
+        # Help with features
+        'features':
+            "Bookgium is a comprehensive accounting application with these key features:\n\n📊 **Chart of Accounts** - Manage your account structure\n💰 **Transactions** - Record financial transactions\n📝 **Journal Entries** - Create complex accounting entries\n👥 **Client Management** - Track customers and contacts\n🧾 **Invoicing** - Create and manage invoices\n📈 **Reports** - Generate financial statements\n⚙️ **Settings** - Customize your experience\n\nWhat specific feature would you like to learn about?"
+    }
+
+    def __init__(self):
+        # (model, pk) of the help entries quoted in the answer being built
+        self._viewed_entries = []
 
     def get_or_create_session(self, user, session_id: str = None) -> ChatSession:
         """Get existing session or create a new one"""
@@ -46,56 +80,70 @@ class ChatService:
         session = ChatSession.objects.create(
             user=user,
             session_id=session_id,
-            title="New Chat"
+            title=DEFAULT_SESSION_TITLE
         )
         return session
 
     def process_message(self, user, message: str, session_id: str = None) -> Tuple[ChatSession, str]:
         """Process user message and generate AI response"""
         session = self.get_or_create_session(user, session_id)
-        
-        # Save user message
-        ChatMessage.objects.create(
+        user_message = ChatMessage(
             session=session,
             message_type='user',
-            content=message
+            content=message,
+            timestamp=timezone.now()
         )
         
         # Generate AI response
         response = self._generate_response(message.lower().strip())
         
-        # Save AI response
-        ChatMessage.objects.create(
-            session=session,
-            message_type='assistant',
-            content=response
-        )
-        
-        # Update session title if it's the first meaningful message
-        if session.get_messages_count() <= 2 and session.title == "New Chat":
-            session.title = self._generate_session_title(message)
-            session.save()
+        # Save both messages in one statement
+        now = timezone.now()
+        ChatMessage.objects.bulk_create([
+            user_message,
+            ChatMessage(session=session, message_type='assistant', content=response, timestamp=now),
+        ])
         
-        # Update session timestamp
-        session.updated_at = timezone.now()
-        session.save()
+        # One UPDATE for the count and timestamp, and the title on the first turn of an untitled session
+        title = self._generate_session_title(message)
+        first_turn = Q(title=DEFAULT_SESSION_TITLE, message_count=0)
+        ChatSession.objects.filter(pk=session.pk).update(
+            message_count=F('message_count') + 2,
+            updated_at=now,
+            title=Case(When(first_turn, then=Value(title)), default=F('title')),
+        )
+        if session.title == DEFAULT_SESSION_TITLE and session.message_count == 0:
+            session.title = title
+        session.message_count += 2
+        session.updated_at = now
         
         return session, response
 
     def _generate_response(self, message: str) -> str:
         """Generate AI response based on user message"""
-        # Check for greetings
-        if any(greeting in message for greeting in self.common_greetings):
-            return self._get_random_response('greeting')
+        # One pass over the message finds greetings, thanks, goodbyes and help topics
+        intent = chat_intents.classify(message)
+        if intent in self.response_templates:
+            return self._get_random_response(intent)
         
-        # Check for thanks
-        if any(thanks in message for thanks in self.common_thanks):
-            return self._get_random_response('thanks')
-        
-        # Check for goodbyes
-        if any(goodbye in message for goodbye in self.common_goodbyes):
-            return self._get_random_response('goodbye')
+        # Repeated questions are answered from the cache. The pattern
+        # fallback depends on the intent, so it is part of the key.
+        key = question_key(message, intent)
+        cached = chat_answers.get(key) if key else None
+        if cached is not None:
+            response, viewed = cached
+            for model, pk in viewed:
+                record_view(model, pk)
+            return response
         
+        self._viewed_entries = []
+        response = self._find_answer(message, intent)
+        if key:
+            chat_answers.set(key, (response, self._viewed_entries))
+        return response
+
+    def _find_answer(self, message: str, intent: str = None) -> str:
+        """Answer from the knowledge base, FAQs, patterns or the default help"""
         # Search knowledge base and FAQs
         knowledge_response = self._search_knowledge_base(message)
         if knowledge_response:
@@ -106,7 +154,7 @@ class ChatService:
             return faq_response
         
         # Pattern-based responses for common queries
-        pattern_response = self._get_pattern_response(message)
+        pattern_response = self._get_pattern_response(message, intent)
         if pattern_response:
             return pattern_response
         
@@ -121,18 +169,17 @@ class ChatService:
         if not keywords:
             return None
         
-        # Search in knowledge base
-        query = Q()
-        for keyword in keywords:
-            query |= Q(title__icontains=keyword) | Q(content__icontains=keyword) | Q(keywords__icontains=keyword)
-        
-        knowledge_entries = KnowledgeBase.objects.filter(query, is_active=True)[:3]
+        # Best ranked entries from the search index
+        ids = search('knowledge_base', ' '.join(keywords), 3)
+        by_id = KnowledgeBase.objects.in_bulk(ids) if ids else {}
+        knowledge_entries = [by_id[pk] for pk in ids if pk in by_id]
         
         if knowledge_entries:
             response = "Based on your question, here's what I found:\n\n"
             for entry in knowledge_entries:
                 response += f"**{entry.title}**\n{entry.content[:300]}...\n\n"
                 entry.increment_view_count()
+                self._viewed_entries.append((KnowledgeBase, entry.pk))
             
             response += "Would you like more specific information about any of these topics?"
             return response
@@ -146,67 +193,31 @@ class ChatService:
         if not keywords:
             return None
         
-        query = Q()
-        for keyword in keywords:
-            query |= Q(question__icontains=keyword) | Q(answer__icontains=keyword)
-        
-        faqs = FAQ.objects.filter(query, is_active=True)[:2]
+        ids = search('faq', ' '.join(keywords), 2)
+        by_id = FAQ.objects.in_bulk(ids) if ids else {}
+        faqs = [by_id[pk] for pk in ids if pk in by_id]
         
         if faqs:
             response = "Here are some frequently asked questions that might help:\n\n"
             for faq in faqs:
                 response += f"**Q: {faq.question}**\n{faq.answer}\n\n"
                 faq.increment_view_count()
+                self._viewed_entries.append((FAQ, faq.pk))
             
             return response
         
         return None
 
-    def _get_pattern_response(self, message: str) -> Optional[str]:
-        """Generate responses based on message patterns"""
-        responses = {
-            # Account-related queries
-            r'(?:how|create|add|new).*(?:account|chart)': 
-                "To create a new account:\n1. Go to 'Chart of Accounts' in the main menu\n2. Click 'Add New Account'\n3. Select the account type (Asset, Liability, Equity, Revenue, or Expense)\n4. Enter the account name and details\n5. Click 'Save'\n\nWould you like more details about account types?",
-            
-            # Transaction queries
-            r'(?:how|create|add|record).*(?:transaction|entry)':
-                "To record a transaction:\n1. Navigate to 'Transactions' > 'New Transaction'\n2. Select the transaction date\n3. Choose the accounts to debit and credit\n4. Enter the amounts (they must balance)\n5. Add a description\n6. You can also upload source documents as evidence\n7. Click 'Save'\n\nNeed help with journal entries instead?",
-            
-            # Journal entry queries
-            r'(?:journal|entry).*(?:how|create|add)':
-                "To create a journal entry:\n1. Go to 'Journal Entries' > 'New Entry'\n2. Select the date\n3. Add multiple line items with accounts, debits, and credits\n4. Ensure total debits equal total credits\n5. Add a reference and description\n6. Upload supporting documents if needed\n7. Save the entry\n\nWould you like examples of common journal entries?",
-            
-            # Client queries
-            r'(?:client|customer).*(?:add|create|manage)':
-                "To manage clients:\n1. Go to 'Clients' in the main menu\n2. Click 'Add New Client' to create a client\n3. Fill in contact information and details\n4. You can view all clients in the client list\n5. Edit or update client information as needed\n\nClients are used for invoicing and tracking customer transactions.",
-            
-            # Report queries
-            r'(?:report|balance|income|statement)':
-                "Available reports in Bookgium:\n• **Balance Sheet** - Shows assets, liabilities, and equity\n• **Income Statement** - Shows revenue and expenses\n• **Trial Balance** - Lists all accounts with balances\n• **General Ledger** - Detailed account transactions\n\nAccess reports from the 'Reports' menu. You can filter by date ranges and export to PDF or Excel.",
-            
-            # Settings queries
-            r'(?:setting|configure|currency|preference)':
-                "In Settings, you can:\n• Change your default currency\n• Update company information\n• Manage account preferences\n• Configure system settings\n\nThe currency setting affects how amounts are displayed throughout the application. Currently supported currencies include USD, EUR, GBP, and more.",
-            
-            # Help with features
-            r'(?:feature|what|can|do)':
-                "Bookgium is a comprehensive accounting application with these key features:\n\n📊 **Chart of Accounts** - Manage your account structure\n💰 **Transactions** - Record financial transactions\n📝 **Journal Entries** - Create complex accounting entries\n👥 **Client Management** - Track customers and contacts\n🧾 **Invoicing** - Create and manage invoices\n📈 **Reports** - Generate financial statements\n⚙️ **Settings** - Customize your experience\n\nWhat specific feature would you like to learn about?"
-        }
-        
-        for pattern, response in responses.items():
-            if re.search(pattern, message, re.IGNORECASE):
-                return response
-        
-        return None
+    def _get_pattern_response(self, message: str, intent: str = None) -> Optional[str]:
+        """Canned answer for the help topic of a message"""
+        if intent is None:
+            intent = chat_intents.classify(message)
+        return self.pattern_responses.get(intent)
 
     def _extract_keywords(self, message: str) -> List[str]:
         """Extract relevant keywords from message"""
         # Remove common words and extract meaningful terms
-        common_words = {'the', 'is', 'at', 'which', 'on', 'a', 'an', 'and', 'or', 'but', 'in', 'with', 'to', 'for', 'of', 'as', 'by', 'how', 'what', 'when', 'where', 'why', 'can', 'could', 'would', 'should', 'i', 'me', 'my', 'you', 'your'}
-        
-        words = re.findall(r'\b\w+\b', message.lower())
-        keywords = [word for word in words if len(word) > 2 and word not in common_words]
+        keywords = search_keywords(message)
         
         return keywords[:10]  # Limit to top 10 keywords
 
@@ -0,0 +1,49 @@
+from django.core.signals import request_finished
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import FAQ, ChatMessage, ChatSession, KnowledgeBase
+from .search import update_document
+from .view_counts import flush_if_due
+
+
+@receiver(post_save, sender=KnowledgeBase)
+@receiver(post_save, sender=FAQ)
+def help_entry_saved(sender, instance, update_fields=None, **kwargs):
+    """Reindex a saved help entry once its transaction commits"""
+    # View counter updates don't change the indexed text
+    if update_fields is not None and set(update_fields) <= {'view_count'}:
+        return
+    transaction.on_commit(lambda: update_document(instance))
+
+
+@receiver(post_delete, sender=KnowledgeBase)
+@receiver(post_delete, sender=FAQ)
+def help_entry_deleted(sender, instance, **kwargs):
+    """Drop a deleted help entry from the index once its transaction commits"""
+    transaction.on_commit(lambda: update_document(instance, deleted=True))
+
+
+@receiver(request_finished)
+def flush_help_view_counts(sender, **kwargs):
+    """Write buffered help view counts once they are due, after the response has gone out"""
+    flush_if_due()
+
+
+@receiver(post_save, sender=ChatMessage)
+def chat_message_saved(sender, instance, created, raw=False, **kwargs):
+    """Count messages added one at a time (ChatService counts its own bulk inserts)"""
+    if created and not raw:
+        ChatSession.objects.filter(pk=instance.session_id).update(message_count=F('message_count') + 1)
+
+
+@receiver(post_delete, sender=ChatMessage)
+def chat_message_deleted(sender, instance, origin=None, **kwargs):
+    # Nothing to update when the session itself is being deleted
+    if isinstance(origin, ChatSession):
+        return
+    ChatSession.objects.filter(pk=instance.session_id, message_count__gt=0).update(
+        message_count=F('message_count') - 1
+    )
@@ -1,3 +1,266 @@
-from django.test import TestCase
+from importlib import import_module
+import json
+import os
+import tempfile
+from unittest import mock
 
-# Create your tests here.
+from django.apps import apps as django_apps
+from django.contrib.auth import get_user_model
+from django.db import DatabaseError, connection
+from django.db.models import QuerySet
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from bookgium import local_cache
+from bookgium.local_cache import publish_version
+from bookgium.query_budget import QueryBudgetTestCase
+
+from . import search as search_module, view_counts
+from .answer_cache import AnswerCache, question_key
+from .models import FAQ, ChatMessage, ChatSession
+from .search import BM25Index, index_version, rebuild_index, search, update_document
+from .services import ChatService
+
+# view name: (max queries, max seconds) against the seeded tenant
+BUDGETS = {
+    'send_message': (5, 2.0),
+}
+
+
+class HelpChatQueryBudgetTests(QueryBudgetTestCase):
+
+    def send(self, message, session_id=None):
+        response = self.client.post(
+            reverse('help_chat:send_message'),
+            data=json.dumps({'message': message, 'session_id': session_id}),
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_send_message(self):
+        session_id = self.send('Hello')['session_id']
+        with self.assertBudget('send_message', *BUDGETS['send_message']):
+            data = self.send('How do I create an invoice?', session_id)
+        self.assertTrue(data['success'])
+
+
+class BM25IndexTests(SimpleTestCase):
+
+    def test_rarer_and_heavier_terms_rank_higher(self):
+        index = BM25Index({
+            1: {'invoice': 1, 'customer': 1},
+            2: {'invoice': 3, 'void': 3},
+            3: {'invoice': 1, 'payroll': 1},
+        })
+        # "void" only occurs in document 2, "invoice" everywhere
+        self.assertEqual([doc_id for score, doc_id in index.search(['void', 'invoice'], 3)], [2, 1, 3])
+        self.assertEqual([doc_id for score, doc_id in index.search(['payroll'], 3)], [3])
+        self.assertEqual(index.search(['missing'], 3), [])
+
+    def test_ties_go_to_the_lower_id(self):
+        index = BM25Index({5: {'report': 1}, 2: {'report': 1}, 9: {'report': 1}})
+        self.assertEqual([doc_id for score, doc_id in index.search(['report'], 2)], [2, 5])
+
+    def test_add_replaces_and_remove_cleans_up(self):
+        index = BM25Index({1: {'invoice': 2}, 2: {'invoice': 1, 'tax': 1}})
+        index.add(1, {'tax': 1})
+        self.assertEqual(index.postings, {'invoice': {2: 1}, 'tax': {2: 1, 1: 1}})
+        self.assertEqual(index.total_length, 3)
+
+        index.remove(2)
+        index.remove(2)
+        self.assertEqual(index.postings, {'tax': {1: 1}})
+        self.assertEqual((index.lengths, index.total_length), ({1: 1}, 1))
+
+        # An entry without terms is not indexed
+        index.add(1, {})
+        self.assertEqual((index.documents, index.postings, index.total_length), ({}, {}, 0))
+
+
+@override_settings(HELP_SEARCH_INDEX_PATH=None)
+class HelpSearchIndexTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.faq = FAQ.objects.create(question='How do I void an invoice?', answer='Open it and void it.',
+                                     category='invoices')
+
+    def test_index_file_round_trip(self):
+        with tempfile.TemporaryDirectory() as directory:
+            with override_settings(HELP_SEARCH_INDEX_PATH=os.path.join(directory, 'index.json.gz')):
+                rebuild_index()
+                version = index_version()
+                loaded = search_module._load_file(version)
+                self.assertIsNone(search_module._load_file('another version'))
+
+        self.assertEqual(loaded['faq'].documents, {self.faq.pk: search_module.document_terms(
+            self.faq, search_module.CORPORA['faq'][1]
+        )})
+        self.assertEqual(loaded['knowledge_base'].documents, {})
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}},
+                       HELP_SEARCH_LOCAL_TTL=0)
+    def test_index_is_reloaded_not_rebuilt_without_a_cache(self):
+        with tempfile.TemporaryDirectory() as directory, \
+                mock.patch.dict(local_cache._process_versions, clear=True), \
+                override_settings(HELP_SEARCH_INDEX_PATH=os.path.join(directory, 'index.json.gz')):
+            rebuild_index()
+            version = index_version()
+            with mock.patch.object(search_module, '_build') as build, \
+                    mock.patch.object(search_module, '_save_file') as save_file:
+                self.assertEqual(search('faq', 'void', 5), [self.faq.pk])
+                self.assertEqual(index_version(), version)
+            build.assert_not_called()
+            save_file.assert_not_called()
+
+            answers = AnswerCache('test')
+            answers.set('void invoice', 'Open it and void it.')
+            self.assertEqual(answers.get('void invoice'), 'Open it and void it.')
+
+    def test_current_index_is_patched_in_place(self):
+        rebuild_index()
+        version = index_version()
+        faq = FAQ.objects.create(question='Which currency do reports use?', answer='The company currency.',
+                                 category='reports')
+        with self.assertNumQueries(0):
+            update_document(faq)
+        self.assertNotEqual(index_version(), version)
+        self.assertEqual(search('faq', 'currency', 5), [faq.pk])
+
+    def test_stale_index_is_rebuilt_rather_than_patched(self):
+        rebuild_index()
+        # Another process adds an entry and publishes a new version
+        other = FAQ.objects.create(question='How do I run payroll?', answer='From the payroll dashboard.',
+                                   category='payroll')
+        publish_version(search_module.VERSION_KEY)
+
+        # This process edits an entry before noticing
+        self.faq.question = 'How do I credit an invoice?'
+        self.faq.save()
+        update_document(self.faq)
+
+        self.assertEqual(search('faq', 'payroll', 5), [other.pk])
+        self.assertEqual(search('faq', 'credit', 5), [self.faq.pk])
+        self.assertEqual(search('faq', 'void', 5), [self.faq.pk])
+
+
+class ViewCountTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.faq = FAQ.objects.create(question='How do I close a period?', answer='From the accounts menu.',
+                                     category='accounts')
+
+    def setUp(self):
+        # Views recorded by other tests in this process
+        view_counts.flush_view_counts()
+
+    def test_views_are_written_in_one_update(self):
+        self.faq.increment_view_count()
+        FAQ.objects.get(pk=self.faq.pk).increment_view_count()
+        self.assertEqual(FAQ.objects.get(pk=self.faq.pk).view_count, 0)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(view_counts.flush_view_counts(), 2)
+        updates = [query['sql'] for query in queries.captured_queries if query['sql'].startswith('UPDATE')]
+        self.assertEqual(len(updates), 1)
+        self.assertIn('"view_count" + 2', updates[0])
+        self.assertEqual(FAQ.objects.get(pk=self.faq.pk).view_count, 2)
+
+    def test_failed_flush_keeps_the_views(self):
+        self.faq.increment_view_count()
+        with mock.patch.object(QuerySet, 'update', side_effect=DatabaseError('database is locked')):
+            with self.assertLogs('help_chat.view_counts', 'ERROR'):
+                self.assertEqual(view_counts.flush_view_counts(), 0)
+        self.assertEqual(FAQ.objects.get(pk=self.faq.pk).view_count, 0)
+
+        self.faq.increment_view_count()
+        self.assertEqual(view_counts.flush_view_counts(), 2)
+        self.assertEqual(FAQ.objects.get(pk=self.faq.pk).view_count, 2)
+
+
+class QuestionKeyTests(SimpleTestCase):
+
+    def test_rewordings_share_a_key(self):
+        self.assertEqual(question_key('How do I create a journal entry?'),
+                         question_key('how do I create journal entries'))
+
+    def test_question_words_and_negations_are_kept(self):
+        keys = {
+            question_key('How do I delete an invoice?'),
+            question_key("Why can't I delete an invoice?"),
+            question_key('Why can I delete an invoice?'),
+            question_key("Invoices don't balance"),
+            question_key('Invoices do balance'),
+        }
+        self.assertEqual(len(keys), 5)
+
+    def test_word_order_and_context_are_kept(self):
+        self.assertNotEqual(question_key('create entry'), question_key('entry create'))
+        self.assertNotEqual(question_key('create entry', 'admin'), question_key('create entry', 'viewer'))
+        self.assertIsNone(question_key('Please, the...'))
+
+
+class ChatMessageCountTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user('chatter', 'chatter@example.invalid', 'chat-password')
+
+    def setUp(self):
+        self.service = ChatService()
+
+    def test_backfill_counts_existing_messages(self):
+        busy = ChatSession.objects.create(user=self.user, session_id='busy')
+        quiet = ChatSession.objects.create(user=self.user, session_id='quiet')
+        for content in ['one', 'two', 'three']:
+            ChatMessage.objects.create(session=busy, message_type='user', content=content)
+        ChatSession.objects.update(message_count=7)
+
+        migration = import_module('help_chat.migrations.0003_chat_session_message_count')
+        migration.count_messages(django_apps, None)
+
+        busy.refresh_from_db()
+        quiet.refresh_from_db()
+        self.assertEqual(busy.message_count, 3)
+        self.assertEqual(quiet.message_count, 0)
+
+    def test_process_message_counts_both_messages(self):
+        session, response = self.service.process_message(self.user, 'How do I create an invoice?')
+        session, response = self.service.process_message(self.user, 'Thanks', session.session_id)
+        self.assertEqual(session.message_count, 4)
+        session.refresh_from_db()
+        self.assertEqual(session.message_count, 4)
+        self.assertEqual(session.messages.count(), 4)
+
+    def test_title_is_set_on_the_first_turn_only(self):
+        session, response = self.service.process_message(self.user, 'How do I create an invoice?')
+        title = self.service._generate_session_title('How do I create an invoice?')
+        self.assertEqual(session.title, title)
+
+        session, response = self.service.process_message(self.user, 'And how do I void one?', session.session_id)
+        self.assertEqual(session.title, title)
+        session.refresh_from_db()
+        self.assertEqual(session.title, title)
+
+    def test_renamed_session_keeps_its_title(self):
+        ChatSession.objects.create(user=self.user, session_id='renamed', title='Invoices')
+        session, response = self.service.process_message(self.user, 'How do I create an invoice?', 'renamed')
+        session.refresh_from_db()
+        self.assertEqual(session.title, 'Invoices')
+
+    def test_messages_written_outside_the_service_are_counted(self):
+        session = ChatSession.objects.create(user=self.user, session_id='outside')
+        message = ChatMessage.objects.create(session=session, message_type='system', content='Welcome')
+        session.refresh_from_db()
+        self.assertEqual(session.message_count, 1)
+
+        message.delete()
+        session.refresh_from_db()
+        self.assertEqual(session.message_count, 0)
+
+        ChatMessage.objects.create(session=session, message_type='system', content='Welcome back')
+        session.delete()
+        self.assertFalse(ChatSession.objects.filter(pk=session.pk).exists())
@@ -0,0 +1,72 @@
+"""
+Buffered view counters for knowledge base articles and FAQs.
+
+Every chat answer used to save the view_count of each entry it quoted, a
+read-modify-write per entry that also lost increments when two requests
+raced. increment_view_count() now only adds to a per-process buffer.
+Once HELP_VIEW_COUNT_FLUSH_INTERVAL seconds have passed, the next
+finished request writes the buffer out after its response has been
+sent, with one UPDATE ... SET view_count = view_count + n per model and
+increment (see help_chat.signals). flush_view_counts() can also be
+called directly.
+
+Counters shown to users can lag by up to the flush interval, and a
+process that exits loses its unflushed views. There is deliberately no
+exit hook: by then the connection may point at another database (the
+test runner restores the real one), where the buffered ids mean other
+rows.
+"""
+from collections import Counter
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import DatabaseError, transaction
+from django.db.models import F
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_FLUSH_INTERVAL = 30
+
+_lock = threading.Lock()
+_pending = Counter()
+_state = {'last_flush': time.monotonic()}
+
+
+def record_view(model, pk, count=1):
+    with _lock:
+        _pending[model, pk] += count
+
+
+def flush_view_counts():
+    """Write the buffered views to the database. Returns the number of views written."""
+    with _lock:
+        pending = dict(_pending)
+        _pending.clear()
+        _state['last_flush'] = time.monotonic()
+    if not pending:
+        return 0
+
+    # One UPDATE per model and distinct increment
+    batches = {}
+    for (model, pk), count in pending.items():
+        batches.setdefault((model, count), []).append(pk)
+    try:
+        with transaction.atomic():
+            for (model, count), pks in batches.items():
+                model.objects.filter(pk__in=pks).update(view_count=F('view_count') + count)
+    except DatabaseError:
+        logger.exception('Could not write help view counts; keeping them for the next flush')
+        with _lock:
+            _pending.update(pending)
+        return 0
+    return sum(pending.values())
+
+
+def flush_if_due():
+    interval = getattr(settings, 'HELP_VIEW_COUNT_FLUSH_INTERVAL', DEFAULT_FLUSH_INTERVAL)
+    with _lock:
+        if not _pending or time.monotonic() - _state['last_flush'] < interval:
+            return
+    flush_view_counts()
@@ -1,10 +1,14 @@
 from django.contrib import admin
-from .models import Customer, Invoice, InvoiceItem, Payment
+from .models import Customer, Invoice, InvoiceItem, Payment, RecurringInvoiceTemplate, RecurringInvoiceTemplateItem
 
 class InvoiceItemInline(admin.TabularInline):
     model = InvoiceItem
     extra = 1
 
+class RecurringInvoiceTemplateItemInline(admin.TabularInline):
+    model = RecurringInvoiceTemplateItem
+    extra = 1
+
 @admin.register(Customer)
 class CustomerAdmin(admin.ModelAdmin):
     list_display = ['name', 'email', 'phone', 'city', 'created_at', 'is_active']
@@ -32,3 +36,11 @@ class PaymentAdmin(admin.ModelAdmin):
     list_filter = ['payment_method', 'payment_date']
     search_fields = ['invoice__invoice_number', 'reference']
     ordering = ['-payment_date']
+
+@admin.register(RecurringInvoiceTemplate)
+class RecurringInvoiceTemplateAdmin(admin.ModelAdmin):
+    list_display = ['name', 'customer', 'frequency', 'interval', 'next_run_date', 'last_run_date', 'is_active']
+    list_filter = ['frequency', 'is_active']
+    search_fields = ['name', 'customer__name', 'customer__email']
+    inlines = [RecurringInvoiceTemplateItemInline]
+    ordering = ['name']
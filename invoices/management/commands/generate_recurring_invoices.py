@@ -0,0 +1,64 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from datetime import datetime
+
+from invoices.recurring import (
+    DEFAULT_CHUNK_SIZE, generate_recurring_invoices, get_due_template_ids
+)
+
+
+class Command(BaseCommand):
+    help = 'Generate invoices for all recurring invoice templates that are due'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--date',
+            type=str,
+            help='Generate periods due on or before this date (YYYY-MM-DD). Defaults to today.'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=DEFAULT_CHUNK_SIZE,
+            help='Number of templates processed per transaction'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=1,
+            help='Number of worker processes to use for large batches'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Show how many templates are due without generating invoices'
+        )
+
+    def handle(self, *args, **options):
+        as_of = timezone.now().date()
+        if options.get('date'):
+            try:
+                as_of = datetime.strptime(options['date'], '%Y-%m-%d').date()
+            except ValueError:
+                raise CommandError('Invalid date format. Use YYYY-MM-DD')
+
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size must be at least 1')
+
+        if options['dry_run']:
+            count = len(get_due_template_ids(as_of))
+            self.stdout.write(
+                self.style.WARNING(f'DRY RUN: {count} recurring templates are due as of {as_of}.')
+            )
+            return
+
+        templates, invoices = generate_recurring_invoices(
+            as_of=as_of,
+            chunk_size=options['chunk_size'],
+            workers=options['workers'],
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Processed {templates} recurring templates and created {invoices} invoices as of {as_of}.'
+            )
+        )
@@ -0,0 +1,80 @@
+# Generated by Django 5.2.6 on 2026-10-18 22:37
+
+import django.db.models.deletion
+import django.utils.timezone
+from decimal import Decimal
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('invoices', '0002_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecurringInvoiceTemplateItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('description', models.CharField(max_length=500)),
+                ('quantity', models.DecimalField(decimal_places=2, default=Decimal('1.00'), max_digits=10)),
+                ('unit_price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('order', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'ordering': ['order'],
+            },
+        ),
+        migrations.AddField(
+            model_name='invoice',
+            name='recurring_period',
+            field=models.DateField(blank=True, help_text='Billing period start this invoice was generated for', null=True),
+        ),
+        migrations.CreateModel(
+            name='RecurringInvoiceTemplate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=200)),
+                ('frequency', models.CharField(choices=[('weekly', 'Weekly'), ('monthly', 'Monthly'), ('quarterly', 'Quarterly'), ('yearly', 'Yearly')], default='monthly', max_length=20)),
+                ('interval', models.PositiveIntegerField(default=1, help_text='Bill every N periods (e.g. 2 = every other month)')),
+                ('start_date', models.DateField(default=django.utils.timezone.now)),
+                ('end_date', models.DateField(blank=True, help_text='Leave blank to bill indefinitely', null=True)),
+                ('next_run_date', models.DateField(help_text='Start of the next billing period to generate')),
+                ('last_run_date', models.DateField(blank=True, null=True)),
+                ('days_until_due', models.PositiveIntegerField(default=30)),
+                ('tax_rate', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=5)),
+                ('discount_amount', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=10)),
+                ('notes', models.TextField(blank=True, null=True)),
+                ('terms', models.TextField(blank=True, null=True)),
+                ('is_active', models.BooleanField(default=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+                ('customer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recurring_templates', to='invoices.customer')),
+            ],
+            options={
+                'ordering': ['name'],
+            },
+        ),
+        migrations.AddField(
+            model_name='invoice',
+            name='recurring_template',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='generated_invoices', to='invoices.recurringinvoicetemplate'),
+        ),
+        migrations.AddConstraint(
+            model_name='invoice',
+            constraint=models.UniqueConstraint(fields=('recurring_template', 'recurring_period'), name='unique_recurring_invoice_period'),
+        ),
+        migrations.AddField(
+            model_name='recurringinvoicetemplateitem',
+            name='template',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='items', to='invoices.recurringinvoicetemplate'),
+        ),
+        migrations.AddIndex(
+            model_name='recurringinvoicetemplate',
+            index=models.Index(fields=['is_active', 'next_run_date'], name='invoices_re_is_acti_ff33ac_idx'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.6 on 2026-10-18 23:33
+
+import django.core.validators
+from django.conf import settings
+from django.db import migrations, models
+
+
+def fix_zero_intervals(apps, schema_editor):
+    RecurringInvoiceTemplate = apps.get_model('invoices', 'RecurringInvoiceTemplate')
+    RecurringInvoiceTemplate.objects.filter(interval__lt=1).update(interval=1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('invoices', '0003_recurring_invoice_templates'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='recurringinvoicetemplate',
+            name='interval',
+            field=models.PositiveIntegerField(default=1, help_text='Bill every N periods (e.g. 2 = every other month)', validators=[django.core.validators.MinValueValidator(1)]),
+        ),
+        migrations.RunPython(fix_zero_intervals, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='recurringinvoicetemplate',
+            constraint=models.CheckConstraint(condition=models.Q(('interval__gte', 1)), name='recurring_template_interval_gte_1'),
+        ),
+    ]
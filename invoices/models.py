@@ -1,10 +1,15 @@
 from django.db import models
 from django.conf import settings
+from django.core.validators import MinValueValidator
 from django.urls import reverse
 from decimal import Decimal
 from django.utils import timezone
+from datetime import date, timedelta
+import calendar
 
-class Customer(models.Model):
+from audit.snapshot import AuditedModelMixin
+
+class Customer(AuditedModelMixin, models.Model):
     """Customer model for invoicing - separate from clients app to avoid confusion"""
     name = models.CharField(max_length=200)
     email = models.EmailField()
@@ -29,7 +34,7 @@ class Customer(models.Model):
     def get_absolute_url(self):
         return reverse('invoices:customer_detail', kwargs={'pk': self.pk})
 
-class Invoice(models.Model):
+class Invoice(AuditedModelMixin, models.Model):
     STATUS_CHOICES = [
         ('draft', 'Draft'),
         ('sent', 'Sent'),
@@ -62,8 +67,19 @@ class Invoice(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    # Recurring billing (set when generated from a RecurringInvoiceTemplate)
+    recurring_template = models.ForeignKey('RecurringInvoiceTemplate', on_delete=models.SET_NULL,
+                                           null=True, blank=True, related_name='generated_invoices')
+    recurring_period = models.DateField(null=True, blank=True,
+                                        help_text="Billing period start this invoice was generated for")
+
     class Meta:
         ordering = ['-created_at']
+        constraints = [
+            # One invoice per template and billing period keeps generation idempotent
+            models.UniqueConstraint(fields=['recurring_template', 'recurring_period'],
+                                    name='unique_recurring_invoice_period'),
+        ]
 
     def __str__(self):
         return f"Invoice {self.invoice_number} - {self.customer.name}"
@@ -73,8 +89,8 @@ class Invoice(models.Model):
 
     def save(self, *args, **kwargs):
         if not self.invoice_number:
-            # Auto-generate invoice number
-            last_invoice = Invoice.objects.order_by('-id').first()
+            # Auto-generate invoice number (recurring invoices use their own REC- series)
+            last_invoice = Invoice.objects.filter(invoice_number__startswith='INV-').order_by('-id').first()
             if last_invoice:
                 last_number = int(last_invoice.invoice_number.split('-')[-1])
                 self.invoice_number = f"INV-{last_number + 1:04d}"
@@ -101,7 +117,7 @@ class Invoice(models.Model):
             return (timezone.now().date() - self.due_date).days
         return 0
 
-class InvoiceItem(models.Model):
+class InvoiceItem(AuditedModelMixin, models.Model):
     invoice = models.ForeignKey(Invoice, on_delete=models.CASCADE, related_name='items')
     description = models.CharField(max_length=500)
     quantity = models.DecimalField(max_digits=10, decimal_places=2, default=Decimal('1.00'))
@@ -122,7 +138,7 @@ class InvoiceItem(models.Model):
     def __str__(self):
         return f"{self.description} - {self.invoice.invoice_number}"
 
-class Payment(models.Model):
+class Payment(AuditedModelMixin, models.Model):
     PAYMENT_METHODS = [
         ('cash', 'Cash'),
         ('check', 'Check'),
@@ -144,3 +160,101 @@ class Payment(models.Model):
     def __str__(self):
         return f"Payment ${self.amount} for {self.invoice.invoice_number}"
 
+
+
+def add_months(value, months, day=None):
+    """Add calendar months to a date, clamping to the last day of the month"""
+    month_index = value.month - 1 + months
+    year = value.year + month_index // 12
+    month = month_index % 12 + 1
+    day = day or value.day
+    return date(year, month, min(day, calendar.monthrange(year, month)[1]))
+
+class RecurringInvoiceTemplate(AuditedModelMixin, models.Model):
+    """Template used to generate invoices for a customer on a schedule"""
+    FREQUENCY_CHOICES = [
+        ('weekly', 'Weekly'),
+        ('monthly', 'Monthly'),
+        ('quarterly', 'Quarterly'),
+        ('yearly', 'Yearly'),
+    ]
+
+    name = models.CharField(max_length=200)
+    customer = models.ForeignKey(Customer, on_delete=models.CASCADE, related_name='recurring_templates')
+
+    # Schedule
+    frequency = models.CharField(max_length=20, choices=FREQUENCY_CHOICES, default='monthly')
+    interval = models.PositiveIntegerField(default=1, validators=[MinValueValidator(1)],
+                                           help_text="Bill every N periods (e.g. 2 = every other month)")
+    start_date = models.DateField(default=timezone.now)
+    end_date = models.DateField(blank=True, null=True, help_text="Leave blank to bill indefinitely")
+    next_run_date = models.DateField(help_text="Start of the next billing period to generate")
+    last_run_date = models.DateField(blank=True, null=True)
+    days_until_due = models.PositiveIntegerField(default=30)
+
+    # Invoice defaults
+    tax_rate = models.DecimalField(max_digits=5, decimal_places=2, default=Decimal('0.00'))
+    discount_amount = models.DecimalField(max_digits=10, decimal_places=2, default=Decimal('0.00'))
+    notes = models.TextField(blank=True, null=True)
+    terms = models.TextField(blank=True, null=True)
+
+    is_active = models.BooleanField(default=True)
+    created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['name']
+        indexes = [
+            # Due-template lookup: is_active=True AND next_run_date <= today
+            models.Index(fields=['is_active', 'next_run_date']),
+        ]
+        constraints = [
+            # An interval of 0 would never advance the schedule
+            models.CheckConstraint(condition=models.Q(interval__gte=1), name='recurring_template_interval_gte_1'),
+        ]
+
+    def __str__(self):
+        return f"{self.name} - {self.customer.name}"
+
+    def save(self, *args, **kwargs):
+        if not self.next_run_date:
+            self.next_run_date = self.start_date
+        super().save(*args, **kwargs)
+
+    def period_after(self, period_start):
+        """Return the start of the billing period following period_start"""
+        if self.frequency == 'weekly':
+            return period_start + timedelta(weeks=self.interval)
+        months = {'monthly': 1, 'quarterly': 3, 'yearly': 12}[self.frequency] * self.interval
+        # Anchor on the start date's day so Jan 31 -> Feb 28 -> Mar 31
+        return add_months(period_start, months, day=self.start_date.day)
+
+    def due_periods(self, as_of):
+        """Return the billing period starts that are due on or before as_of"""
+        periods = []
+        period = self.next_run_date
+        while period <= as_of and (self.end_date is None or period <= self.end_date):
+            periods.append(period)
+            next_period = self.period_after(period)
+            if next_period <= period:
+                raise ValueError(f"Recurring template {self.pk} does not advance: interval must be at least 1")
+            period = next_period
+        return periods
+
+class RecurringInvoiceTemplateItem(AuditedModelMixin, models.Model):
+    template = models.ForeignKey(RecurringInvoiceTemplate, on_delete=models.CASCADE, related_name='items')
+    description = models.CharField(max_length=500)
+    quantity = models.DecimalField(max_digits=10, decimal_places=2, default=Decimal('1.00'))
+    unit_price = models.DecimalField(max_digits=10, decimal_places=2)
+    order = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ['order']
+
+    @property
+    def total(self):
+        return self.quantity * self.unit_price
+
+    def __str__(self):
+        return f"{self.description} - {self.template.name}"
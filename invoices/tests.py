@@ -1,3 +1,103 @@
+from datetime import date
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
 from django.test import TestCase
+from django.urls import reverse
+
+from bookgium.query_budget import QueryBudgetTestCase
+
+from .models import Customer, Invoice, RecurringInvoiceTemplate, RecurringInvoiceTemplateItem
+from .recurring import generate_recurring_invoices, recurring_invoice_number
+
+# view name: (max queries, max seconds) against the seeded tenant
+BUDGETS = {
+    'invoices_dashboard': (7, 2.0),
+}
+
+
+class InvoiceQueryBudgetTests(QueryBudgetTestCase):
+
+    def test_invoices_dashboard(self):
+        url = reverse('invoices:dashboard')
+        self.get_within_budget('invoices_dashboard', url, *BUDGETS['invoices_dashboard'])
+        self.assertQueriesDoNotScale('invoices_dashboard', url)
+
+
+class RecurringInvoiceTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        user = get_user_model().objects.create_user('recurring', 'recurring@example.invalid', 'password')
+        cls.customer = Customer.objects.create(
+            name='Recurring Customer', email='recurring@example.invalid', created_by=user
+        )
+
+    def template(self, **kwargs):
+        template = RecurringInvoiceTemplate.objects.create(
+            name='Support', customer=self.customer, tax_rate=Decimal('10.00'), **kwargs
+        )
+        RecurringInvoiceTemplateItem.objects.create(
+            template=template, description='Support hours', quantity=Decimal('2.00'), unit_price=Decimal('50.00')
+        )
+        return template
+
+    def test_monthly_periods_keep_the_start_day(self):
+        template = self.template(start_date=date(2025, 1, 31))
+        self.assertEqual(template.due_periods(date(2025, 4, 30)), [
+            date(2025, 1, 31), date(2025, 2, 28), date(2025, 3, 31), date(2025, 4, 30),
+        ])
+
+    def test_weekly_interval_and_end_date(self):
+        template = self.template(frequency='weekly', interval=2, start_date=date(2025, 1, 1),
+                                 end_date=date(2025, 1, 29))
+        self.assertEqual(template.due_periods(date(2025, 12, 31)), [
+            date(2025, 1, 1), date(2025, 1, 15), date(2025, 1, 29),
+        ])
+
+    def test_generate_creates_due_invoices_and_advances_schedule(self):
+        template = self.template(frequency='quarterly', start_date=date(2025, 1, 15), end_date=date(2025, 6, 30))
+        self.assertEqual(generate_recurring_invoices(as_of=date(2025, 5, 1)), (1, 2))
+
+        invoices = Invoice.objects.filter(recurring_template=template).order_by('recurring_period')
+        self.assertEqual([invoice.recurring_period for invoice in invoices], [date(2025, 1, 15), date(2025, 4, 15)])
+        self.assertEqual(invoices[0].total_amount, Decimal('110.00'))
+        self.assertEqual(invoices[0].items.count(), 1)
+
+        template.refresh_from_db()
+        self.assertEqual(template.last_run_date, date(2025, 4, 15))
+        self.assertEqual(template.next_run_date, date(2025, 7, 15))
+        # The next period is past the end date
+        self.assertFalse(template.is_active)
+
+    def test_rerun_is_idempotent(self):
+        template = self.template(start_date=date(2025, 1, 1))
+        self.assertEqual(generate_recurring_invoices(as_of=date(2025, 3, 1)), (1, 3))
+        self.assertEqual(generate_recurring_invoices(as_of=date(2025, 3, 1)), (0, 0))
+        self.assertEqual(Invoice.objects.filter(recurring_template=template).count(), 3)
+
+    def test_rerun_skips_periods_of_an_interrupted_run(self):
+        template = self.template(start_date=date(2025, 1, 1))
+        generate_recurring_invoices(as_of=date(2025, 2, 1))
+        # As if the invoices were written but the schedule was not advanced
+        RecurringInvoiceTemplate.objects.filter(pk=template.pk).update(next_run_date=date(2025, 1, 1))
+
+        self.assertEqual(generate_recurring_invoices(as_of=date(2025, 3, 1)), (1, 1))
+        self.assertEqual(
+            sorted(Invoice.objects.filter(recurring_template=template).values_list('invoice_number', flat=True)),
+            [recurring_invoice_number(template.pk, date(2025, month, 1)) for month in (1, 2, 3)],
+        )
+        template.refresh_from_db()
+        self.assertEqual(template.next_run_date, date(2025, 4, 1))
 
-# Create your tests here.
+    def test_interval_must_be_at_least_one(self):
+        template = self.template(start_date=date(2025, 1, 1))
+        template.interval = 0
+        with self.assertRaises(ValidationError):
+            template.full_clean()
+        with self.assertRaises(ValueError):
+            template.due_periods(date(2025, 3, 1))
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            template.save()
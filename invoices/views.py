@@ -41,7 +41,7 @@ def invoices_dashboard(request):
     # Recent invoices
     recent_invoices = Invoice.objects.filter(
         created_by=request.user
-    ).order_by('-created_at')[:5]
+    ).select_related('customer').order_by('-created_at')[:5]
 
     # Monthly revenue data for chart
     from django.db.models.functions import TruncMonth
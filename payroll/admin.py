@@ -1,5 +1,8 @@
 from django.contrib import admin
-from .models import Employee, PayrollPeriod, PayrollEntry, PayrollDeduction
+from .models import (
+    Employee, PayrollPeriod, PayrollEntry, PayrollDeduction, PayrollYTD, TaxTable, TaxBracket,
+    PayrollAccountMapping
+)
 
 @admin.register(Employee)
 class EmployeeAdmin(admin.ModelAdmin):
@@ -20,7 +23,7 @@ class EmployeeAdmin(admin.ModelAdmin):
             'fields': ('base_salary', 'hourly_rate', 'pay_frequency')
         }),
         ('Tax Information', {
-            'fields': ('tax_id', 'tax_exemptions')
+            'fields': ('tax_id', 'tax_exemptions', 'tax_state')
         }),
     )
     
@@ -28,12 +31,12 @@ class EmployeeAdmin(admin.ModelAdmin):
 
 @admin.register(PayrollPeriod)
 class PayrollPeriodAdmin(admin.ModelAdmin):
-    list_display = ['name', 'period_type', 'start_date', 'end_date', 'pay_date', 'status']
+    list_display = ['name', 'period_type', 'start_date', 'end_date', 'pay_date', 'status', 'ytd_posted']
     list_filter = ['period_type', 'status', 'start_date']
     search_fields = ['name']
     ordering = ['-start_date']
     
-    readonly_fields = ['created_at', 'updated_at']
+    readonly_fields = ['ytd_posted', 'created_at', 'updated_at']
 
 @admin.register(PayrollEntry)
 class PayrollEntryAdmin(admin.ModelAdmin):
@@ -67,3 +70,35 @@ class PayrollDeductionAdmin(admin.ModelAdmin):
     list_filter = ['deduction_type', 'is_percentage', 'is_active']
     search_fields = ['name', 'description']
     ordering = ['deduction_type', 'name']
+
+class TaxBracketInline(admin.TabularInline):
+    model = TaxBracket
+    extra = 1
+    ordering = ['lower_bound']
+
+@admin.register(TaxTable)
+class TaxTableAdmin(admin.ModelAdmin):
+    list_display = ['name', 'tax_field', 'jurisdiction', 'pay_frequency', 'version', 'effective_date', 'is_active']
+    list_filter = ['tax_field', 'jurisdiction', 'pay_frequency', 'is_active']
+    search_fields = ['name', 'jurisdiction']
+    ordering = ['tax_field', 'jurisdiction', 'pay_frequency', '-effective_date', '-version']
+    inlines = [TaxBracketInline]
+    
+    readonly_fields = ['created_at', 'updated_at']
+
+@admin.register(PayrollYTD)
+class PayrollYTDAdmin(admin.ModelAdmin):
+    list_display = ['employee', 'year', 'gross_pay', 'social_security', 'retirement_401k', 'net_pay', 'period_count']
+    list_filter = ['year']
+    search_fields = ['employee__first_name', 'employee__last_name', 'employee__employee_id']
+    ordering = ['-year', 'employee__last_name']
+    
+    readonly_fields = ['updated_at']
+
+@admin.register(PayrollAccountMapping)
+class PayrollAccountMappingAdmin(admin.ModelAdmin):
+    list_display = ['role', 'department', 'account', 'updated_at']
+    list_filter = ['role']
+    search_fields = ['department', 'account__code', 'account__name']
+    autocomplete_fields = ['account']
+    readonly_fields = ['created_at', 'updated_at']
@@ -10,7 +10,7 @@ class EmployeeForm(forms.ModelForm):
             'employee_id', 'first_name', 'last_name', 'email', 'phone',
             'address', 'date_of_birth', 'hire_date', 'position', 'department', 
             'employment_type', 'employment_status', 'base_salary', 'hourly_rate',
-            'pay_frequency', 'tax_id', 'tax_exemptions'
+            'pay_frequency', 'tax_id', 'tax_exemptions', 'tax_state'
         ]
         
         widgets = {
@@ -31,6 +31,7 @@ class EmployeeForm(forms.ModelForm):
             'hourly_rate': forms.NumberInput(attrs={'class': 'form-control', 'step': '0.01'}),
             'tax_id': forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'SSN or Tax ID'}),
             'tax_exemptions': forms.NumberInput(attrs={'class': 'form-control', 'min': '0'}),
+            'tax_state': forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'e.g. CA'}),
         }
     
     def clean(self):
@@ -0,0 +1,100 @@
+import time
+from datetime import date
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from payroll.models import Employee, PayrollPeriod, PayrollEntry
+from payroll.services import default_regular_hours, default_regular_pay, run_payroll
+
+
+class Command(BaseCommand):
+    help = ('Benchmark the batch payroll run against the per-employee loop. '
+            'Runs against synthetic employees inside a transaction that is rolled back.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--employees',
+            type=int,
+            default=5000,
+            help='Number of synthetic employees to create'
+        )
+        parser.add_argument(
+            '--skip-legacy',
+            action='store_true',
+            help='Only time the batch run'
+        )
+
+    def handle(self, *args, **options):
+        count = options['employees']
+        if count < 1:
+            raise CommandError('--employees must be at least 1')
+
+        with transaction.atomic():
+            self.create_employees(count)
+
+            if not options['skip_legacy']:
+                period = self.create_period('legacy', date(2099, 1, 1))
+                self.report('Per-employee loop', lambda: self.legacy_run(period))
+
+            period = self.create_period('batch', date(2099, 2, 1))
+            self.report('Batch run', lambda: run_payroll(period))
+
+            transaction.set_rollback(True)
+
+    def create_employees(self, count):
+        Employee.objects.bulk_create(
+            [
+                Employee(
+                    employee_id=f'BENCH-{i:07d}',
+                    first_name='Bench',
+                    last_name=f'Employee {i}',
+                    email=f'bench{i}@example.invalid',
+                    hire_date=date(2020, 1, 1),
+                    position='Benchmark',
+                    employment_type='full_time' if i % 4 else 'part_time',
+                    base_salary=Decimal(3000 + (i % 500) * 13) if i % 4 else Decimal('0'),
+                    hourly_rate=None if i % 4 else Decimal('22.50'),
+                )
+                for i in range(count)
+            ],
+            batch_size=1000,
+        )
+
+    def create_period(self, name, start):
+        return PayrollPeriod.objects.create(
+            name=f'Benchmark {name}',
+            period_type='monthly',
+            start_date=start,
+            end_date=start.replace(day=28),
+            pay_date=start.replace(day=28),
+        )
+
+    def legacy_run(self, period):
+        """The original process_payroll loop, kept here for comparison"""
+        created_count = 0
+        for employee in Employee.objects.filter(employment_status='active'):
+            entry, created = PayrollEntry.objects.get_or_create(
+                employee=employee,
+                payroll_period=period,
+                defaults={
+                    'regular_hours': default_regular_hours(employee),
+                    'regular_pay': default_regular_pay(employee),
+                }
+            )
+            if created:
+                entry.calculate_taxes()
+                created_count += 1
+        return created_count
+
+    def report(self, label, func):
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            created = func()
+            elapsed = time.perf_counter() - start
+        self.stdout.write(
+            f'{label}: {created} entries in {elapsed:.3f}s '
+            f'({len(queries.captured_queries)} queries)'
+        )
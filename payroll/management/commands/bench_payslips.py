@@ -0,0 +1,103 @@
+import os
+import tempfile
+import time
+from datetime import date
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+
+from payroll.models import EARNING_FIELDS, WITHHOLDING_FIELDS
+from payroll.payslips import DEFAULT_CHUNK_SIZE, write_payslip_archive
+
+
+class Command(BaseCommand):
+    help = ('Benchmark payslip rendering throughput for increasing worker counts. '
+            'Uses synthetic rows, so no database access is needed.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--payslips',
+            type=int,
+            default=5000,
+            help='Number of synthetic payslips to render'
+        )
+        parser.add_argument(
+            '--workers',
+            type=str,
+            help='Comma-separated worker counts to try. Defaults to 1, 2, 4, ... up to the CPU count.'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=DEFAULT_CHUNK_SIZE,
+            help='Number of payslips sent to a worker at a time'
+        )
+
+    def handle(self, *args, **options):
+        count = options['payslips']
+        if count < 1:
+            raise CommandError('--payslips must be at least 1')
+
+        if options['workers']:
+            try:
+                worker_counts = [int(value) for value in options['workers'].split(',')]
+            except ValueError:
+                raise CommandError('--workers must be a comma-separated list of integers')
+        else:
+            cpus = os.cpu_count() or 1
+            worker_counts = [1]
+            while worker_counts[-1] * 2 <= cpus:
+                worker_counts.append(worker_counts[-1] * 2)
+            if worker_counts[-1] != cpus:
+                worker_counts.append(cpus)
+
+        header, rows = self.synthetic_rows(count)
+        baseline = None
+        with tempfile.TemporaryDirectory() as directory:
+            for workers in worker_counts:
+                path = os.path.join(directory, f'payslips_{workers}.zip')
+                start = time.perf_counter()
+                written = write_payslip_archive(header, rows, path, workers=workers,
+                                                chunk_size=options['chunk_size'])
+                elapsed = time.perf_counter() - start
+                throughput = written / elapsed
+                baseline = baseline or throughput
+                self.stdout.write(
+                    f'{workers:>3} worker(s): {written} payslips in {elapsed:.2f}s '
+                    f'({throughput:.0f}/s, {throughput / baseline:.2f}x, '
+                    f'{os.path.getsize(path) / 1024 / 1024:.1f} MiB)'
+                )
+
+    def synthetic_rows(self, count):
+        header = {
+            'organization_name': 'Benchmark Corporation',
+            'period_name': 'Benchmark Period',
+            'start_date': date(2099, 1, 1),
+            'end_date': date(2099, 1, 31),
+            'pay_date': date(2099, 1, 31),
+            'ytd_year': 2099,
+        }
+        rows = []
+        for i in range(count):
+            gross = Decimal(3000 + (i % 500) * 13)
+            row = {
+                'employee_id': i,
+                'employee_code': f'BENCH-{i:07d}',
+                'first_name': 'Bench',
+                'last_name': f'Employee {i}',
+                'department': ['Sales', 'Engineering', 'Operations'][i % 3],
+                'position': 'Benchmark',
+                'regular_hours': Decimal('40.00'),
+                'overtime_hours': Decimal('0.00'),
+            }
+            row.update({field_name: Decimal('0.00') for field_name in EARNING_FIELDS})
+            row.update({field_name: Decimal('0.00') for field_name in WITHHOLDING_FIELDS})
+            row['regular_pay'] = gross
+            row['federal_tax'] = (gross * Decimal('0.12')).quantize(Decimal('0.01'))
+            row['social_security'] = (gross * Decimal('0.062')).quantize(Decimal('0.01'))
+            row['medicare'] = (gross * Decimal('0.0145')).quantize(Decimal('0.01'))
+            row['ytd_gross'] = gross
+            row['ytd_deductions'] = sum(row[field_name] for field_name in WITHHOLDING_FIELDS)
+            row['ytd_net'] = gross - row['ytd_deductions']
+            rows.append(row)
+        return header, rows
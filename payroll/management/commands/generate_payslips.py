@@ -0,0 +1,59 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from payroll.models import PayrollPeriod
+from payroll.payslips import DEFAULT_CHUNK_SIZE, generate_payslips
+
+
+class Command(BaseCommand):
+    help = 'Render a PDF payslip for every entry in a payroll period into a zip archive'
+
+    def add_arguments(self, parser):
+        parser.add_argument('period_id', type=int, help='Payroll period to render')
+        parser.add_argument(
+            '--output',
+            type=str,
+            help='Path of the zip archive. Defaults to payslips_<period_id>.zip'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=os.cpu_count() or 1,
+            help='Number of worker processes (defaults to the number of CPUs)'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=DEFAULT_CHUNK_SIZE,
+            help='Number of payslips sent to a worker at a time'
+        )
+        parser.add_argument(
+            '--font',
+            type=str,
+            help='Optional TrueType font file to render payslips with'
+        )
+
+    def handle(self, *args, **options):
+        try:
+            period = PayrollPeriod.objects.get(pk=options['period_id'])
+        except PayrollPeriod.DoesNotExist:
+            raise CommandError(f"Payroll period {options['period_id']} does not exist")
+
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size must be at least 1')
+
+        try:
+            import reportlab  # noqa: F401
+        except ImportError:
+            raise CommandError('Payslip generation requires reportlab. Please install it: pip install reportlab')
+
+        output = options['output'] or f'payslips_{period.pk}.zip'
+        count = generate_payslips(
+            period,
+            output,
+            workers=options['workers'],
+            chunk_size=options['chunk_size'],
+            font_path=options['font'],
+        )
+        self.stdout.write(self.style.SUCCESS(f'Wrote {count} payslips for {period.name} to {output}'))
@@ -0,0 +1,54 @@
+# Generated by Django 5.2.6 on 2026-10-18 22:40
+
+import django.core.validators
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payroll', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='employee',
+            name='tax_state',
+            field=models.CharField(blank=True, default='', help_text='State/jurisdiction code used to pick the state withholding table', max_length=10),
+        ),
+        migrations.CreateModel(
+            name='TaxTable',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('tax_field', models.CharField(choices=[('federal_tax', 'Federal Tax'), ('state_tax', 'State Tax')], help_text='Payroll entry field this table withholds into', max_length=20)),
+                ('jurisdiction', models.CharField(help_text="'FED' for federal tables, otherwise a state code", max_length=10)),
+                ('pay_frequency', models.CharField(choices=[('weekly', 'Weekly'), ('bi_weekly', 'Bi-Weekly'), ('monthly', 'Monthly'), ('quarterly', 'Quarterly')], max_length=20)),
+                ('version', models.PositiveIntegerField(default=1)),
+                ('effective_date', models.DateField()),
+                ('exemption_allowance', models.DecimalField(decimal_places=2, default=0, help_text='Taxable pay reduction per exemption claimed, per pay period', max_digits=15, validators=[django.core.validators.MinValueValidator(0)])),
+                ('is_active', models.BooleanField(default=True)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['tax_field', 'jurisdiction', 'pay_frequency', '-effective_date', '-version'],
+                'unique_together': {('tax_field', 'jurisdiction', 'pay_frequency', 'effective_date', 'version')},
+            },
+        ),
+        migrations.CreateModel(
+            name='TaxBracket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('lower_bound', models.DecimalField(decimal_places=2, help_text='Taxable pay per period above which this rate applies', max_digits=15, validators=[django.core.validators.MinValueValidator(0)])),
+                ('rate', models.DecimalField(decimal_places=6, help_text='Marginal rate as a fraction, e.g. 0.220000 for 22%', max_digits=7, validators=[django.core.validators.MinValueValidator(0), django.core.validators.MaxValueValidator(1)])),
+                ('table', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='brackets', to='payroll.taxtable')),
+            ],
+            options={
+                'ordering': ['table', 'lower_bound'],
+                'unique_together': {('table', 'lower_bound')},
+            },
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.6 on 2026-10-18 22:41
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payroll', '0003_tax_tables'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='payrollperiod',
+            name='ytd_posted',
+            field=models.BooleanField(default=False, editable=False, help_text="Whether this period's entries are included in the YTD totals"),
+        ),
+        migrations.CreateModel(
+            name='PayrollYTD',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('year', models.PositiveIntegerField()),
+                ('gross_pay', models.DecimalField(decimal_places=2, default=0, max_digits=15)),
+                ('federal_tax', models.DecimalField(decimal_places=2, default=0, max_digits=15)),
+                ('state_tax', models.DecimalField(decimal_places=2, default=0, max_digits=15)),
+                ('social_security', models.DecimalField(decimal_places=2, default=0, max_digits=15)),
+                ('medicare', models.DecimalField(decimal_places=2, default=0, max_digits=15)),
+                ('health_insurance', models.DecimalField(decimal_places=2, default=0, max_digits=15)),
+                ('retirement_401k', models.DecimalField(decimal_places=2, default=0, max_digits=15)),
+                ('other_deductions', models.DecimalField(decimal_places=2, default=0, max_digits=15)),
+                ('net_pay', models.DecimalField(decimal_places=2, default=0, max_digits=15)),
+                ('period_count', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('employee', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ytd_totals', to='payroll.employee')),
+            ],
+            options={
+                'verbose_name': 'Payroll YTD',
+                'verbose_name_plural': 'Payroll YTD',
+                'ordering': ['-year', 'employee__last_name'],
+                'unique_together': {('employee', 'year')},
+            },
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.6 on 2026-10-18 22:45
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0002_initial'),
+        ('payroll', '0004_payroll_ytd'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PayrollAccountMapping',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('role', models.CharField(choices=[('salary_expense', 'Salary Expense'), ('net_pay', 'Net Pay'), ('federal_tax', 'Federal Tax Payable'), ('state_tax', 'State Tax Payable'), ('social_security', 'Social Security Payable'), ('medicare', 'Medicare Payable'), ('health_insurance', 'Health Insurance Payable'), ('retirement_401k', '401(k) Payable'), ('other_deductions', 'Other Deductions Payable')], max_length=30)),
+                ('department', models.CharField(blank=True, default='', help_text='Leave blank for the default account', max_length=100)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('account', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='payroll_mappings', to='accounts.account')),
+            ],
+            options={
+                'ordering': ['role', 'department'],
+                'unique_together': {('role', 'department')},
+            },
+        ),
+    ]
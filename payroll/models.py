@@ -1,4 +1,6 @@
 from django.db import models
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Sum, Value
+from django.db.models.functions import Coalesce
 from django.urls import reverse
 from django.utils import timezone
 from django.core.validators import MinValueValidator, MaxValueValidator
@@ -6,6 +8,19 @@ from decimal import Decimal
 import uuid
 from datetime import date
 
+# Flat withholding rates applied to gross pay. Federal and state rates are
+# only used when no TaxTable covers the employee.
+FLAT_TAX_RATES = {
+    'social_security': Decimal('0.062'),  # 6.2%
+    'medicare': Decimal('0.0145'),  # 1.45%
+    'federal_tax': Decimal('0.12'),  # 12% bracket (simplified)
+    'state_tax': Decimal('0.05'),  # 5% (simplified - varies by state)
+}
+
+# Annual limits enforced against the year-to-date accumulators
+SOCIAL_SECURITY_WAGE_BASE = Decimal('168600.00')
+RETIREMENT_401K_LIMIT = Decimal('23000.00')
+
 class Employee(models.Model):
     EMPLOYMENT_STATUS_CHOICES = [
         ('active', 'Active'),
@@ -53,6 +68,8 @@ class Employee(models.Model):
     # Tax Information
     tax_id = models.CharField(max_length=20, blank=True, null=True, help_text="Social Security Number or Tax ID")
     tax_exemptions = models.IntegerField(default=0, validators=[MinValueValidator(0)])
+    tax_state = models.CharField(max_length=10, blank=True, default='',
+                                 help_text="State/jurisdiction code used to pick the state withholding table")
     
     # Metadata
     created_by = models.ForeignKey('users.CustomUser', on_delete=models.SET_NULL, null=True, blank=True)
@@ -76,6 +93,94 @@ class Employee(models.Model):
     def get_absolute_url(self):
         return reverse('payroll:employee_detail', kwargs={'pk': self.pk})
 
+# PayrollEntry amount fields that make up gross pay and total deductions
+EARNING_FIELDS = ['regular_pay', 'overtime_pay', 'bonus', 'commission']
+WITHHOLDING_FIELDS = ['federal_tax', 'state_tax', 'social_security', 'medicare',
+                      'health_insurance', 'retirement_401k', 'other_deductions']
+YTD_SOURCE_FIELDS = ['employee_id', 'payroll_period_id', *EARNING_FIELDS, *WITHHOLDING_FIELDS]
+
+def ytd_amounts(values, count=1):
+    """
+    {PayrollYTD field: amount} that one entry with the given field values
+    contributes to its employee's year-to-date totals
+    """
+    gross = sum(values[field_name] for field_name in EARNING_FIELDS)
+    amounts = {field_name: values[field_name] for field_name in WITHHOLDING_FIELDS}
+    amounts['gross_pay'] = gross
+    amounts['net_pay'] = gross - sum(values[field_name] for field_name in WITHHOLDING_FIELDS)
+    amounts['period_count'] = count
+    return amounts
+
+def _money(expression):
+    return ExpressionWrapper(expression, output_field=DecimalField(max_digits=15, decimal_places=2))
+
+def _sum_of_fields(field_names, prefix=''):
+    expression = F(prefix + field_names[0])
+    for field_name in field_names[1:]:
+        expression = expression + F(prefix + field_name)
+    return _money(expression)
+
+def gross_pay_expression(prefix=''):
+    return _sum_of_fields(EARNING_FIELDS, prefix)
+
+def deductions_expression(prefix=''):
+    return _sum_of_fields(WITHHOLDING_FIELDS, prefix)
+
+def net_pay_expression(prefix=''):
+    return _money(gross_pay_expression(prefix) - deductions_expression(prefix))
+
+def _total(expression):
+    return Coalesce(Sum(expression), Value(Decimal('0.00')), output_field=DecimalField(max_digits=15, decimal_places=2))
+
+class PayrollEntryQuerySet(models.QuerySet):
+    def with_amounts(self):
+        """Annotate gross_amount, deductions_amount and net_amount computed in SQL"""
+        return self.annotate(
+            gross_amount=gross_pay_expression(),
+            deductions_amount=deductions_expression(),
+            net_amount=net_pay_expression(),
+        )
+    
+    def totals(self):
+        """Gross, deductions, net and entry count for the queryset in one query"""
+        return self.order_by().aggregate(
+            total_gross=_total(gross_pay_expression()),
+            total_deductions=_total(deductions_expression()),
+            total_net=_total(net_pay_expression()),
+            employee_count=Count('id'),
+        )
+    
+    def totals_by_period(self):
+        """{payroll_period_id: totals} for every period in the queryset, in one query"""
+        rows = self.order_by().values('payroll_period_id').annotate(
+            total_gross=_total(gross_pay_expression()),
+            total_deductions=_total(deductions_expression()),
+            total_net=_total(net_pay_expression()),
+            employee_count=Count('id'),
+        )
+        return {row.pop('payroll_period_id'): row for row in rows}
+    
+    def totals_by_employee(self):
+        """{employee_id: totals} with gross, net, each withholding field and the entry count, in one query"""
+        rows = self.order_by().values('employee_id').annotate(
+            total_gross=_total(gross_pay_expression()),
+            total_net=_total(net_pay_expression()),
+            entry_count=Count('id'),
+            **{f'total_{field_name}': _total(F(field_name)) for field_name in WITHHOLDING_FIELDS},
+        )
+        return {row.pop('employee_id'): row for row in rows}
+
+class PayrollPeriodQuerySet(models.QuerySet):
+    def with_totals(self):
+        """Annotate gross_total, deductions_total, net_total and entry_count from the period's entries"""
+        prefix = 'payroll_entries__'
+        return self.annotate(
+            gross_total=_total(gross_pay_expression(prefix)),
+            deductions_total=_total(deductions_expression(prefix)),
+            net_total=_total(net_pay_expression(prefix)),
+            entry_count=Count('payroll_entries'),
+        )
+
 class PayrollPeriod(models.Model):
     PERIOD_TYPE_CHOICES = [
         ('weekly', 'Weekly'),
@@ -98,12 +203,19 @@ class PayrollPeriod(models.Model):
     end_date = models.DateField()
     pay_date = models.DateField(help_text="Date when employees will be paid")
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='draft')
+    ytd_posted = models.BooleanField(default=False, editable=False,
+                                     help_text="Whether this period's entries are included in the YTD totals")
     
     # Metadata
     created_by = models.ForeignKey('users.CustomUser', on_delete=models.SET_NULL, null=True, blank=True)
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(auto_now=True)
     
+    # Statuses at which a period's entries count towards year-to-date totals
+    YTD_STATUSES = ('approved', 'paid')
+    
+    objects = PayrollPeriodQuerySet.as_manager()
+    
     class Meta:
         ordering = ['-start_date']
         unique_together = ['period_type', 'start_date', 'end_date']
@@ -111,6 +223,16 @@ class PayrollPeriod(models.Model):
     def __str__(self):
         return f"{self.name} ({self.start_date} to {self.end_date})"
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.remember_ytd_state()
+        return instance
+    
+    def remember_ytd_state(self):
+        """Note the status and pay date the YTD totals reflect, so a save can apply just the change"""
+        self._ytd_state = (self.__dict__.get('status'), self.__dict__.get('pay_date'))
+    
     @property
     def is_current(self):
         today = date.today()
@@ -118,11 +240,15 @@ class PayrollPeriod(models.Model):
     
     @property
     def total_gross_pay(self):
-        return sum(entry.gross_pay for entry in self.payroll_entries.all())
+        if hasattr(self, 'gross_total'):
+            return self.gross_total
+        return self.payroll_entries.all().totals()['total_gross']
     
     @property
     def total_net_pay(self):
-        return sum(entry.net_pay for entry in self.payroll_entries.all())
+        if hasattr(self, 'net_total'):
+            return self.net_total
+        return self.payroll_entries.all().totals()['total_net']
     
     def get_absolute_url(self):
         return reverse('payroll:period_detail', kwargs={'pk': self.pk})
@@ -160,6 +286,8 @@ class PayrollEntry(models.Model):
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = PayrollEntryQuerySet.as_manager()
+    
     class Meta:
         ordering = ['-payroll_period__start_date', 'employee__last_name']
         unique_together = ['employee', 'payroll_period']
@@ -167,6 +295,20 @@ class PayrollEntry(models.Model):
     def __str__(self):
         return f"{self.employee.full_name} - {self.payroll_period.name}"
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.remember_ytd_amounts()
+        return instance
+    
+    def remember_ytd_amounts(self):
+        """Note what this entry adds to the YTD totals, so a save can apply just the difference"""
+        loaded = self.__dict__
+        if all(field_name in loaded for field_name in YTD_SOURCE_FIELDS):
+            self._ytd_amounts = (self.employee_id, self.payroll_period_id, ytd_amounts(loaded))
+        else:
+            self._ytd_amounts = None
+    
     @property
     def gross_pay(self):
         """Calculate total gross pay"""
@@ -185,24 +327,56 @@ class PayrollEntry(models.Model):
         return self.gross_pay - self.total_deductions
     
     def calculate_taxes(self):
-        """Calculate tax deductions based on gross pay"""
-        gross = self.gross_pay
-        
-        # Simple tax calculations (you can make these more sophisticated)
-        self.social_security = gross * Decimal('0.062')  # 6.2%
-        self.medicare = gross * Decimal('0.0145')  # 1.45%
-        
-        # Federal tax (simplified - should be based on tax brackets)
-        self.federal_tax = gross * Decimal('0.12')  # 12% bracket
+        """Calculate tax deductions based on gross pay and the withholding tables"""
+        from .services import calculate_entry_taxes
         
-        # State tax (simplified - varies by state)
-        self.state_tax = gross * Decimal('0.05')  # 5%
+        taxes = calculate_entry_taxes(self.employee, self.gross_pay, self.payroll_period.pay_date)
+        for field_name, amount in taxes.items():
+            setattr(self, field_name, amount)
         
         self.save()
     
     def get_absolute_url(self):
         return reverse('payroll:entry_detail', kwargs={'pk': self.pk})
 
+class PayrollYTD(models.Model):
+    """
+    Year-to-date totals per employee and calendar year (by pay date), summed
+    from the entries of approved and paid periods. Kept current by applying
+    each change to those periods and entries (see payroll.signals).
+    """
+    employee = models.ForeignKey(Employee, on_delete=models.CASCADE, related_name='ytd_totals')
+    year = models.PositiveIntegerField()
+    
+    gross_pay = models.DecimalField(max_digits=15, decimal_places=2, default=0)
+    federal_tax = models.DecimalField(max_digits=15, decimal_places=2, default=0)
+    state_tax = models.DecimalField(max_digits=15, decimal_places=2, default=0)
+    social_security = models.DecimalField(max_digits=15, decimal_places=2, default=0)
+    medicare = models.DecimalField(max_digits=15, decimal_places=2, default=0)
+    health_insurance = models.DecimalField(max_digits=15, decimal_places=2, default=0)
+    retirement_401k = models.DecimalField(max_digits=15, decimal_places=2, default=0)
+    other_deductions = models.DecimalField(max_digits=15, decimal_places=2, default=0)
+    net_pay = models.DecimalField(max_digits=15, decimal_places=2, default=0)
+    period_count = models.PositiveIntegerField(default=0)
+    
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    # Entry fields summed into the accumulator
+    AMOUNT_FIELDS = WITHHOLDING_FIELDS
+    
+    class Meta:
+        ordering = ['-year', 'employee__last_name']
+        unique_together = ['employee', 'year']
+        verbose_name = 'Payroll YTD'
+        verbose_name_plural = 'Payroll YTD'
+    
+    def __str__(self):
+        return f"{self.employee.full_name} - {self.year} YTD"
+    
+    @property
+    def total_deductions(self):
+        return sum(getattr(self, field_name) for field_name in self.AMOUNT_FIELDS)
+
 class PayrollDeduction(models.Model):
     DEDUCTION_TYPE_CHOICES = [
         ('tax', 'Tax'),
@@ -231,3 +405,89 @@ class PayrollDeduction(models.Model):
     
     class Meta:
         ordering = ['deduction_type', 'name']
+
+
+class TaxTable(models.Model):
+    """
+    Versioned withholding bracket table for one jurisdiction and pay frequency.
+    The table effective on a period's pay date with the highest version wins.
+    """
+    TAX_FIELD_CHOICES = [
+        ('federal_tax', 'Federal Tax'),
+        ('state_tax', 'State Tax'),
+    ]
+    
+    FEDERAL_JURISDICTION = 'FED'
+    
+    name = models.CharField(max_length=100)
+    tax_field = models.CharField(max_length=20, choices=TAX_FIELD_CHOICES,
+                                 help_text="Payroll entry field this table withholds into")
+    jurisdiction = models.CharField(max_length=10, help_text="'FED' for federal tables, otherwise a state code")
+    pay_frequency = models.CharField(max_length=20, choices=Employee.PAY_FREQUENCY_CHOICES)
+    version = models.PositiveIntegerField(default=1)
+    effective_date = models.DateField()
+    exemption_allowance = models.DecimalField(max_digits=15, decimal_places=2, default=0,
+                                              validators=[MinValueValidator(0)],
+                                              help_text="Taxable pay reduction per exemption claimed, per pay period")
+    is_active = models.BooleanField(default=True)
+    
+    # Metadata
+    created_at = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        ordering = ['tax_field', 'jurisdiction', 'pay_frequency', '-effective_date', '-version']
+        unique_together = ['tax_field', 'jurisdiction', 'pay_frequency', 'effective_date', 'version']
+    
+    def __str__(self):
+        return f"{self.name} v{self.version} ({self.jurisdiction}, {self.get_pay_frequency_display()})"
+
+class TaxBracket(models.Model):
+    """Marginal rate applied to taxable pay above lower_bound"""
+    table = models.ForeignKey(TaxTable, on_delete=models.CASCADE, related_name='brackets')
+    lower_bound = models.DecimalField(max_digits=15, decimal_places=2, validators=[MinValueValidator(0)],
+                                      help_text="Taxable pay per period above which this rate applies")
+    rate = models.DecimalField(max_digits=7, decimal_places=6,
+                               validators=[MinValueValidator(0), MaxValueValidator(1)],
+                               help_text="Marginal rate as a fraction, e.g. 0.220000 for 22%")
+    
+    class Meta:
+        ordering = ['table', 'lower_bound']
+        unique_together = ['table', 'lower_bound']
+    
+    def __str__(self):
+        return f"{self.table.name}: over {self.lower_bound} at {self.rate * 100}%"
+
+class PayrollAccountMapping(models.Model):
+    """
+    General ledger account used when posting payroll. A mapping with a blank
+    department is the default for that role; department-specific rows take
+    precedence for employees in that department.
+    """
+    ROLE_CHOICES = [
+        ('salary_expense', 'Salary Expense'),
+        ('net_pay', 'Net Pay'),
+        ('federal_tax', 'Federal Tax Payable'),
+        ('state_tax', 'State Tax Payable'),
+        ('social_security', 'Social Security Payable'),
+        ('medicare', 'Medicare Payable'),
+        ('health_insurance', 'Health Insurance Payable'),
+        ('retirement_401k', '401(k) Payable'),
+        ('other_deductions', 'Other Deductions Payable'),
+    ]
+    
+    role = models.CharField(max_length=30, choices=ROLE_CHOICES)
+    department = models.CharField(max_length=100, blank=True, default='',
+                                  help_text="Leave blank for the default account")
+    account = models.ForeignKey('accounts.Account', on_delete=models.PROTECT, related_name='payroll_mappings')
+    
+    # Metadata
+    created_at = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        ordering = ['role', 'department']
+        unique_together = ['role', 'department']
+    
+    def __str__(self):
+        return f"{self.get_role_display()} ({self.department or 'default'}): {self.account}"
@@ -0,0 +1,280 @@
+"""
+Payslip PDFs for a payroll period.
+
+The period's entries are read once as plain rows (one query for the
+entries joined to their employees and one for year-to-date totals), so the
+rendering itself never touches the database and can be handed to a process
+pool. Each worker builds its styles, and registers the optional TrueType
+font, once in its initializer and reuses them for every payslip it renders.
+Rows are sent to the workers in chunks, with at most two chunks per
+worker submitted and not yet written, and finished PDFs are written into a
+zip archive on disk as each chunk comes back. The rows themselves (a small
+dict per entry) are held for the whole period, but the rendered PDFs are
+bounded by the chunk size times the number of chunks in flight rather than
+by the size of the period.
+
+ReportLab is an optional dependency, as it is for the account statement
+export.
+"""
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from decimal import Decimal
+import io
+import re
+import zipfile
+from xml.sax.saxutils import escape
+
+from django.db import connections
+from django.db.models import F
+
+from .models import EARNING_FIELDS, WITHHOLDING_FIELDS, PayrollEntry
+from .services import load_ytd
+
+DEFAULT_CHUNK_SIZE = 100
+
+# Below this many payslips a process pool costs more than it saves
+PARALLEL_THRESHOLD = 200
+
+# Chunks submitted to the pool and not yet written, per worker
+CHUNKS_IN_FLIGHT_PER_WORKER = 2
+
+EARNING_LABELS = {
+    'regular_pay': 'Regular Pay',
+    'overtime_pay': 'Overtime Pay',
+    'bonus': 'Bonus',
+    'commission': 'Commission',
+}
+
+WITHHOLDING_LABELS = {
+    'federal_tax': 'Federal Tax',
+    'state_tax': 'State Tax',
+    'social_security': 'Social Security',
+    'medicare': 'Medicare',
+    'health_insurance': 'Health Insurance',
+    'retirement_401k': '401(k)',
+    'other_deductions': 'Other Deductions',
+}
+
+# Per-process rendering resources, built once by init_worker()
+_resources = None
+
+
+def payslip_filename(row):
+    """Archive member name for a payslip row"""
+    name = re.sub(r'[^A-Za-z0-9]+', '_', f"{row['last_name']}_{row['first_name']}").strip('_')
+    return f"{row['employee_code']}_{name}.pdf"
+
+
+def payslip_rows(period):
+    """
+    Everything needed to render the period's payslips, as picklable dicts.
+    Returns (header, rows).
+    """
+    from settings.cache import get_organization_name
+
+    header = {
+        'organization_name': get_organization_name(default=''),
+        'period_name': period.name,
+        'start_date': period.start_date,
+        'end_date': period.end_date,
+        'pay_date': period.pay_date,
+        'ytd_year': period.pay_date.year,
+    }
+
+    entries = PayrollEntry.objects.filter(payroll_period=period).order_by(
+        'employee__last_name', 'employee__first_name'
+    ).values(
+        'employee_id', 'regular_hours', 'overtime_hours', *EARNING_FIELDS, *WITHHOLDING_FIELDS,
+        employee_code=F('employee__employee_id'),
+        first_name=F('employee__first_name'),
+        last_name=F('employee__last_name'),
+        department=F('employee__department'),
+        position=F('employee__position'),
+    )
+    ytd = load_ytd(period.pay_date.year, employee_ids=PayrollEntry.objects.filter(
+        payroll_period=period).values('employee_id'))
+
+    rows = []
+    for row in entries:
+        accumulator = ytd.get(row['employee_id'])
+        row['ytd_gross'] = accumulator.gross_pay if accumulator else Decimal('0')
+        row['ytd_deductions'] = accumulator.total_deductions if accumulator else Decimal('0')
+        row['ytd_net'] = accumulator.net_pay if accumulator else Decimal('0')
+        rows.append(row)
+    return header, rows
+
+
+def init_worker(font_path=None):
+    """Load fonts and build paragraph and table styles once per process"""
+    global _resources
+    from reportlab.lib import colors
+    from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+    from reportlab.platypus import TableStyle
+
+    font, bold = 'Helvetica', 'Helvetica-Bold'
+    if font_path:
+        from reportlab.pdfbase import pdfmetrics
+        from reportlab.pdfbase.ttfonts import TTFont
+        pdfmetrics.registerFont(TTFont('PayslipFont', font_path))
+        font = bold = 'PayslipFont'
+
+    sample = getSampleStyleSheet()
+    _resources = {
+        'title': ParagraphStyle('PayslipTitle', parent=sample['Title'], fontName=bold, fontSize=16),
+        'heading': ParagraphStyle('PayslipHeading', parent=sample['Heading2'], fontName=bold, fontSize=11),
+        'info_style': TableStyle([
+            ('FONTNAME', (0, 0), (-1, -1), font),
+            ('FONTNAME', (0, 0), (0, -1), bold),
+            ('FONTNAME', (2, 0), (2, -1), bold),
+            ('FONTSIZE', (0, 0), (-1, -1), 9),
+            ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+        ]),
+        'amount_style': TableStyle([
+            ('FONTNAME', (0, 0), (-1, -1), font),
+            ('FONTNAME', (0, 0), (-1, 0), bold),
+            ('FONTNAME', (0, -1), (-1, -1), bold),
+            ('FONTSIZE', (0, 0), (-1, -1), 9),
+            ('BACKGROUND', (0, 0), (-1, 0), colors.lightgrey),
+            ('ALIGN', (1, 0), (-1, -1), 'RIGHT'),
+            ('LINEABOVE', (0, -1), (-1, -1), 0.75, colors.black),
+            ('GRID', (0, 0), (-1, -2), 0.25, colors.grey),
+        ]),
+        'summary_style': TableStyle([
+            ('FONTNAME', (0, 0), (-1, -1), bold),
+            ('FONTSIZE', (0, 0), (-1, -1), 10),
+            ('BACKGROUND', (0, 0), (-1, 0), colors.lightgrey),
+            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+            ('BOX', (0, 0), (-1, -1), 0.75, colors.black),
+        ]),
+    }
+
+
+def _money(value):
+    return f"{value:,.2f}"
+
+
+def render_payslip(header, row):
+    """Render one payslip and return the PDF bytes"""
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.units import inch
+    from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer, Table
+
+    if _resources is None:
+        init_worker()
+    res = _resources
+
+    gross = sum(row[field_name] for field_name in EARNING_FIELDS)
+    deductions = sum(row[field_name] for field_name in WITHHOLDING_FIELDS)
+    net = gross - deductions
+
+    elements = []
+    if header['organization_name']:
+        elements.append(Paragraph(escape(header['organization_name']), res['title']))
+    elements.append(Paragraph(f"Payslip &mdash; {escape(header['period_name'])}", res['heading']))
+    elements.append(Spacer(1, 6))
+
+    info = Table([
+        ['Employee:', f"{row['first_name']} {row['last_name']}", 'Period:',
+         f"{header['start_date']:%Y-%m-%d} to {header['end_date']:%Y-%m-%d}"],
+        ['Employee ID:', row['employee_code'], 'Pay Date:', f"{header['pay_date']:%Y-%m-%d}"],
+        ['Department:', row['department'] or '-', 'Position:', row['position'] or '-'],
+    ], colWidths=[1.1 * inch, 2.2 * inch, 0.9 * inch, 2.3 * inch])
+    info.setStyle(res['info_style'])
+    elements.append(info)
+    elements.append(Spacer(1, 12))
+
+    earnings = [['Earnings', 'Hours', 'Amount']]
+    for field_name in EARNING_FIELDS:
+        if field_name == 'regular_pay' or row[field_name]:
+            hours = {'regular_pay': row['regular_hours'], 'overtime_pay': row['overtime_hours']}.get(field_name)
+            earnings.append([EARNING_LABELS[field_name], f"{hours:.2f}" if hours else '', _money(row[field_name])])
+    earnings.append(['Gross Pay', '', _money(gross)])
+
+    withholdings = [['Deductions', 'Amount']]
+    for field_name in WITHHOLDING_FIELDS:
+        if row[field_name]:
+            withholdings.append([WITHHOLDING_LABELS[field_name], _money(row[field_name])])
+    withholdings.append(['Total Deductions', _money(deductions)])
+
+    earnings_table = Table(earnings, colWidths=[1.6 * inch, 0.6 * inch, 1.0 * inch])
+    earnings_table.setStyle(res['amount_style'])
+    withholdings_table = Table(withholdings, colWidths=[1.9 * inch, 1.0 * inch])
+    withholdings_table.setStyle(res['amount_style'])
+    columns = Table([[earnings_table, withholdings_table]], colWidths=[3.4 * inch, 3.1 * inch])
+    columns.setStyle([('VALIGN', (0, 0), (-1, -1), 'TOP')])
+    elements.append(columns)
+    elements.append(Spacer(1, 16))
+
+    summary = Table([
+        ['Net Pay', f"{header['ytd_year']} YTD Gross", f"{header['ytd_year']} YTD Deductions",
+         f"{header['ytd_year']} YTD Net"],
+        [_money(net), _money(row['ytd_gross']), _money(row['ytd_deductions']), _money(row['ytd_net'])],
+    ], colWidths=[1.6 * inch] * 4)
+    summary.setStyle(res['summary_style'])
+    elements.append(summary)
+
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(
+        buffer, pagesize=A4, title=f"Payslip {row['employee_code']} {header['period_name']}",
+        leftMargin=0.75 * inch, rightMargin=0.75 * inch, topMargin=0.75 * inch, bottomMargin=0.75 * inch,
+    )
+    doc.build(elements)
+    return buffer.getvalue()
+
+
+def render_chunk(args):
+    """Render a chunk of rows. Returns a list of (filename, pdf_bytes)."""
+    header, rows = args
+    return [(payslip_filename(row), render_payslip(header, row)) for row in rows]
+
+
+def render_in_order(pool, chunks, window):
+    """
+    Rendered chunks, in order, from a pool that never holds more than
+    window chunks that have been submitted and not yet consumed.
+    """
+    pending = deque()
+    for chunk in chunks:
+        if len(pending) >= window:
+            yield pending.popleft().result()
+        pending.append(pool.submit(render_chunk, chunk))
+    while pending:
+        yield pending.popleft().result()
+
+
+def write_payslip_archive(header, rows, path, workers=1, chunk_size=DEFAULT_CHUNK_SIZE, font_path=None):
+    """
+    Render rows into a zip archive at path (a filename or writable file
+    object). Returns the number of payslips written.
+    """
+    chunks = ((header, rows[i:i + chunk_size]) for i in range(0, len(rows), chunk_size))
+    written = 0
+
+    # Members are already-compressed PDFs, so they are stored rather than deflated
+    with zipfile.ZipFile(path, 'w', compression=zipfile.ZIP_STORED) as archive:
+        def write(results):
+            nonlocal written
+            for filename, pdf in results:
+                archive.writestr(filename, pdf)
+                written += 1
+
+        if workers > 1 and len(rows) >= PARALLEL_THRESHOLD:
+            # Forked workers must not inherit the parent's database connections
+            connections.close_all()
+            with ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                                     initargs=(font_path,)) as pool:
+                for results in render_in_order(pool, chunks, workers * CHUNKS_IN_FLIGHT_PER_WORKER):
+                    write(results)
+        else:
+            init_worker(font_path)
+            for chunk in chunks:
+                write(render_chunk(chunk))
+
+    return written
+
+
+def generate_payslips(period, path, workers=1, chunk_size=DEFAULT_CHUNK_SIZE, font_path=None):
+    """Write a zip of every payslip in the period to path. Returns the count."""
+    header, rows = payslip_rows(period)
+    return write_payslip_archive(header, rows, path, workers=workers,
+                                 chunk_size=chunk_size, font_path=font_path)
@@ -0,0 +1,193 @@
+"""
+Posting a payroll period to the general ledger.
+
+The period's unposted entries are summed in one grouped query over
+PayrollEntry joined to Employee, giving gross pay, each withholding type and
+net pay per department. Salary expense is debited per department; each
+withholding type is credited to its liability account and net pay to the
+payment account. Lines are merged when they have the same side, account
+and description, so each withholding type and the net pay become one line
+summed over the departments, while departments sharing an expense account
+keep a line each. The journal entry and all of its lines are written in
+one transaction, and the lines are audited explicitly since bulk_create
+sends no signals.
+
+Accounts come from PayrollAccountMapping, compiled into a per-process map
+that is cleared when a mapping changes (see payroll.signals) and otherwise
+revalidated against the mappings' count/last-updated signature. A role with
+no mapping falls back to the original fixed account codes.
+"""
+from collections import OrderedDict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, Max, Sum
+
+from accounts.models import Account, JournalEntry, JournalEntryLine
+from audit.signals import log_bulk_create
+from bookgium.local_cache import SignatureCachedValue
+
+from .models import (
+    PayrollAccountMapping, PayrollEntry, WITHHOLDING_FIELDS,
+    gross_pay_expression, net_pay_expression
+)
+
+CENT = Decimal('0.01')
+
+# Accounts used for roles without a PayrollAccountMapping
+DEFAULT_ACCOUNT_CODES = {
+    'salary_expense': '5100',
+    'net_pay': '1000',
+    **{field_name: '2100' for field_name in WITHHOLDING_FIELDS},
+}
+
+
+class PayrollAccountError(Exception):
+    """Raised when a payroll role has no usable ledger account"""
+
+
+class AccountMap:
+    """Resolves (role, department) to an Account"""
+
+    def __init__(self, mappings, defaults):
+        self._mappings = {(m.role, m.department): m.account for m in mappings}
+        self._defaults = defaults
+
+    def resolve(self, role, department=None):
+        account = self._mappings.get((role, department or ''))
+        if account is None:
+            account = self._mappings.get((role, ''))
+        if account is None:
+            account = self._defaults.get(role)
+        if account is None:
+            raise PayrollAccountError(
+                f"No account mapped for {role.replace('_', ' ')}"
+                f"{' in ' + department if department else ''} and default account "
+                f"{DEFAULT_ACCOUNT_CODES[role]} does not exist."
+            )
+        return account
+
+
+def _signature():
+    return tuple(PayrollAccountMapping.objects.aggregate(
+        count=Count('id'), updated=Max('updated_at')
+    ).values())
+
+
+def _compile():
+    mappings = list(PayrollAccountMapping.objects.select_related('account'))
+    accounts = Account.objects.in_bulk(set(DEFAULT_ACCOUNT_CODES.values()), field_name='code')
+    defaults = {
+        role: accounts[code] for role, code in DEFAULT_ACCOUNT_CODES.items() if code in accounts
+    }
+    return AccountMap(mappings, defaults)
+
+
+_account_map = SignatureCachedValue(_signature, _compile)
+
+
+def get_account_map():
+    """Return the compiled account map, recompiling if any mapping changed"""
+    return _account_map.get()
+
+
+def invalidate_account_map():
+    """Drop this process's compiled account map"""
+    _account_map.invalidate()
+
+
+def department_totals(entries):
+    """
+    Gross pay, each withholding field and net pay summed per department,
+    in one query. Returns a list of dicts keyed by 'department'.
+    """
+    rows = entries.order_by().values('employee__department').annotate(
+        gross=Sum(gross_pay_expression()),
+        net=Sum(net_pay_expression()),
+        **{field_name: Sum(field_name) for field_name in WITHHOLDING_FIELDS}
+    )
+    totals = []
+    for row in rows:
+        department = row.pop('employee__department') or ''
+        # SQLite sums decimals as floats, so round back to cents
+        totals.append(dict(
+            {key: Decimal(value or 0).quantize(CENT) for key, value in row.items()},
+            department=department,
+        ))
+    return totals
+
+
+def build_journal_lines(totals, account_map, period_name):
+    """
+    Turn per-department totals into debit/credit lines, merging lines with
+    the same side, account and description.
+    Returns a list of (entry_type, account, amount, description).
+    """
+    lines = OrderedDict()
+
+    def add(entry_type, account, amount, description):
+        if not amount:
+            return
+        key = (entry_type, account.id, description)
+        if key in lines:
+            lines[key][2] += amount
+        else:
+            lines[key] = [entry_type, account, amount, description]
+
+    roles = dict(PayrollAccountMapping.ROLE_CHOICES)
+    for row in sorted(totals, key=lambda row: row['department']):
+        department = row['department']
+        add('debit', account_map.resolve('salary_expense', department), row['gross'],
+            f"Salary expense{' - ' + department if department else ''} for {period_name}")
+    for row in totals:
+        for field_name in WITHHOLDING_FIELDS:
+            add('credit', account_map.resolve(field_name, row['department']), row[field_name],
+                f"{roles[field_name]} for {period_name}")
+    for row in totals:
+        add('credit', account_map.resolve('net_pay', row['department']), row['net'],
+            f"Net payroll payment for {period_name}")
+
+    return [tuple(line) for line in lines.values()]
+
+
+def post_period_journal(period, user=None):
+    """
+    Post every entry of the period that is not yet on a journal entry.
+    Returns the JournalEntry, or None if there was nothing to post.
+    """
+    account_map = get_account_map()
+
+    with transaction.atomic():
+        entries = PayrollEntry.objects.filter(payroll_period=period, journal_entry__isnull=True)
+        # Lock the rows being posted so a concurrent post cannot include them twice
+        if not list(entries.select_for_update().order_by().values_list('id', flat=True)):
+            return None
+
+        lines = build_journal_lines(department_totals(entries), account_map, period.name)
+        debits = sum(amount for entry_type, _, amount, _ in lines if entry_type == 'debit')
+        credits = sum(amount for entry_type, _, amount, _ in lines if entry_type == 'credit')
+        if debits != credits:
+            raise ValueError(f"Payroll journal is not balanced. Debits: {debits}, Credits: {credits}")
+
+        journal_entry = JournalEntry.objects.create(
+            date=period.pay_date,
+            description=f"Payroll for {period.name}",
+            reference=f"PAY-{period.id}",
+            created_by=user,
+            is_posted=True
+        )
+        journal_lines = JournalEntryLine.objects.bulk_create([
+            JournalEntryLine(
+                journal_entry=journal_entry,
+                account=account,
+                entry_type=entry_type,
+                amount=amount,
+                description=description,
+            )
+            for entry_type, account, amount, description in lines
+        ])
+        # bulk_create sends no post_save, so audit the ledger lines here
+        log_bulk_create(JournalEntryLine, journal_lines, user)
+        entries.update(journal_entry=journal_entry)
+
+    return journal_entry
@@ -0,0 +1,57 @@
+from django.db.models.signals import post_save, post_delete, pre_delete
+from django.dispatch import receiver
+from django.utils import timezone
+from .models import PayrollAccountMapping, PayrollEntry, PayrollPeriod, TaxTable, TaxBracket
+from .posting import invalidate_account_map
+from .services import apply_entry_to_ytd, remove_period_from_ytd, sync_period_ytd
+from .tax_tables import invalidate_tax_tables
+
+
+@receiver(post_save, sender=TaxTable)
+@receiver(post_delete, sender=TaxTable)
+def tax_table_changed(sender, instance, **kwargs):
+    """Drop compiled withholding tables when a table changes"""
+    invalidate_tax_tables()
+
+
+@receiver(post_save, sender=TaxBracket)
+@receiver(post_delete, sender=TaxBracket)
+def tax_bracket_changed(sender, instance, **kwargs):
+    """Touch the parent table so other processes recompile, then invalidate locally"""
+    TaxTable.objects.filter(pk=instance.table_id).update(updated_at=timezone.now())
+    invalidate_tax_tables()
+
+
+@receiver(post_save, sender=PayrollAccountMapping)
+@receiver(post_delete, sender=PayrollAccountMapping)
+def account_mapping_changed(sender, instance, **kwargs):
+    """Drop the compiled payroll account map when a mapping changes"""
+    invalidate_account_map()
+
+
+@receiver(post_save, sender=PayrollPeriod)
+def update_ytd_totals(sender, instance, raw=False, **kwargs):
+    """Add a period to the year-to-date totals when it is approved or paid, and take it out again otherwise"""
+    if not raw:
+        sync_period_ytd(instance)
+
+
+@receiver(pre_delete, sender=PayrollPeriod)
+def payroll_period_deleted(sender, instance, **kwargs):
+    """Take a counted period out of the year-to-date totals before it and its entries go"""
+    remove_period_from_ytd(instance)
+
+
+@receiver(post_save, sender=PayrollEntry)
+def payroll_entry_saved(sender, instance, created, raw=False, **kwargs):
+    """Apply the change to an entry of a counted period to the employee's year-to-date totals"""
+    if not raw:
+        apply_entry_to_ytd(instance, created=created)
+
+
+@receiver(post_delete, sender=PayrollEntry)
+def payroll_entry_deleted(sender, instance, origin=None, **kwargs):
+    # A deleted period has already been taken out as a whole
+    if isinstance(origin, PayrollPeriod):
+        return
+    apply_entry_to_ytd(instance, deleted=True)
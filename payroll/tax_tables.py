@@ -0,0 +1,134 @@
+"""
+Compiled withholding tables.
+
+TaxTable/TaxBracket rows are compiled once into sorted integer arrays so that
+withholding for an employee is a single bisect plus one multiplication. The
+compiled tables are cached per process. Saving or deleting a table or bracket
+clears the local cache (see payroll.signals); other processes notice the
+change through the tables' count/last-updated signature, which is checked
+once per payroll run.
+"""
+from bisect import bisect_right
+from collections import defaultdict
+
+from django.db.models import Count, Max
+
+from bookgium.local_cache import SignatureCachedValue
+
+from .models import TaxTable
+
+PPM = 1000000
+
+
+def round_half_even_div(numerator, denominator):
+    """Integer division rounded half-to-even, matching Decimal's default rounding"""
+    quotient, remainder = divmod(numerator, denominator)
+    twice = 2 * remainder
+    if twice > denominator or (twice == denominator and quotient % 2):
+        quotient += 1
+    return quotient
+
+
+class CompiledTaxTable:
+    """A bracket table flattened into parallel arrays of cents and ppm rates"""
+    __slots__ = ('table_id', 'version', 'effective_date', 'exemption_allowance',
+                 'bounds', 'bases', 'rates')
+
+    def __init__(self, table, brackets):
+        self.table_id = table.id
+        self.version = table.version
+        self.effective_date = table.effective_date
+        self.exemption_allowance = int(table.exemption_allowance * 100)
+        self.bounds = []
+        self.bases = []
+        self.rates = []
+
+        # Tax due at each lower bound, accumulated from the brackets below it,
+        # kept exact in cents * ppm until the final rounding
+        base = 0
+        for index, bracket in enumerate(brackets):
+            bound = int(bracket.lower_bound * 100)
+            rate = int(bracket.rate * PPM)
+            if index:
+                base += (bound - self.bounds[-1]) * self.rates[-1]
+            self.bounds.append(bound)
+            self.bases.append(base)
+            self.rates.append(rate)
+
+    def withholding(self, taxable_cents, exemptions=0):
+        """Withholding in cents for taxable pay in cents"""
+        taxable = taxable_cents - exemptions * self.exemption_allowance
+        index = bisect_right(self.bounds, taxable) - 1
+        if index < 0:
+            return 0
+        exact = self.bases[index] + (taxable - self.bounds[index]) * self.rates[index]
+        return round_half_even_div(exact, PPM)
+
+
+class TaxTableSet:
+    """All compiled tables, keyed by (tax_field, jurisdiction, pay_frequency)"""
+
+    def __init__(self, tables):
+        self._tables = defaultdict(list)
+        for compiled, key in tables:
+            self._tables[key].append(compiled)
+        self._dates = {}
+        for key, versions in self._tables.items():
+            versions.sort(key=lambda t: (t.effective_date, t.version))
+            self._dates[key] = [t.effective_date for t in versions]
+
+    def __len__(self):
+        return sum(len(versions) for versions in self._tables.values())
+
+    def lookup(self, tax_field, jurisdiction, pay_frequency, on_date):
+        """Return the table in force on on_date, or None"""
+        key = (tax_field, jurisdiction, pay_frequency)
+        versions = self._tables.get(key)
+        if not versions:
+            return None
+        index = bisect_right(self._dates[key], on_date) - 1
+        # Equal effective dates sort by version, so the last match is the newest
+        return versions[index] if index >= 0 else None
+
+    def for_period(self, on_date):
+        """
+        Resolve tables once for a pay date. Returns a function mapping
+        (tax_field, jurisdiction, pay_frequency) to a compiled table or None.
+        """
+        resolved = {}
+
+        def resolve(tax_field, jurisdiction, pay_frequency):
+            key = (tax_field, jurisdiction, pay_frequency)
+            if key not in resolved:
+                resolved[key] = self.lookup(tax_field, jurisdiction, pay_frequency, on_date)
+            return resolved[key]
+
+        return resolve
+
+
+def _signature():
+    return tuple(TaxTable.objects.aggregate(
+        count=Count('id'), updated=Max('updated_at')
+    ).values())
+
+
+def _compile():
+    tables = TaxTable.objects.filter(is_active=True).prefetch_related('brackets')
+    return TaxTableSet([
+        (CompiledTaxTable(table, list(table.brackets.all())),
+         (table.tax_field, table.jurisdiction, table.pay_frequency))
+        for table in tables
+    ])
+
+
+_tables = SignatureCachedValue(_signature, _compile)
+
+
+def get_tax_tables():
+    """Return the compiled tables, recompiling if any table changed"""
+    return _tables.get()
+
+
+def invalidate_tax_tables():
+    """Drop this process's compiled tables"""
+    _tables.invalidate()
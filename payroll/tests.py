@@ -1,3 +1,688 @@
-from django.test import TestCase
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import date
+from decimal import ROUND_HALF_EVEN, Decimal
+import io
+from types import SimpleNamespace
+from unittest import mock
+import zipfile
 
-# Create your tests here.
+from django.db import connection
+from django.db.models import F
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from accounts.models import Account, JournalEntry, JournalEntryLine
+from bookgium.query_budget import QueryBudgetTestCase
+
+from . import posting, services
+from .models import (
+    WITHHOLDING_FIELDS, Employee, PayrollAccountMapping, PayrollDeduction, PayrollEntry, PayrollPeriod,
+    PayrollYTD,
+)
+from .payslips import generate_payslips, payslip_rows, render_in_order
+from .posting import DEFAULT_ACCOUNT_CODES, PayrollAccountError, invalidate_account_map, post_period_journal
+from .services import apply_rate, calculate_cohort, rate_to_ppm, run_payroll
+from .tax_tables import PPM, CompiledTaxTable, TaxTableSet, round_half_even_div
+
+# view name: (max queries, max seconds) against the seeded tenant
+BUDGETS = {
+    'payroll_dashboard': (7, 2.0),
+}
+
+
+class PayrollQueryBudgetTests(QueryBudgetTestCase):
+
+    def test_payroll_dashboard(self):
+        url = reverse('payroll:dashboard')
+        self.get_within_budget('payroll_dashboard', url, *BUDGETS['payroll_dashboard'])
+        self.assertQueriesDoNotScale('payroll_dashboard', url)
+
+
+class PayrollPostingTests(QueryBudgetTestCase):
+
+    def setUp(self):
+        # The seeded chart of accounts doesn't necessarily use the default codes
+        for code, account_type in [(DEFAULT_ACCOUNT_CODES['salary_expense'], 'expense'),
+                                   (DEFAULT_ACCOUNT_CODES['net_pay'], 'asset'),
+                                   (DEFAULT_ACCOUNT_CODES['federal_tax'], 'liability')]:
+            Account.objects.get_or_create(code=code, defaults={
+                'name': f'Payroll {account_type} {code}', 'account_type': account_type,
+                'created_by': self.tenant['admin'],
+            })
+
+    def test_posted_journal_lines_are_audited(self):
+        with mock.patch('audit.signals.record') as record:
+            journal_entry = post_period_journal(self.tenant['period'], user=self.tenant['admin'])
+        logged = {
+            log.object_id for (log,), kwargs in record.call_args_list
+            if log.content_type.model_class() is JournalEntryLine
+        }
+        self.assertTrue(logged)
+        self.assertEqual(logged, set(journal_entry.lines.values_list('pk', flat=True)))
+        self.assertTrue(all(log.action == 'create' and log.user == self.tenant['admin']
+                            for (log,), kwargs in record.call_args_list))
+
+
+class PayslipDownloadTests(QueryBudgetTestCase):
+
+    def url(self):
+        return reverse('payroll:download_payslips', args=[self.tenant['period'].pk])
+
+    @override_settings(PAYSLIP_DOWNLOAD_MAX_ENTRIES=2)
+    def test_large_periods_are_left_to_the_command(self):
+        with mock.patch('payroll.payslips.generate_payslips') as generate:
+            response = self.client.get(self.url(), follow=True)
+        generate.assert_not_called()
+        self.assertRedirects(response, reverse('payroll:period_detail', args=[self.tenant['period'].pk]))
+        self.assertContains(response, f"generate_payslips {self.tenant['period'].pk}")
+
+    @override_settings(PAYSLIP_DOWNLOAD_MAX_ENTRIES=100)
+    def test_small_periods_are_served_inline(self):
+        response = self.client.get(self.url())
+        self.assertEqual(response['Content-Type'], 'application/zip')
+        with zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content))) as archive:
+            self.assertEqual(len(archive.namelist()), self.tenant['period'].payroll_entries.count())
+
+
+class PayslipArchiveTests(TestCase):
+
+    def setUp(self):
+        self.employees = [
+            Employee.objects.create(
+                employee_id=f'EMP-SLIP-{i}', first_name='Slip', last_name=last_name,
+                email=f'slip{i}@example.invalid', hire_date=date(2020, 1, 1), position='Staff',
+                employment_type='full_time', base_salary=Decimal(3000 + i * 500),
+            )
+            for i, last_name in enumerate(['Young', "O'Neil", 'Adams'])
+        ]
+        self.period = PayrollPeriod.objects.create(
+            name='June 2026', period_type='monthly', start_date=date(2026, 6, 1),
+            end_date=date(2026, 6, 30), pay_date=date(2026, 6, 30),
+        )
+        run_payroll(self.period)
+        self.period.status = 'approved'
+        self.period.save()
+
+    def archive(self, **kwargs):
+        buffer = io.BytesIO()
+        count = generate_payslips(self.period, buffer, **kwargs)
+        buffer.seek(0)
+        return count, zipfile.ZipFile(buffer)
+
+    def test_archive_holds_one_pdf_per_entry_in_name_order(self):
+        count, archive = self.archive(chunk_size=2)
+        self.assertEqual(count, 3)
+        self.assertEqual(archive.namelist(), [
+            'EMP-SLIP-2_Adams_Slip.pdf', 'EMP-SLIP-1_O_Neil_Slip.pdf', 'EMP-SLIP-0_Young_Slip.pdf',
+        ])
+        for member in archive.infolist():
+            self.assertEqual(member.compress_type, zipfile.ZIP_STORED)
+            self.assertTrue(archive.read(member).startswith(b'%PDF'))
+
+    def test_rows_carry_the_year_to_date_totals(self):
+        header, rows = payslip_rows(self.period)
+        self.assertEqual((header['period_name'], header['ytd_year']), ('June 2026', 2026))
+        for row in rows:
+            ytd = PayrollYTD.objects.get(employee_id=row['employee_id'], year=2026)
+            self.assertEqual((row['ytd_gross'], row['ytd_deductions'], row['ytd_net']),
+                             (ytd.gross_pay, ytd.total_deductions, ytd.net_pay))
+
+    def test_only_the_periods_employees_year_to_date_is_loaded(self):
+        other = Employee.objects.create(
+            employee_id='EMP-OTHER', first_name='Other', last_name='Employee', email='other@example.invalid',
+            hire_date=date(2020, 1, 1), position='Staff', employment_type='full_time',
+            base_salary=Decimal('3000.00'),
+        )
+        PayrollYTD.objects.create(employee=other, year=2026, gross_pay=Decimal('100.00'))
+        with mock.patch('payroll.payslips.load_ytd', wraps=services.load_ytd) as load_ytd:
+            payslip_rows(self.period)
+        (year,), kwargs = load_ytd.call_args
+        self.assertEqual(year, 2026)
+        self.assertEqual(set(kwargs['employee_ids'].values_list('employee_id', flat=True)),
+                         {employee.pk for employee in self.employees})
+
+    def test_parallel_archive_matches_serial(self):
+        count, serial = self.archive(chunk_size=1)
+        with mock.patch('payroll.payslips.ProcessPoolExecutor', ThreadPoolExecutor), \
+                mock.patch('payroll.payslips.PARALLEL_THRESHOLD', 0):
+            count, parallel = self.archive(workers=2, chunk_size=1)
+        self.assertEqual(count, 3)
+        self.assertEqual(parallel.namelist(), serial.namelist())
+
+    def test_chunks_in_flight_are_bounded(self):
+        class Pool:
+            submitted = 0
+
+            def submit(self, fn, chunk):
+                self.submitted += 1
+                future = Future()
+                future.set_result(fn(chunk))
+                return future
+
+        pool = Pool()
+        consumed = []
+        with mock.patch('payroll.payslips.render_chunk', lambda chunk: chunk):
+            for chunk in render_in_order(pool, iter(range(10)), window=3):
+                consumed.append(chunk)
+                # Counting the chunk being written
+                self.assertLessEqual(pool.submitted - len(consumed) + 1, 3)
+        self.assertEqual(consumed, list(range(10)))
+
+
+class PayrollTotalsTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        employees = [
+            Employee.objects.create(
+                employee_id=f'EMP-SUM-{i}', first_name='Sum', last_name=f'Employee {i}',
+                email=f'sum{i}@example.invalid', hire_date=date(2020, 1, 1), position='Staff',
+                employment_type='full_time', base_salary=Decimal('3000.00'),
+            )
+            for i in range(3)
+        ]
+        cls.periods = [
+            PayrollPeriod.objects.create(
+                name=f'{month:%B} 2026', period_type='monthly', start_date=month,
+                end_date=month.replace(day=28), pay_date=month.replace(day=28),
+            )
+            for month in (date(2026, 7, 1), date(2026, 8, 1), date(2026, 9, 1))
+        ]
+        # Odd cents in every field, so float summing in the database would show
+        for n, (employee, period) in enumerate([(e, p) for p in cls.periods[:2] for e in employees]):
+            PayrollEntry.objects.create(
+                employee=employee, payroll_period=period,
+                regular_pay=Decimal('2999.99') + n, overtime_pay=Decimal('0.07') * n,
+                bonus=Decimal('100.01') if n % 2 else Decimal('0'), commission=Decimal('33.33') * (n % 3),
+                federal_tax=Decimal('360.11') + n, state_tax=Decimal('150.03'), social_security=Decimal('186.19'),
+                medicare=Decimal('43.51'), health_insurance=Decimal('0.01') * n, retirement_401k=Decimal('150.50'),
+                other_deductions=Decimal('12.34') if n == 4 else Decimal('0'),
+            )
+        cls.entries = list(PayrollEntry.objects.all())
+
+    def sums(self, entries):
+        return {
+            'total_gross': sum((entry.gross_pay for entry in entries), Decimal('0.00')),
+            'total_deductions': sum((entry.total_deductions for entry in entries), Decimal('0.00')),
+            'total_net': sum((entry.net_pay for entry in entries), Decimal('0.00')),
+            'employee_count': len(entries),
+        }
+
+    def test_totals(self):
+        self.assertEqual(PayrollEntry.objects.totals(), self.sums(self.entries))
+        self.assertEqual(PayrollEntry.objects.none().totals(), self.sums([]))
+
+    def test_totals_by_period(self):
+        self.assertEqual(PayrollEntry.objects.totals_by_period(), {
+            period.pk: self.sums([entry for entry in self.entries if entry.payroll_period_id == period.pk])
+            for period in self.periods[:2]
+        })
+
+    def test_totals_by_employee(self):
+        expected = {}
+        for entry in self.entries:
+            totals = expected.setdefault(entry.employee_id, {
+                'total_gross': Decimal('0.00'), 'total_net': Decimal('0.00'), 'entry_count': 0,
+                **{f'total_{field_name}': Decimal('0.00') for field_name in WITHHOLDING_FIELDS},
+            })
+            totals['total_gross'] += entry.gross_pay
+            totals['total_net'] += entry.net_pay
+            totals['entry_count'] += 1
+            for field_name in WITHHOLDING_FIELDS:
+                totals[f'total_{field_name}'] += getattr(entry, field_name)
+        self.assertEqual(PayrollEntry.objects.totals_by_employee(), expected)
+
+    def test_period_with_totals(self):
+        periods = {period.pk: period for period in PayrollPeriod.objects.with_totals()}
+        for period in self.periods:
+            sums = self.sums([entry for entry in self.entries if entry.payroll_period_id == period.pk])
+            annotated = periods[period.pk]
+            self.assertEqual(
+                (annotated.gross_total, annotated.deductions_total, annotated.net_total, annotated.entry_count),
+                (sums['total_gross'], sums['total_deductions'], sums['total_net'], sums['employee_count']),
+            )
+
+
+class PayrollYTDTests(TestCase):
+
+    def setUp(self):
+        self.employee = Employee.objects.create(
+            employee_id='EMP-YTD', first_name='Year', last_name='ToDate', email='ytd@example.invalid',
+            hire_date=date(2020, 1, 1), position='Staff', employment_type='full_time',
+            base_salary=Decimal('3000.00'),
+        )
+        self.period = PayrollPeriod.objects.create(
+            name='March 2026', period_type='monthly', start_date=date(2026, 3, 1),
+            end_date=date(2026, 3, 31), pay_date=date(2026, 3, 31),
+        )
+        run_payroll(self.period)
+        self.entry = PayrollEntry.objects.get(payroll_period=self.period)
+
+    def set_status(self, status, **changes):
+        self.period.status = status
+        for name, value in changes.items():
+            setattr(self.period, name, value)
+        self.period.save()
+
+    def ytd(self, year=2026):
+        return PayrollYTD.objects.filter(employee=self.employee, year=year).first()
+
+    def test_approval_adds_the_period(self):
+        self.assertIsNone(self.ytd())
+        self.set_status('approved')
+        ytd = self.ytd()
+        self.assertEqual(ytd.gross_pay, self.entry.gross_pay)
+        self.assertEqual(ytd.net_pay, self.entry.net_pay)
+        self.assertEqual(ytd.federal_tax, self.entry.federal_tax)
+        self.assertEqual(ytd.period_count, 1)
+        self.assertTrue(self.period.ytd_posted)
+
+        # Saving again doesn't count the period twice
+        self.set_status('paid')
+        self.assertEqual(self.ytd().gross_pay, self.entry.gross_pay)
+        self.assertEqual(self.ytd().period_count, 1)
+
+    def test_entry_edited_after_approval(self):
+        self.set_status('approved')
+        self.entry.bonus = Decimal('500.00')
+        self.entry.save()
+        self.assertEqual(self.ytd().gross_pay, self.entry.gross_pay)
+        self.assertEqual(self.ytd().net_pay, self.entry.net_pay)
+
+        self.entry.delete()
+        self.assertIsNone(self.ytd())
+
+    def test_period_moved_back_out_of_approved(self):
+        self.set_status('approved')
+        self.set_status('completed')
+        self.assertIsNone(self.ytd())
+        self.assertFalse(self.period.ytd_posted)
+
+        # Edits while it isn't counted don't touch the totals
+        self.entry.bonus = Decimal('500.00')
+        self.entry.save()
+        self.assertIsNone(self.ytd())
+
+    def test_pay_date_moved_to_another_year(self):
+        self.set_status('approved')
+        self.set_status('approved', pay_date=date(2027, 1, 5))
+        self.assertIsNone(self.ytd(2026))
+        self.assertEqual(self.ytd(2027).gross_pay, self.entry.gross_pay)
+
+    def test_earlier_entries_are_not_rescanned(self):
+        self.set_status('approved')
+        # An offset that only a rescan of the earlier period would remove
+        PayrollYTD.objects.filter(employee=self.employee).update(gross_pay=F('gross_pay') + 1000)
+
+        april = PayrollPeriod.objects.create(
+            name='April 2026', period_type='monthly', start_date=date(2026, 4, 1),
+            end_date=date(2026, 4, 30), pay_date=date(2026, 4, 30),
+        )
+        run_payroll(april)
+        april.status = 'approved'
+        april.save()
+        april_entry = PayrollEntry.objects.get(payroll_period=april)
+        self.assertEqual(self.ytd().gross_pay, self.entry.gross_pay + april_entry.gross_pay + 1000)
+        self.assertEqual(self.ytd().period_count, 2)
+
+        april_entry.bonus = Decimal('100.00')
+        april_entry.save()
+        self.assertEqual(self.ytd().gross_pay, self.entry.gross_pay + april_entry.gross_pay + 1000)
+
+    def test_draft_saves_read_nothing(self):
+        self.entry.bonus = Decimal('500.00')
+        with CaptureQueriesContext(connection) as queries:
+            self.entry.save()
+        self.assertFalse([query for query in queries.captured_queries if query['sql'].startswith('SELECT')])
+
+        # Nothing that changes the totals, so nothing beyond the save itself
+        self.entry.notes = 'Checked'
+        with self.assertNumQueries(1):
+            self.entry.save()
+        self.period.name = 'March 2026 (monthly)'
+        with self.assertNumQueries(1):
+            self.period.save()
+
+    def test_deleted_period_is_taken_out(self):
+        self.set_status('approved')
+        self.period.delete()
+        self.assertIsNone(self.ytd())
+
+    def test_late_entries_in_a_counted_period(self):
+        self.set_status('approved')
+        other = Employee.objects.create(
+            employee_id='EMP-LATE', first_name='Late', last_name='Hire', email='late@example.invalid',
+            hire_date=date(2026, 3, 15), position='Staff', employment_type='full_time',
+            base_salary=Decimal('2000.00'),
+        )
+        run_payroll(self.period)
+        self.assertEqual(PayrollYTD.objects.get(employee=other, year=2026).gross_pay, Decimal('2000.00'))
+
+
+class RunPayrollTests(TestCase):
+
+    def setUp(self):
+        self.employees = [
+            Employee.objects.create(
+                employee_id=f'EMP-RUN-{i}', first_name='Run', last_name=f'Payroll {i}',
+                email=f'run{i}@example.invalid', hire_date=date(2020, 1, 1), position='Staff',
+                employment_type='full_time', base_salary=Decimal('3000.00'),
+            )
+            for i in range(3)
+        ]
+        self.period = PayrollPeriod.objects.create(
+            name='April 2026', period_type='monthly', start_date=date(2026, 4, 1),
+            end_date=date(2026, 4, 30), pay_date=date(2026, 4, 30),
+        )
+
+    def test_counts_created_entries(self):
+        self.assertEqual(run_payroll(self.period), 3)
+        self.assertEqual(run_payroll(self.period), 0)
+
+    def test_entries_created_concurrently_are_not_counted(self):
+        real_calculate_cohort = services.calculate_cohort
+
+        def calculate_cohort_racing(employees, **kwargs):
+            # Another run inserts an entry after this one read the existing ones
+            PayrollEntry.objects.create(employee=self.employees[0], payroll_period=self.period)
+            return real_calculate_cohort(employees, **kwargs)
+
+        with mock.patch.object(services, 'calculate_cohort', calculate_cohort_racing):
+            self.assertEqual(run_payroll(self.period), 2)
+        self.assertEqual(PayrollEntry.objects.filter(payroll_period=self.period).count(), 3)
+
+
+def cohort_employee(pk, base_salary='3000.00', **fields):
+    """An Employee-like object with what calculate_cohort reads, without touching the database"""
+    return SimpleNamespace(id=pk, employment_type='full_time', base_salary=Decimal(base_salary), hourly_rate=None,
+                           pay_frequency='monthly', tax_exemptions=0, tax_state='CA', **fields)
+
+
+def deduction_rule(deduction_type, amount, is_percentage=False):
+    return SimpleNamespace(deduction_type=deduction_type, amount=Decimal(amount), is_percentage=is_percentage)
+
+
+def ytd_row(**amounts):
+    return SimpleNamespace(**{field_name: Decimal(amounts.get(field_name, '0.00'))
+                              for field_name in ('social_security', 'retirement_401k')})
+
+
+class CalculateCohortTests(SimpleTestCase):
+
+    def calculate(self, employees, rules=(), ytd=None):
+        return calculate_cohort(employees, pay_date=date(2026, 9, 30), tax_tables=TaxTableSet([]),
+                                deduction_rules=list(rules), ytd=ytd or {})
+
+    def test_flat_rates_without_tax_tables(self):
+        [row] = self.calculate([cohort_employee(1)])
+        self.assertEqual(row['regular_pay'], Decimal('3000.00'))
+        self.assertEqual(row['regular_hours'], 40)
+        self.assertEqual(
+            {field_name: row[field_name] for field_name in ('federal_tax', 'state_tax', 'social_security', 'medicare')},
+            {'federal_tax': Decimal('360.00'), 'state_tax': Decimal('150.00'),
+             'social_security': Decimal('186.00'), 'medicare': Decimal('43.50')},
+        )
+
+    def test_amounts_are_rounded_before_they_are_saved(self):
+        # 1.45% of 1000.50 is 14.507250 and 2.5% of it 25.0125: nothing is left for the database to round
+        [row] = self.calculate([cohort_employee(1, base_salary='1000.50')],
+                               [deduction_rule('other', '2.50', is_percentage=True)])
+        self.assertEqual((row['medicare'], row['other_deductions']), (Decimal('14.51'), Decimal('25.01')))
+        for field_name, value in row.items():
+            if isinstance(value, Decimal):
+                self.assertEqual(value.as_tuple().exponent, -2, field_name)
+
+    def test_deduction_rules_add_up_per_field(self):
+        rules = [
+            deduction_rule('insurance', '150.00'),
+            deduction_rule('insurance', '1.50', is_percentage=True),
+            deduction_rule('retirement', '5.00', is_percentage=True),
+            deduction_rule('loan', '75.00'),
+            deduction_rule('garnishment', '2.25', is_percentage=True),
+        ]
+        rows = self.calculate([cohort_employee(1), cohort_employee(2, base_salary='1234.56')], rules)
+        self.assertEqual(
+            [(row['health_insurance'], row['retirement_401k'], row['other_deductions']) for row in rows],
+            [
+                (Decimal('195.00'), Decimal('150.00'), Decimal('142.50')),
+                # 1.5% of 1234.56 is 18.5184, 5% is 61.728 and 2.25% is 27.7776
+                (Decimal('168.52'), Decimal('61.73'), Decimal('102.78')),
+            ],
+        )
+
+    def test_social_security_stops_at_the_wage_base(self):
+        # The wage base caps social security at 10,453.20 a year
+        ytd = {
+            1: ytd_row(social_security='10400.00'),
+            2: ytd_row(social_security='10453.20'),
+            3: ytd_row(social_security='9000.00'),
+        }
+        rows = self.calculate([cohort_employee(pk) for pk in (1, 2, 3, 4)], ytd=ytd)
+        self.assertEqual([row['social_security'] for row in rows],
+                         [Decimal('53.20'), Decimal('0.00'), Decimal('186.00'), Decimal('186.00')])
+        # Medicare has no wage base
+        self.assertEqual({row['medicare'] for row in rows}, {Decimal('43.50')})
+
+    def test_retirement_deductions_stop_at_the_annual_limit(self):
+        rules = [deduction_rule('retirement', '10.00', is_percentage=True), deduction_rule('retirement', '50.00')]
+        ytd = {1: ytd_row(retirement_401k='22800.00'), 2: ytd_row(retirement_401k='23000.00')}
+        rows = self.calculate([cohort_employee(pk) for pk in (1, 2, 3)], rules, ytd)
+        self.assertEqual([row['retirement_401k'] for row in rows],
+                         [Decimal('200.00'), Decimal('0.00'), Decimal('350.00')])
+
+
+class AnnualLimitTests(TestCase):
+
+    def test_social_security_cap_is_reached_mid_year(self):
+        employee = Employee.objects.create(
+            employee_id='EMP-CAP', first_name='High', last_name='Earner', email='cap@example.invalid',
+            hire_date=date(2020, 1, 1), position='Director', employment_type='full_time',
+            base_salary=Decimal('20000.00'),
+        )
+        PayrollDeduction.objects.create(name='401(k)', deduction_type='retirement', is_percentage=True,
+                                        amount=Decimal('15.00'))
+        withheld = []
+        for month in range(1, 11):
+            pay_date = date(2026, month, 28)
+            period = PayrollPeriod.objects.create(
+                name=f'{pay_date:%B} 2026', period_type='monthly', start_date=pay_date.replace(day=1),
+                end_date=pay_date, pay_date=pay_date,
+            )
+            run_payroll(period)
+            period.status = 'approved'
+            period.save()
+            entry = PayrollEntry.objects.get(employee=employee, payroll_period=period)
+            withheld.append((entry.social_security, entry.retirement_401k))
+
+        # 1,240.00 a month until the 10,453.20 limit; 3,000.00 a month until 23,000.00
+        self.assertEqual([social_security for social_security, retirement in withheld],
+                         [Decimal('1240.00')] * 8 + [Decimal('533.20'), Decimal('0.00')])
+        self.assertEqual([retirement for social_security, retirement in withheld],
+                         [Decimal('3000.00')] * 7 + [Decimal('2000.00'), Decimal('0.00'), Decimal('0.00')])
+        ytd = PayrollYTD.objects.get(employee=employee, year=2026)
+        self.assertEqual((ytd.social_security, ytd.retirement_401k, ytd.period_count),
+                         (Decimal('10453.20'), Decimal('23000.00'), 10))
+
+
+class PostPeriodJournalTests(TestCase):
+
+    def setUp(self):
+        invalidate_account_map()
+        self.addCleanup(invalidate_account_map)
+        self.accounts = {
+            code: Account.objects.create(code=code, name=name, account_type=account_type)
+            for code, name, account_type in [
+                ('5100', 'Salaries', 'expense'),
+                ('1000', 'Cash', 'asset'),
+                ('2100', 'Payroll liabilities', 'liability'),
+                ('5200', 'Sales salaries', 'expense'),
+                ('2200', 'Federal tax payable', 'liability'),
+            ]
+        }
+        PayrollAccountMapping.objects.create(role='salary_expense', department='Sales',
+                                             account=self.accounts['5200'])
+        PayrollAccountMapping.objects.create(role='federal_tax', account=self.accounts['2200'])
+        self.period = PayrollPeriod.objects.create(
+            name='May 2026', period_type='monthly', start_date=date(2026, 5, 1),
+            end_date=date(2026, 5, 31), pay_date=date(2026, 5, 31),
+        )
+        for i, (department, pay, federal_tax, health_insurance) in enumerate([
+            ('Sales', '3000.00', '300.00', '100.00'),
+            ('Sales', '2000.00', '200.00', '0.00'),
+            ('Engineering', '4000.00', '400.00', '150.00'),
+            (None, '1000.00', '100.00', '0.00'),
+        ]):
+            employee = Employee.objects.create(
+                employee_id=f'EMP-POST-{i}', first_name='Post', last_name=f'Employee {i}',
+                email=f'post{i}@example.invalid', hire_date=date(2020, 1, 1), position='Staff',
+                employment_type='full_time', base_salary=Decimal(pay), department=department,
+            )
+            PayrollEntry.objects.create(
+                employee=employee, payroll_period=self.period, regular_pay=Decimal(pay),
+                federal_tax=Decimal(federal_tax), health_insurance=Decimal(health_insurance),
+                social_security=(Decimal(pay) * Decimal('0.062')).quantize(Decimal('0.01')),
+            )
+
+    def lines(self, journal_entry):
+        return sorted(
+            (line.entry_type, line.account.code, line.amount, line.description)
+            for line in journal_entry.lines.select_related('account')
+        )
+
+    def test_posts_salary_per_department_and_each_withholding_to_its_account(self):
+        journal_entry = post_period_journal(self.period)
+        self.assertEqual(self.lines(journal_entry), sorted([
+            # Sales has its own expense account; the others fall back to 5100
+            ('debit', '5200', Decimal('5000.00'), 'Salary expense - Sales for May 2026'),
+            ('debit', '5100', Decimal('4000.00'), 'Salary expense - Engineering for May 2026'),
+            ('debit', '5100', Decimal('1000.00'), 'Salary expense for May 2026'),
+            # One line per withholding type, summed over the departments
+            ('credit', '2200', Decimal('1000.00'), 'Federal Tax Payable for May 2026'),
+            ('credit', '2100', Decimal('620.00'), 'Social Security Payable for May 2026'),
+            ('credit', '2100', Decimal('250.00'), 'Health Insurance Payable for May 2026'),
+            ('credit', '1000', Decimal('8130.00'), 'Net payroll payment for May 2026'),
+        ]))
+        self.assertEqual((journal_entry.date, journal_entry.reference, journal_entry.is_posted),
+                         (self.period.pay_date, f'PAY-{self.period.pk}', True))
+        self.assertFalse(self.period.payroll_entries.filter(journal_entry__isnull=True).exists())
+
+    def test_department_mappings_take_precedence_over_the_role_default(self):
+        PayrollAccountMapping.objects.create(role='salary_expense', account=self.accounts['5100'])
+        engineering = Account.objects.create(code='5300', name='Engineering salaries', account_type='expense')
+        PayrollAccountMapping.objects.create(role='salary_expense', department='Engineering', account=engineering)
+        debits = {(code, amount) for entry_type, code, amount, description
+                  in self.lines(post_period_journal(self.period)) if entry_type == 'debit'}
+        self.assertEqual(debits, {('5200', Decimal('5000.00')), ('5300', Decimal('4000.00')),
+                                  ('5100', Decimal('1000.00'))})
+
+    def test_posts_only_unposted_entries(self):
+        post_period_journal(self.period)
+        self.assertIsNone(post_period_journal(self.period))
+
+    def test_missing_default_account(self):
+        self.accounts['1000'].delete()
+        with self.assertRaisesMessage(PayrollAccountError, 'No account mapped for net pay'):
+            post_period_journal(self.period)
+        self.assertFalse(JournalEntry.objects.exists())
+        self.assertFalse(self.period.payroll_entries.filter(journal_entry__isnull=False).exists())
+
+    def test_unbalanced_journal_is_not_posted(self):
+        real_department_totals = posting.department_totals
+
+        def off_by_a_cent(entries):
+            totals = real_department_totals(entries)
+            totals[0]['net'] += Decimal('0.01')
+            return totals
+
+        with mock.patch.object(posting, 'department_totals', off_by_a_cent):
+            with self.assertRaisesMessage(ValueError, 'Payroll journal is not balanced'):
+                post_period_journal(self.period)
+        self.assertFalse(JournalEntry.objects.exists())
+        self.assertFalse(self.period.payroll_entries.filter(journal_entry__isnull=False).exists())
+
+
+def compiled_table(brackets, exemption_allowance='0.00', effective_date=date(2026, 1, 1), version=1):
+    """A CompiledTaxTable from (lower_bound, rate) pairs, without touching the database"""
+    table = SimpleNamespace(id=version, version=version, effective_date=effective_date,
+                            exemption_allowance=Decimal(exemption_allowance))
+    return CompiledTaxTable(table, [
+        SimpleNamespace(lower_bound=Decimal(lower_bound), rate=Decimal(rate))
+        for lower_bound, rate in brackets
+    ])
+
+
+class TaxTableTests(SimpleTestCase):
+
+    def setUp(self):
+        # 10% to 1,000, 20% to 5,000, 30% above
+        self.table = compiled_table([('0.00', '0.10'), ('1000.00', '0.20'), ('5000.00', '0.30')])
+
+    def test_bracket_edges(self):
+        self.assertEqual(self.table.withholding(0), 0)
+        self.assertEqual(self.table.withholding(99999), 10000)  # 999.99 at 10%, rounded
+        self.assertEqual(self.table.withholding(100000), 10000)  # a bound belongs to the bracket above
+        self.assertEqual(self.table.withholding(100005), 10001)
+        self.assertEqual(self.table.withholding(500000), 90000)
+        self.assertEqual(self.table.withholding(500010), 90003)
+
+    def test_top_bracket_is_open_ended(self):
+        self.assertEqual(self.table.withholding(100000000), 90000 + (100000000 - 500000) * 3 // 10)
+
+    def test_below_the_first_bracket(self):
+        table = compiled_table([('100.00', '0.10')])
+        self.assertEqual(table.withholding(9999), 0)
+        self.assertEqual(table.withholding(10000), 0)
+        self.assertEqual(table.withholding(10010), 1)
+
+    def test_exemptions(self):
+        table = compiled_table([('0.00', '0.10')], exemption_allowance='50.00')
+        self.assertEqual(table.withholding(20000, exemptions=2), 1000)
+        self.assertEqual(table.withholding(5000, exemptions=2), 0)
+
+    def test_rounds_half_even_in_whole_cents(self):
+        table = compiled_table([('0.00', '0.05')])
+        self.assertEqual(table.withholding(10), 0)  # 0.5 cents
+        self.assertEqual(table.withholding(30), 2)  # 1.5 cents
+        self.assertEqual(table.withholding(50), 2)  # 2.5 cents
+
+    def test_matches_decimal_arithmetic(self):
+        table = compiled_table([('0.00', '0.0145'), ('123.45', '0.222222'), ('987.65', '0.3765')])
+        brackets = [(Decimal('0.00'), Decimal('0.0145')), (Decimal('123.45'), Decimal('0.222222')),
+                    (Decimal('987.65'), Decimal('0.3765'))]
+        for cents in range(0, 200000, 997):
+            taxable = Decimal(cents) / 100
+            expected = Decimal('0')
+            for index, (lower, rate) in enumerate(brackets):
+                upper = brackets[index + 1][0] if index + 1 < len(brackets) else taxable
+                if taxable > lower:
+                    expected += (min(taxable, upper) - lower) * rate
+            expected_cents = int((expected * 100).quantize(Decimal('1'), rounding=ROUND_HALF_EVEN))
+            self.assertEqual(table.withholding(cents), expected_cents, taxable)
+
+    def test_round_half_even_div(self):
+        self.assertEqual(round_half_even_div(5, 2), 2)
+        self.assertEqual(round_half_even_div(7, 2), 4)
+        self.assertEqual(round_half_even_div(-5, 2), -2)
+        self.assertEqual(round_half_even_div(-7, 2), -4)
+        self.assertEqual(round_half_even_div(1, 3), 0)
+        self.assertEqual(round_half_even_div(2, 3), 1)
+        self.assertEqual(round_half_even_div(1500000, PPM), 2)
+        self.assertEqual(round_half_even_div(2500001, PPM), 3)
+
+    def test_rates_are_kept_in_ppm(self):
+        self.assertEqual(rate_to_ppm(Decimal('0.0145')), 14500)
+        with self.assertRaises(ValueError):
+            rate_to_ppm(Decimal('0.00000015'))
+        self.assertEqual(apply_rate([12345, 10, 30], 50000), [617, 0, 2])
+
+    def test_lookup_picks_the_table_in_force(self):
+        key = ('federal_tax', 'US', 'monthly')
+        old = compiled_table([('0.00', '0.10')], effective_date=date(2025, 1, 1), version=1)
+        new = compiled_table([('0.00', '0.12')], effective_date=date(2026, 1, 1), version=1)
+        revised = compiled_table([('0.00', '0.11')], effective_date=date(2026, 1, 1), version=2)
+        tables = TaxTableSet([(revised, key), (old, key), (new, key)])
+        self.assertIsNone(tables.lookup(*key, date(2024, 12, 31)))
+        self.assertIs(tables.lookup(*key, date(2025, 12, 31)), old)
+        self.assertIs(tables.lookup(*key, date(2026, 1, 1)), revised)
+        self.assertIsNone(tables.lookup('state_tax', 'CA', 'monthly', date(2026, 1, 1)))
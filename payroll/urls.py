@@ -21,4 +21,5 @@ urlpatterns = [
     # Payroll Processing
     path('periods/<int:period_id>/process/', views.process_payroll, name='process_payroll'),
     path('periods/<int:period_id>/journal/', views.create_payroll_journal_entries, name='create_journal_entries'),
+    path('periods/<int:period_id>/payslips/', views.download_payslips, name='download_payslips'),
 ]
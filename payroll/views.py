@@ -2,15 +2,18 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 from django.views.generic import ListView, DetailView, CreateView, UpdateView, DeleteView
+from django.conf import settings
 from django.contrib import messages
 from django.urls import reverse_lazy
 from django.db.models import Q, Sum
-from django.http import JsonResponse, HttpResponse
+from django.http import JsonResponse, HttpResponse, FileResponse
 from decimal import Decimal
 from datetime import date, timedelta
-from .models import Employee, PayrollPeriod, PayrollEntry, PayrollDeduction
+import tempfile
+from .models import Employee, PayrollPeriod, PayrollEntry, PayrollDeduction, PayrollYTD
 from .forms import EmployeeForm, PayrollPeriodForm, PayrollEntryForm
-from accounts.models import Account, JournalEntry, JournalEntryLine
+from .posting import PayrollAccountError, post_period_journal
+from .services import run_payroll, load_ytd
 
 def can_access_payroll(user):
     """Check if user can access payroll features"""
@@ -40,12 +43,15 @@ def payroll_dashboard(request):
     # Get payroll statistics for current period
     current_period_stats = {}
     if current_period:
-        entries = PayrollEntry.objects.filter(payroll_period=current_period)
-        current_period_stats = {
-            'total_gross': entries.aggregate(Sum('regular_pay'))['regular_pay__sum'] or 0,
-            'total_net': sum(entry.net_pay for entry in entries),
-            'employee_count': entries.count()
-        }
+        current_period_stats = PayrollEntry.objects.filter(payroll_period=current_period).totals()
+    
+    # Company-wide year-to-date totals from the per-employee accumulators
+    ytd_totals = PayrollYTD.objects.filter(year=today.year).aggregate(
+        gross=Sum('gross_pay'),
+        net=Sum('net_pay'),
+        federal_tax=Sum('federal_tax'),
+        state_tax=Sum('state_tax'),
+    )
     
     context = {
         'current_period': current_period,
@@ -53,6 +59,8 @@ def payroll_dashboard(request):
         'total_employees': total_employees,
         'total_inactive': total_inactive,
         'current_period_stats': current_period_stats,
+        'ytd_totals': ytd_totals,
+        'ytd_year': today.year,
     }
     
     # Add currency symbol for proper currency display
@@ -102,7 +110,7 @@ class EmployeeDetailView(LoginRequiredMixin, UserPassesTestMixin, DetailView):
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        employee = self.get_object()
+        employee = self.object
         
         # Get recent payroll entries
         recent_entries = PayrollEntry.objects.filter(
@@ -110,6 +118,13 @@ class EmployeeDetailView(LoginRequiredMixin, UserPassesTestMixin, DetailView):
         ).select_related('payroll_period').order_by('-payroll_period__start_date')[:10]
         
         context['recent_entries'] = recent_entries
+        
+        # Year-to-date totals from the accumulator (approved/paid periods only)
+        context['ytd_year'] = date.today().year
+        context['ytd'] = PayrollYTD.objects.filter(employee=employee, year=context['ytd_year']).first()
+        
+        from accounts.utils import get_currency_symbol
+        context['currency_symbol'] = get_currency_symbol(user=self.request.user)
         return context
 
 class EmployeeCreateView(LoginRequiredMixin, UserPassesTestMixin, CreateView):
@@ -147,6 +162,9 @@ class PayrollPeriodListView(LoginRequiredMixin, UserPassesTestMixin, ListView):
     
     def test_func(self):
         return can_access_payroll(self.request.user)
+    
+    def get_queryset(self):
+        return PayrollPeriod.objects.with_totals().order_by('-start_date')
 
 class PayrollPeriodDetailView(LoginRequiredMixin, UserPassesTestMixin, DetailView):
     model = PayrollPeriod
@@ -158,16 +176,24 @@ class PayrollPeriodDetailView(LoginRequiredMixin, UserPassesTestMixin, DetailVie
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        period = self.get_object()
+        period = self.object
         
         # Get payroll entries for this period
         entries = PayrollEntry.objects.filter(
             payroll_period=period
         ).select_related('employee').order_by('employee__last_name')
         
+        # Attach each employee's year-to-date totals for the period's year
+        ytd = load_ytd(period.pay_date.year, [entry.employee_id for entry in entries])
+        for entry in entries:
+            entry.ytd = ytd.get(entry.employee_id)
+        
+        totals = entries.totals()
         context['entries'] = entries
-        context['total_gross'] = sum(entry.gross_pay for entry in entries)
-        context['total_net'] = sum(entry.net_pay for entry in entries)
+        context['entry_count'] = totals['employee_count']
+        context['total_gross'] = totals['total_gross']
+        context['total_deductions'] = totals['total_deductions']
+        context['total_net'] = totals['total_net']
         
         # Add currency symbol for proper currency display
         from accounts.utils import get_currency_symbol
@@ -199,26 +225,7 @@ def process_payroll(request, period_id):
     period = get_object_or_404(PayrollPeriod, id=period_id)
     
     if request.method == 'POST':
-        # Get all active employees
-        active_employees = Employee.objects.filter(employment_status='active')
-        
-        created_count = 0
-        for employee in active_employees:
-            # Check if entry already exists
-            entry, created = PayrollEntry.objects.get_or_create(
-                employee=employee,
-                payroll_period=period,
-                defaults={
-                    'regular_hours': 40 if employee.employment_type == 'full_time' else 20,
-                    'regular_pay': employee.base_salary if employee.base_salary else employee.hourly_rate * 40,
-                    'created_by': request.user
-                }
-            )
-            
-            if created:
-                # Calculate taxes
-                entry.calculate_taxes()
-                created_count += 1
+        created_count = run_payroll(period, user=request.user)
         
         if created_count > 0:
             messages.success(request, f'Created payroll entries for {created_count} employees.')
@@ -242,68 +249,54 @@ def create_payroll_journal_entries(request, period_id):
         return redirect('payroll:dashboard')
     
     period = get_object_or_404(PayrollPeriod, id=period_id)
-    entries = PayrollEntry.objects.filter(payroll_period=period)
     
-    if not entries.exists():
+    if not PayrollEntry.objects.filter(payroll_period=period).exists():
         messages.error(request, "No payroll entries found for this period.")
         return redirect('payroll:period_detail', pk=period.pk)
     
-    # Calculate totals
-    total_gross = sum(entry.gross_pay for entry in entries)
-    total_net = sum(entry.net_pay for entry in entries)
-    total_deductions = total_gross - total_net
-    
     try:
-        # Get payroll accounts (you'll need to create these)
-        salary_expense = Account.objects.get(code='5100')  # Salary Expense
-        payroll_liability = Account.objects.get(code='2100')  # Payroll Liability
-        cash_account = Account.objects.get(code='1000')  # Cash
-        
-        # Create journal entry
-        journal_entry = JournalEntry.objects.create(
-            date=period.pay_date,
-            description=f"Payroll for {period.name}",
-            reference=f"PAY-{period.id}",
-            created_by=request.user,
-            is_posted=True
-        )
-        
-        # Debit salary expense
-        JournalEntryLine.objects.create(
-            journal_entry=journal_entry,
-            account=salary_expense,
-            entry_type='debit',
-            amount=total_gross,
-            description=f"Salary expense for {period.name}"
-        )
-        
-        # Credit payroll liability (for deductions)
-        if total_deductions > 0:
-            JournalEntryLine.objects.create(
-                journal_entry=journal_entry,
-                account=payroll_liability,
-                entry_type='credit',
-                amount=total_deductions,
-                description=f"Payroll deductions for {period.name}"
-            )
+        journal_entry = post_period_journal(period, user=request.user)
         
-        # Credit cash (net pay)
-        JournalEntryLine.objects.create(
-            journal_entry=journal_entry,
-            account=cash_account,
-            entry_type='credit',
-            amount=total_net,
-            description=f"Net payroll payment for {period.name}"
-        )
-        
-        # Update payroll entries to reference the journal entry
-        entries.update(journal_entry=journal_entry)
-        
-        messages.success(request, f'Journal entry created successfully! Entry ID: {journal_entry.id}')
+        if journal_entry:
+            messages.success(request, f'Journal entry created successfully! Entry ID: {journal_entry.id}')
+        else:
+            messages.info(request, 'All payroll entries for this period are already posted.')
         
-    except Account.DoesNotExist as e:
-        messages.error(request, f'Required payroll account not found. Please create accounts with codes: 5100 (Salary Expense), 2100 (Payroll Liability), 1000 (Cash)')
+    except PayrollAccountError as e:
+        messages.error(request, f'{e} Configure payroll accounts in the admin under Payroll Account Mappings.')
     except Exception as e:
         messages.error(request, f'Error creating journal entry: {str(e)}')
     
     return redirect('payroll:period_detail', pk=period.pk)
+
+@login_required
+def download_payslips(request, period_id):
+    """Download a zip of PDF payslips for every entry in the period"""
+    if not can_access_payroll(request.user):
+        messages.error(request, "You don't have permission to download payslips.")
+        return redirect('payroll:dashboard')
+    
+    period = get_object_or_404(PayrollPeriod, id=period_id)
+    
+    # Rendered in-process, so large periods are left to the generate_payslips command
+    entry_count = PayrollEntry.objects.filter(payroll_period=period).count()
+    max_entries = getattr(settings, 'PAYSLIP_DOWNLOAD_MAX_ENTRIES', 200)
+    if entry_count > max_entries:
+        messages.error(
+            request,
+            f'{period.name} has {entry_count} payslips, more than the {max_entries} that can be downloaded '
+            f'directly. Generate them with: python manage.py generate_payslips {period.pk}'
+        )
+        return redirect('payroll:period_detail', pk=period.pk)
+    
+    try:
+        from .payslips import generate_payslips
+        import reportlab  # noqa: F401
+    except ImportError:
+        return HttpResponse('Payslip generation requires reportlab. Please install it: pip install reportlab', status=500)
+    
+    archive = tempfile.TemporaryFile()
+    generate_payslips(period, archive)
+    archive.seek(0)
+    return FileResponse(archive, as_attachment=True, filename=f'payslips_{period.pk}.zip',
+                        content_type='application/zip')
@@ -0,0 +1,231 @@
+"""
+Report benchmarks against synthetic ledgers.
+
+For each scale (a number of journal lines) run_benchmarks() creates a
+throwaway test database, fills it with accounts.synthetic.SyntheticLedger
+and calls every case below: the financial statements, the invoice reports,
+the chart of accounts and each account statement export path. Each case
+runs once to warm up, `repeat` times for timing (p50/p95 wall time, query
+count and SQL time) and once more under tracemalloc for peak memory, which
+is measured separately because tracing slows everything down.
+
+The data set and report dates are fixed by the seed and end date, so two
+runs on the same machine are comparable. compare() checks a run against a
+stored baseline: wall times and memory may grow by `threshold`, while
+query counts are deterministic and must not grow at all.
+"""
+from datetime import date
+import platform
+import statistics
+import time
+import tracemalloc
+
+import django
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.db.models import Count
+from django.test import RequestFactory
+from django.test.utils import setup_databases, teardown_databases
+
+from bookgium.instrumentation import QueryRecorder
+
+# Scales in journal lines. The generator averages about 2.64 lines per entry.
+DEFAULT_SCALES = [10_000, 100_000, 1_000_000]
+LINES_PER_ENTRY = 2.64
+
+DEFAULT_END_DATE = date(2025, 12, 31)
+DEFAULT_REPEAT = 5
+DEFAULT_THRESHOLD = 0.2
+
+# Time differences below this are noise, whatever the ratio
+MIN_TIME_DELTA_MS = 5.0
+
+BENCH_PREFIX = 'BENCH'
+
+
+def _report_cases(end_date, account_id):
+    """[(name, view, args, query)] run at every scale"""
+    from accounts import views as account_views
+    from reports import views as report_views
+
+    year_start = end_date.replace(month=1, day=1).isoformat()
+    end = end_date.isoformat()
+    period = {'date_from': year_start, 'date_to': end}
+    statement = {'from_date': year_start, 'to_date': end}
+    return [
+        ('trial_balance', report_views.trial_balance, (), period),
+        ('income_statement', report_views.income_statement, (), period),
+        ('balance_sheet', report_views.balance_sheet, (), {'as_of_date': end}),
+        ('invoice_summary', report_views.invoice_summary, (), period),
+        ('aged_receivables', report_views.aged_receivables, (), {'as_of_date': end}),
+        ('chart_of_accounts', account_views.chart_of_accounts, (), {}),
+        ('account_statement', account_views.account_statement, (account_id,), statement),
+        ('account_statement_csv', account_views.account_statement, (account_id,), {**statement, 'export': 'csv'}),
+        ('account_statement_excel', account_views.account_statement, (account_id,), {**statement, 'export': 'excel'}),
+        ('account_statement_pdf', account_views.account_statement, (account_id,), {**statement, 'export': 'pdf'}),
+    ]
+
+
+def _percentile(ordered, fraction):
+    index = min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def _call(view, request, args):
+    response = view(request, *args)
+    # Template responses render lazily; the cost belongs to the view
+    if hasattr(response, 'render') and not getattr(response, 'is_rendered', True):
+        response.render()
+    return response
+
+
+def measure(view, args, query, user, repeat=DEFAULT_REPEAT):
+    """Timings, query count and peak memory of one view. Returns a result dict."""
+    factory = RequestFactory()
+
+    def request():
+        req = factory.get('/', query)
+        req.user = user
+        return req
+
+    response = _call(view, request(), args)
+    if response.status_code != 200:
+        return {'status': response.status_code}
+
+    walls, recorder = [], None
+    for _ in range(repeat):
+        recorder = QueryRecorder()
+        start = time.perf_counter()
+        with connection.execute_wrapper(recorder):
+            response = _call(view, request(), args)
+        walls.append((time.perf_counter() - start) * 1000)
+
+    tracemalloc.start()
+    try:
+        _call(view, request(), args)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    walls.sort()
+    return {
+        'status': response.status_code,
+        'p50_ms': round(_percentile(walls, 0.50), 2),
+        'p95_ms': round(_percentile(walls, 0.95), 2),
+        'mean_ms': round(statistics.mean(walls), 2),
+        'queries': recorder.count,
+        'sql_ms': round(recorder.duration * 1000, 2),
+        'peak_kb': round(peak / 1024, 1),
+        'response_bytes': len(response.content),
+    }
+
+
+def bench_scale(lines, *, seed, end_date, repeat, cases=None, stdout=None):
+    """Generate `lines` journal lines in the current database and run the cases"""
+    from accounts.models import JournalEntryLine
+    from accounts.synthetic import SyntheticLedger
+
+    def log(message):
+        if stdout:
+            stdout.write(message)
+
+    user = get_user_model().objects.create_superuser(
+        'bench-admin', 'bench-admin@example.invalid', None, role='admin'
+    )
+    entries = max(1, round(lines / LINES_PER_ENTRY))
+    ledger = SyntheticLedger(
+        entries=entries, invoices=max(100, entries // 10), end_date=end_date,
+        seed=seed, prefix=BENCH_PREFIX, user=user,
+    )
+    start = time.perf_counter()
+    counts = ledger.generate()
+    generate_seconds = time.perf_counter() - start
+    log(f'  generated {counts["journal_lines"]} lines in {generate_seconds:.1f}s')
+
+    # The most active account, so the statement cases have the most rows to show
+    account_id = (
+        JournalEntryLine.objects.values_list('account').order_by().annotate(n=Count('id'))
+        .order_by('-n').values_list('account', flat=True).first()
+    )
+    results = {}
+    for name, view, args, query in _report_cases(end_date, account_id):
+        if cases and name not in cases:
+            continue
+        result = results[name] = measure(view, args, query, user, repeat)
+        if result['status'] != 200:
+            log(f'  {name}: skipped, status {result["status"]}')
+        else:
+            log(f'  {name}: p50 {result["p50_ms"]}ms, p95 {result["p95_ms"]}ms, '
+                f'{result["queries"]} queries, peak {result["peak_kb"]}KB')
+    return {
+        'lines': counts['journal_lines'],
+        'entries': counts['journal_entries'],
+        'accounts': counts['accounts'],
+        'invoices': counts['invoices'],
+        'generate_seconds': round(generate_seconds, 2),
+        'cases': results,
+    }
+
+
+def run_benchmarks(scales=None, *, seed=42, end_date=DEFAULT_END_DATE, repeat=DEFAULT_REPEAT,
+                   cases=None, stdout=None):
+    """Run every scale in its own test database. Returns the results document."""
+    results = {
+        'meta': {
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'seed': seed,
+            'end_date': end_date.isoformat(),
+            'repeat': repeat,
+            'database': connection.vendor,
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'machine': platform.machine(),
+        },
+        'scales': {},
+    }
+    for lines in scales or DEFAULT_SCALES:
+        if stdout:
+            stdout.write(f'Scale {lines} lines')
+        old_config = setup_databases(verbosity=0, interactive=False, aliases={'default'}, serialized_aliases=set())
+        try:
+            results['scales'][str(lines)] = bench_scale(
+                lines, seed=seed, end_date=end_date, repeat=repeat, cases=cases, stdout=stdout
+            )
+        finally:
+            teardown_databases(old_config, verbosity=0)
+    return results
+
+
+def compare(baseline, current, threshold=DEFAULT_THRESHOLD):
+    """
+    (regressions, improvements, notes) between two results documents, each a
+    list of messages. Only scales and cases present in both are compared.
+    """
+    regressions, improvements, notes = [], [], []
+    for key in ('seed', 'end_date', 'database'):
+        if baseline['meta'].get(key) != current['meta'].get(key):
+            notes.append(f'{key} differs from the baseline ({baseline["meta"].get(key)} vs '
+                         f'{current["meta"].get(key)}); numbers may not be comparable')
+
+    for scale, run in current['scales'].items():
+        base_run = baseline['scales'].get(scale)
+        if base_run is None:
+            notes.append(f'scale {scale}: not in the baseline')
+            continue
+        for name, result in run['cases'].items():
+            base = base_run['cases'].get(name)
+            if base is None or base.get('status') != 200 or result.get('status') != 200:
+                continue
+            label = f'{scale} lines, {name}'
+            if result['queries'] != base['queries']:
+                message = f'{label}: queries {base["queries"]} -> {result["queries"]}'
+                (regressions if result['queries'] > base['queries'] else improvements).append(message)
+            for metric in ('p50_ms', 'p95_ms', 'peak_kb'):
+                before, after = base[metric], result[metric]
+                if metric.endswith('_ms') and abs(after - before) < MIN_TIME_DELTA_MS:
+                    continue
+                if before and after > before * (1 + threshold):
+                    regressions.append(f'{label}: {metric} {before} -> {after} (+{(after / before - 1):.0%})')
+                elif after < before * (1 - threshold):
+                    improvements.append(f'{label}: {metric} {before} -> {after} (-{(1 - after / before):.0%})')
+    return regressions, improvements, notes
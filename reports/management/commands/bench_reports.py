@@ -0,0 +1,77 @@
+from datetime import datetime
+import json
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from reports.benchmark import (
+    DEFAULT_END_DATE, DEFAULT_REPEAT, DEFAULT_SCALES, DEFAULT_THRESHOLD, compare, run_benchmarks,
+)
+
+
+class Command(BaseCommand):
+    help = ('Benchmark the report views and account statement exports against synthetic ledgers '
+            'of several sizes and compare the results with a stored baseline')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--scales',
+            type=str,
+            default=','.join(str(scale) for scale in DEFAULT_SCALES),
+            help='Comma separated journal line counts (default 10000,100000,1000000)'
+        )
+        parser.add_argument('--cases', type=str, help='Comma separated case names to run (default all)')
+        parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT,
+                            help=f'Timed runs per case (default {DEFAULT_REPEAT})')
+        parser.add_argument('--seed', type=int, default=42, help='Random seed of the synthetic data (default 42)')
+        parser.add_argument('--end-date', type=str, default=DEFAULT_END_DATE.isoformat(),
+                            help=f'Last date of the synthetic data and reports (default {DEFAULT_END_DATE})')
+        parser.add_argument('--baseline', type=str,
+                            help='Baseline JSON file to compare with (default bench_reports.json in the project)')
+        parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                            help=f'Allowed relative growth of times and memory (default {DEFAULT_THRESHOLD})')
+        parser.add_argument('--save', action='store_true',
+                            help='Write the results to the baseline file, replacing it')
+        parser.add_argument('--output', type=str, help='Also write the results to this JSON file')
+
+    def handle(self, *args, **options):
+        try:
+            scales = [int(scale) for scale in options['scales'].split(',') if scale.strip()]
+            end_date = datetime.strptime(options['end_date'], '%Y-%m-%d').date()
+        except ValueError:
+            raise CommandError('--scales takes integers and --end-date takes YYYY-MM-DD')
+        if not scales or min(scales) < 1 or options['repeat'] < 1:
+            raise CommandError('--scales and --repeat must be at least 1')
+        cases = {case.strip() for case in options['cases'].split(',')} if options['cases'] else None
+
+        baseline_path = Path(options['baseline'] or Path(settings.BASE_DIR) / 'bench_reports.json')
+        baseline = None
+        if baseline_path.exists():
+            with open(baseline_path, encoding='utf-8') as handle:
+                baseline = json.load(handle)
+
+        results = run_benchmarks(
+            scales, seed=options['seed'], end_date=end_date, repeat=options['repeat'],
+            cases=cases, stdout=self.stdout,
+        )
+
+        for path in filter(None, [options['output'], baseline_path if options['save'] else None]):
+            with open(path, 'w', encoding='utf-8') as handle:
+                json.dump(results, handle, indent=2)
+            self.stdout.write(f'Results written to {path}')
+
+        if baseline is None:
+            self.stdout.write(f'No baseline at {baseline_path}; run with --save to create one.')
+            return
+
+        regressions, improvements, notes = compare(baseline, results, options['threshold'])
+        for note in notes:
+            self.stdout.write(self.style.WARNING(note))
+        for message in improvements:
+            self.stdout.write(self.style.SUCCESS(f'Improved: {message}'))
+        for message in regressions:
+            self.stdout.write(self.style.ERROR(f'Regressed: {message}'))
+        if regressions:
+            raise CommandError(f'{len(regressions)} regression(s) against {baseline_path}')
+        self.stdout.write(self.style.SUCCESS(f'No regressions against {baseline_path}.'))
@@ -0,0 +1,85 @@
+"""
+Cached CompanySettings.
+
+The company settings are read by every page render and report export but
+change about once a year, so they are kept in two layers: the field values
+live in the shared Django cache under a version key, and each process holds
+the decoded instance, plus the organization logo's bytes for PDF exports.
+A process trusts its copy for COMPANY_SETTINGS_LOCAL_TTL seconds and then
+compares its version with the shared one, so a change made in one process
+reaches the others within that window. Saving or deleting CompanySettings
+bumps the shared version and clears the local copy (see settings.signals).
+Both layers are bookgium.local_cache helpers.
+"""
+from io import BytesIO
+import logging
+
+from bookgium.local_cache import VersionedValue, cached_instance
+
+logger = logging.getLogger(__name__)
+
+SETTINGS_KEY = 'company:settings'
+VERSION_KEY = 'company:settings:version'
+
+
+def _load(version):
+    """{'settings': CompanySettings or None, 'logo': None} for a shared version"""
+    from .models import CompanySettings
+
+    instance = cached_instance(SETTINGS_KEY, version, CompanySettings, CompanySettings.objects.first)
+    # The logo is read on first use, once per version
+    return {'settings': instance, 'logo': None}
+
+
+_company = VersionedValue(VERSION_KEY, _load, 'COMPANY_SETTINGS_LOCAL_TTL')
+
+
+def _read_logo(instance):
+    """(bytes, width, height) of the organization logo, or None"""
+    if instance is None or not instance.organization_logo:
+        return None
+    try:
+        with instance.organization_logo.open('rb') as handle:
+            data = handle.read()
+    except (OSError, ValueError):
+        logger.warning('Could not read organization logo %s', instance.organization_logo.name)
+        return None
+    try:
+        from reportlab.lib.utils import ImageReader
+        width, height = ImageReader(BytesIO(data)).getSize()
+    except Exception:
+        logger.warning('Could not decode organization logo %s', instance.organization_logo.name)
+        return None
+    return data, width, height
+
+
+def get_company_settings():
+    """
+    The CompanySettings row, or None if there is none (or the table can't be
+    read). The instance is shared by the whole process and must not be
+    modified; edit a fresh copy from the database instead.
+    """
+    value = _company.get()
+    return value['settings'] if value else None
+
+
+def get_company_logo():
+    """(bytes, width, height) of the organization logo, read once per settings version, or None"""
+    with _company.lock:
+        value = _company.get()
+        if value is None:
+            return None
+        if value['logo'] is None:
+            # False marks a missing or unreadable logo, so it isn't retried on every export
+            value['logo'] = _read_logo(value['settings']) or False
+        return value['logo'] or None
+
+
+def get_organization_name(default='Your Organization Name'):
+    settings = get_company_settings()
+    return settings.organization_name if settings else default
+
+
+def invalidate_company_settings():
+    """Publish a new settings version and drop this process's copy"""
+    _company.invalidate()
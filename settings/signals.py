@@ -0,0 +1,12 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .cache import invalidate_company_settings
+from .models import CompanySettings
+
+
+@receiver(post_save, sender=CompanySettings)
+@receiver(post_delete, sender=CompanySettings)
+def company_settings_changed(sender, **kwargs):
+    """Drop the cached company settings so every process reloads them"""
+    invalidate_company_settings()
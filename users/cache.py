@@ -0,0 +1,118 @@
+"""
+Versioned cache of user rows.
+
+Each user's field values are kept in the shared Django cache together with
+the version they were stored under, and a separate per-user version key is
+replaced whenever the user is saved or deleted (see users.signals). A
+lookup fetches both keys in one cache round trip and only reads the
+database when the stored values belong to an older version.
+
+CachedModelBackend loads the session user through this cache, so an
+authenticated request normally makes no user query at all. The instances
+returned are fresh copies and can be modified and saved as usual. The
+password hash is not cached: it is loaded from the database if something
+reads it, and the session check uses the cached session auth hash instead.
+
+A password change, deactivation or role change must reach every process
+at once, so users are only cached when the cache is shared between
+processes (see bookgium.local_cache.cache_is_shared). With a local memory
+or dummy cache every lookup reads the database, unless
+USER_CACHE_ALLOW_LOCAL is set, which is only safe with a single process.
+"""
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+
+from bookgium.local_cache import cache_is_shared, get_version, publish_version
+
+# How long a user's values stay in the cache. Kept short, so that changes
+# made without a save signal (e.g. queryset.update()) don't linger
+USER_CACHE_TIMEOUT = 60 * 5
+
+
+def user_cache_enabled():
+    """Whether users are cached, i.e. whether an invalidation reaches every process"""
+    return cache_is_shared() or getattr(settings, 'USER_CACHE_ALLOW_LOCAL', False)
+
+
+def _data_key(user_id):
+    return f'users:user:{user_id}'
+
+
+def _version_key(user_id):
+    return f'users:user:{user_id}:version'
+
+
+def _build(data, version):
+    user = get_user_model().from_db(DEFAULT_DB_ALIAS, data['fields'], data['values'])
+    user._cache_version = version
+    # Stands in for the password, which is left deferred (see CustomUser.get_session_auth_hash)
+    user._session_auth_hash = data['session_auth_hash']
+    return user
+
+
+def get_cached_user(user_id):
+    """The user with this id, from the cache when it is current, else None if it doesn't exist"""
+    User = get_user_model()
+    if not user_cache_enabled():
+        return User._default_manager.filter(pk=user_id).first()
+
+    data_key, version_key = _data_key(user_id), _version_key(user_id)
+    cached = cache.get_many([data_key, version_key])
+    version = cached.get(version_key)
+    data = cached.get(data_key)
+    if version is not None and data is not None and data['version'] == version and 'session_auth_hash' in data:
+        return _build(data, version)
+
+    if version is None:
+        version = get_version(version_key, USER_CACHE_TIMEOUT)
+
+    user = User._default_manager.filter(pk=user_id).first()
+    if user is None:
+        return None
+    # The password hash stays out of the shared cache; only its session HMAC is kept
+    field_names = [field.attname for field in User._meta.concrete_fields if field.attname != 'password']
+    data = {
+        'version': version,
+        'fields': field_names,
+        'values': tuple(getattr(user, name) for name in field_names),
+        'session_auth_hash': user.get_session_auth_hash(),
+    }
+    cache.set(data_key, data, USER_CACHE_TIMEOUT)
+    return _build(data, version)
+
+
+def invalidate_user(user_id):
+    """Publish a new version for a user, so every process reloads it"""
+    publish_version(_version_key(user_id), USER_CACHE_TIMEOUT)
+    cache.delete(_data_key(user_id))
+
+
+def get_request_user(request):
+    """
+    request.user, swapped for the cached copy if it was loaded some other
+    way (e.g. by a different authentication backend). Checked once per
+    request.
+    """
+    user = getattr(request, 'user', None)
+    if user is None or not user.is_authenticated or not user.pk:
+        return user
+    if getattr(request, '_user_cache_checked', False):
+        return request.user
+    request._user_cache_checked = True
+    if getattr(user, '_cache_version', None) is None and user_cache_enabled():
+        cached = get_cached_user(user.pk)
+        if cached is not None:
+            cached.backend = getattr(user, 'backend', None)
+            request.user = cached
+    return request.user
+
+
+class CachedModelBackend(ModelBackend):
+    """ModelBackend that loads the session user through the versioned user cache"""
+
+    def get_user(self, user_id):
+        user = get_cached_user(user_id)
+        return user if user is not None and self.user_can_authenticate(user) else None
@@ -1,15 +1,16 @@
 from django.utils.deprecation import MiddlewareMixin
 
+from users.cache import get_request_user
+
+
 class CurrencyRefreshMiddleware(MiddlewareMixin):
     """
     Middleware to ensure currency context is always fresh for each request.
-    This helps prevent any caching issues with currency preferences.
+    The user comes from the versioned user cache (users.cache), which is
+    invalidated whenever the user is saved, so preferred_currency is current
+    without reading the user row again.
     """
     
     def process_request(self, request):
-        # Force refresh user from database if authenticated
-        if hasattr(request, 'user') and request.user.is_authenticated and request.user.pk:
-            # This ensures we have the latest user data including preferred_currency
-            request.user.refresh_from_db()
-        
+        get_request_user(request)
         return None
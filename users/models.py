@@ -1,7 +1,9 @@
 from django.contrib.auth.models import AbstractUser
 from django.db import models
 
-class CustomUser(AbstractUser):
+from audit.snapshot import AuditedModelMixin
+
+class CustomUser(AuditedModelMixin, AbstractUser):
     role = models.CharField(max_length=50, choices=[
         ('admin', 'Admin'),
         ('accountant', 'Accountant'),
@@ -31,3 +33,10 @@ class CustomUser(AbstractUser):
             ('NZD', 'New Zealand Dollar (NZ$)'),
         ]
     )
+
+    def get_session_auth_hash(self):
+        # Users from users.cache carry the hash instead of their password,
+        # until the password is loaded or changed
+        if 'password' not in self.__dict__ and getattr(self, '_session_auth_hash', None):
+            return self._session_auth_hash
+        return super().get_session_auth_hash()
@@ -0,0 +1,15 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .cache import invalidate_user
+from .models import CustomUser
+
+
+@receiver(post_save, sender=CustomUser)
+@receiver(post_delete, sender=CustomUser)
+def user_changed(sender, instance, **kwargs):
+    """Drop the cached copy of a saved or deleted user"""
+    invalidate_user(instance.pk)
+    # Again after commit, in case another request cached the old row meanwhile
+    transaction.on_commit(lambda: invalidate_user(instance.pk))
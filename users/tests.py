@@ -1,3 +1,76 @@
-from django.test import TestCase
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
 
-# Create your tests here.
+from .cache import CachedModelBackend, get_cached_user
+
+
+@override_settings(USER_CACHE_ALLOW_LOCAL=True)
+class UserCacheTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(
+            'cached', 'cached@example.invalid', 'old-password', role='accountant'
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def reload(self):
+        return get_user_model().objects.get(pk=self.user.pk)
+
+    def test_cached_user_needs_no_query(self):
+        get_cached_user(self.user.pk)
+        with self.assertNumQueries(0):
+            cached = get_cached_user(self.user.pk)
+        self.assertEqual(cached.username, 'cached')
+        self.assertEqual(cached.get_session_auth_hash(), self.reload().get_session_auth_hash())
+
+    def test_password_change_invalidates_the_session_hash(self):
+        old_hash = get_cached_user(self.user.pk).get_session_auth_hash()
+        user = self.reload()
+        user.set_password('new-password')
+        user.save()
+
+        cached = get_cached_user(self.user.pk)
+        self.assertNotEqual(cached.get_session_auth_hash(), old_hash)
+        self.assertEqual(cached.get_session_auth_hash(), self.reload().get_session_auth_hash())
+
+    def test_password_change_ends_other_sessions(self):
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(reverse('users:dashboard')).status_code, 200)
+
+        user = self.reload()
+        user.set_password('new-password')
+        user.save()
+        response = self.client.get(reverse('users:dashboard'))
+        self.assertRedirects(response, f"{reverse('users:login')}?next={reverse('users:dashboard')}",
+                             fetch_redirect_response=False)
+
+    def test_deactivation_ends_sessions(self):
+        self.client.force_login(self.user)
+        self.client.get(reverse('users:dashboard'))
+        user = self.reload()
+        user.is_active = False
+        user.save()
+
+        self.assertIsNone(CachedModelBackend().get_user(self.user.pk))
+        response = self.client.get(reverse('users:dashboard'))
+        self.assertEqual(response.status_code, 302)
+
+    def test_role_change_reaches_the_cached_user(self):
+        self.assertEqual(get_cached_user(self.user.pk).role, 'accountant')
+        user = self.reload()
+        user.role = 'viewer'
+        user.save()
+        self.assertEqual(get_cached_user(self.user.pk).role, 'viewer')
+
+    @override_settings(USER_CACHE_ALLOW_LOCAL=False)
+    def test_per_process_cache_is_not_used(self):
+        # The test settings use LocMemCache, which other workers can't see
+        get_cached_user(self.user.pk)
+        with self.assertNumQueries(1):
+            user = get_cached_user(self.user.pk)
+        self.assertIn('password', user.__dict__)